@@ -1,23 +1,45 @@
+from __future__ import annotations
+import time
+started_at = time.perf_counter()  # Startup milestones are measured from here, before the heavy imports
 import os
 import pandas as pd
-from telegram import Bot, Update
-from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, filters, ContextTypes
 import schedule
-import time
 import logging
-from web3 import Web3
+import importlib
 import krakenex
 from datetime import datetime, timedelta
-import ta
-from pycoingecko import CoinGeckoAPI
+from typing import TYPE_CHECKING
 import pytz
 import asyncio
 import warnings
 import signal
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 import random
+from dotenv import load_dotenv
+from candle_store import CandleStore, MultiTimeframeCandles, parse_timeframe
+from price_feed import PriceFeed, KrakenWebSocketTransport
+from io_executor import IOExecutor, LoopLagMonitor
+from indicators import IndicatorEngine
+from ledger import TradeLedger
+from tx_pipeline import NonceManager, TransactionPipeline
+from gas_oracle import GasOracle, fee_paid
+from chain_reader import ChainReader
+from metrics import registry, MetricsServer
+from swap_quoter import SwapQuoter, UNISWAP_V2_FACTORY_ADDRESS, WETH_ADDRESS as MAINNET_WETH_ADDRESS, DEFAULT_HOP_TOKENS
+from quote_service import QuoteService, kraken_ticker_source, coingecko_source
+from strategy_runner import StrategyInstance, StrategyRunner, MarketData, load_strategy_configs
+from request_scheduler import RequestScheduler, kraken_rate_limited, priority, PRIORITY_TRADE, PRIORITY_QUERY
+from lazy_client import LazyClient
+from command_cache import SnapshotCache
+from order_tasks import OrderTasks
+from notifier import Notifier, SMTPMailer
+from state_store import StateStore
+from risk_engine import RiskEngine, STOP_LOSS, STOP_REASONS, TAKE_PROFIT, REASON_LABELS
+from swap_indexer import SwapIndexer
+
+if TYPE_CHECKING:
+    # telegram is imported when the bot starts handling commands, not at import time
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,6 +57,7 @@ CHAT_ID = os.getenv('CHAT_ID')
 SYMBOL = os.getenv('SYMBOL')
 STOP_LOSS_THRESHOLD = 0.975  # Set stop loss threshold directly in the code
 WEB3_INFURA_URL = os.getenv('WEB3_INFURA_URL')
+WEB3_ALCHEMY_URL = os.getenv('WEB3_ALCHEMY_URL', WEB3_INFURA_URL)  # JSON-RPC endpoint for web3 and the batched chain reader
 TRUST_WALLET_ADDRESS = os.getenv('TRUST_WALLET_ADDRESS')
 PRIVATE_KEY = os.getenv('PRIVATE_KEY')
 UNISWAP_ROUTER_ADDRESS = os.getenv('UNISWAP_ROUTER_ADDRESS')
@@ -42,33 +65,128 @@ KRAKEN_API_KEY = os.getenv('KRAKEN_API_KEY')
 KRAKEN_API_SECRET = os.getenv('KRAKEN_API_SECRET')
 ETH_TOKEN_ADDRESS = os.getenv('ETH_TOKEN_ADDRESS')
 COINGECKO_API_KEY = os.getenv('COINGECKO_API_KEY')
+COINGECKO_ID = os.getenv('COINGECKO_ID', 'ethereum')  # CoinGecko coin id of SYMBOL
 EMAIL_ADDRESS = os.getenv('EMAIL_PASSWORD')
 EMAIL_PASSWORD = os.getenv('EMAIL_ADDRESS')
 RECIPIENT_EMAIL = os.getenv('RECEIPENT_ADDRESS')
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR', 'data')
+CANDLE_REFRESH_SECONDS = 60  # How often the candle store asks Kraken for new bars
+CANDLE_BASE_INTERVAL = 1  # Only these bars are polled; other timeframes are resampled from them locally
+CANDLE_BASE_RETENTION = 30 * 1440  # Base bars kept in memory and on disk
+WS_SYMBOL = os.getenv('WS_SYMBOL', 'ETH/USD')  # Kraken websocket name for SYMBOL
+PRICE_MAX_AGE = 10  # Seconds before a streamed price is considered stale and REST is used
+IO_MAX_WORKERS = 8  # Threads available for blocking network calls
+IO_TIMEOUT = 15  # Seconds before a network call is abandoned
+QUOTE_TTL = 2  # Seconds a REST quote is reused before fetching again
+QUOTE_DEADLINE = 5  # Seconds to wait for the first valid REST quote
+LEDGER_PATH = os.getenv('LEDGER_PATH', os.path.join(CANDLE_STORE_DIR, 'trades.db'))
+STATE_PATH = os.getenv('STATE_PATH', os.path.join(CANDLE_STORE_DIR, 'state.json'))  # Snapshot; the journal sits next to it as state.journal
+STRATEGIES_FILE = os.getenv('STRATEGIES_FILE')  # Optional JSON list of extra pair/wallet strategies
+KRAKEN_REST_RATE = 1  # Kraken public REST calls per second, shared fairly by all pairs
+KRAKEN_REST_BURST = 15  # Kraken public REST calls allowed back to back
+COINGECKO_REST_RATE = 8  # CoinGecko pro API calls per second
+COINGECKO_REST_BURST = 8
+RPC_RATE = 20  # Web3 provider requests per second
+RPC_BURST = 40
+UNISWAP_FACTORY_ADDRESS = os.getenv('UNISWAP_FACTORY_ADDRESS', UNISWAP_V2_FACTORY_ADDRESS)
+WETH_ADDRESS = os.getenv('WETH_ADDRESS', MAINNET_WETH_ADDRESS)
+HOP_TOKENS = os.getenv('HOP_TOKENS', ','.join(DEFAULT_HOP_TOKENS)).split(',')  # Intermediate tokens for multi-hop routes
+MAX_HOPS = 3  # Most pools a swap route may pass through
+SLIPPAGE_TOLERANCE = 0.005  # amountOutMin is the quoted output less this fraction
+MAX_PRICE_IMPACT = 0.03  # Orders that would move the pools more than this are not sent
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))  # Local Prometheus /metrics endpoint
+FAST_START = os.getenv('FAST_START', '1') != '0'  # Start the stop-loss loop before Telegram, web3 and CoinGecko are ready
+CLIENT_INIT_TIMEOUT = 60  # Seconds allowed for a deferred client to import and connect
+SNAPSHOT_REFRESH_SECONDS = 15  # How often /status, /balance and /market data is refreshed in the background
+SNAPSHOT_MAX_AGE = 60  # Oldest cached value a command shows before fetching a fresh one
+NOTIFY_BATCH_WINDOW = 1.0  # Seconds alerts are collected before being sent as one Telegram message
+TELEGRAM_CHAT_INTERVAL = 1.0  # Minimum seconds between messages to one chat (Telegram flood limit)
+WEEKLY_REPORT_TIME = '09:00'  # Monday, local time
+TRAILING_STOP = None  # Off; e.g. 0.05 sells when the price falls 5% below its high since the buy
+TAKE_PROFIT_LADDER = []  # Off; e.g. [(1.10, 0.25), (1.25, 0.25)] sells a quarter at +10% and a quarter at +25% of the opening price
+VOLATILITY_STOP_MULTIPLIER = None  # Off; e.g. 3.0 sells when the price falls 3 volatility widths below its high
+VOLATILITY_SOURCE = 'atr'  # 'atr' or 'bollinger' (standard deviations of close)
+VOLATILITY_WINDOW = 14  # Bars in the ATR / Bollinger window
+MAX_DAILY_LOSS = None  # Off; e.g. 0.10 closes every position once the day's loss reaches 10% of their value at the day's open (UTC)
+RISK_STATE_INTERVAL = 5  # Seconds between journal writes of positions whose trailing high moved
+SWAP_INDEX_START_BLOCK = int(os.getenv('SWAP_INDEX_START_BLOCK')) if os.getenv('SWAP_INDEX_START_BLOCK') else None  # Backfill the ledger from this block on first start
+SWAP_INDEX_BATCH_BLOCKS = 2000  # Blocks per eth_getLogs range
+SWAP_INDEX_RANGES = 5  # eth_getLogs ranges sent in one JSON-RPC batch
+SWAP_INDEX_INTERVAL = 12  # Seconds between checks for new blocks once caught up
+SWAP_INDEX_CHECKPOINT_INTERVAL = 60  # Seconds between journal writes of the indexed block when no fills were found
+
+# Initialize Web3 instance (connected on first use or by warm_clients)
+def connect_web3():
+    from web3 import Web3
 
-# Initialize Web3 instance
-try:
-    logger.info(f"Connecting to Web3 provider at {WEB3_ALCHEMY_URL}")
-    web3 = Web3(Web3.HTTPProvider(WEB3_ALCHEMY_URL))
-    if not web3.is_connected():
-        logger.error("Failed to connect to the Web3 provider.")
+    try:
+        logger.info(f"Connecting to Web3 provider at {WEB3_ALCHEMY_URL}")
+        web3 = Web3(Web3.HTTPProvider(WEB3_ALCHEMY_URL, request_kwargs={'timeout': IO_TIMEOUT}))
+        if not web3.is_connected():
+            logger.error("Failed to connect to the Web3 provider.")
+            raise ConnectionError("Failed to connect to the Web3 provider.")
+        logger.info("Successfully connected to Web3 provider")
+        return web3
+    except Exception as e:
+        logger.error(f"Error connecting to Web3 provider: {e}")
         raise ConnectionError("Failed to connect to the Web3 provider.")
-    logger.info("Successfully connected to Web3 provider")
-except Exception as e:
-    logger.error(f"Error connecting to Web3 provider: {e}")
-    raise ConnectionError("Failed to connect to the Web3 provider.")
 
-# Initialize Telegram bot
-logger.info("Initializing Telegram Bot")
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
+web3 = LazyClient('web3', connect_web3)
+
+# Initialize Telegram bot (built on first use or by warm_clients)
+def create_telegram_bot():
+    from telegram import Bot
+
+    logger.info("Initializing Telegram Bot")
+    return Bot(token=TELEGRAM_BOT_TOKEN)
+
+bot = LazyClient('telegram', create_telegram_bot)
 
 # Initialize Kraken client
 kraken_client = krakenex.API()
 kraken_client.key = KRAKEN_API_KEY
 kraken_client.secret = KRAKEN_API_SECRET
 
-# Initialize CoinGecko client
-coingecko_client = CoinGeckoAPI()
+# Initialize CoinGecko client (built on first use or by warm_clients)
+def create_coingecko_client():
+    from pycoingecko import CoinGeckoAPI
+
+    return CoinGeckoAPI()
+
+coingecko_client = LazyClient('coingecko', create_coingecko_client)
+
+# Initialize I/O executor and event loop lag monitor
+io_executor = IOExecutor(max_workers=IO_MAX_WORKERS, timeout=IO_TIMEOUT)
+loop_lag_monitor = LoopLagMonitor()
+
+# Initialize metrics endpoint
+metrics_server = MetricsServer(registry, METRICS_HOST, METRICS_PORT)
+
+# Initialize trade ledger
+ledger = TradeLedger(LEDGER_PATH)
+
+# Initialize strategy state snapshot and journal
+state_store = StateStore(STATE_PATH)
+
+# Initialize indicator engine
+indicator_engine = IndicatorEngine()
+
+# Initialize per-provider request scheduler
+request_scheduler = RequestScheduler(io_executor)
+kraken_requests = request_scheduler.add_provider('kraken', KRAKEN_REST_RATE, burst=KRAKEN_REST_BURST, rate_limited=kraken_rate_limited)
+coingecko_requests = request_scheduler.add_provider('coingecko', COINGECKO_REST_RATE, burst=COINGECKO_REST_BURST)
+rpc_requests = request_scheduler.add_provider('rpc', RPC_RATE, burst=RPC_BURST)
+
+# Initialize REST quote service, racing Kraken against CoinGecko for symbols with a coin id
+coingecko_ids = {SYMBOL: COINGECKO_ID}
+quote_service = QuoteService(io_executor, [
+    ('kraken', kraken_ticker_source(kraken_client, timeout=IO_TIMEOUT), kraken_requests),
+    ('coingecko', coingecko_source(coingecko_client, coingecko_ids, api_key=COINGECKO_API_KEY), coingecko_requests)
+], ttl=QUOTE_TTL, deadline=QUOTE_DEADLINE)
+
+# Initialize streaming price feed
+price_feed = PriceFeed(KrakenWebSocketTransport({WS_SYMBOL: SYMBOL}), max_age=PRICE_MAX_AGE)
 
 # Uniswap Router ABI
 uniswap_router_abi = '''
@@ -247,84 +365,106 @@ uniswap_router_abi = '''
 ]
 '''
 
-# Initialize Uniswap router contract
-uniswap_router = web3.eth.contract(address=UNISWAP_ROUTER_ADDRESS, abi=uniswap_router_abi)
+# Initialize Uniswap router contract (the ABI is parsed on first use)
+uniswap_router = LazyClient('uniswap_router', lambda: web3.eth.contract(address=UNISWAP_ROUTER_ADDRESS, abi=uniswap_router_abi))
 
-# Global variables
-opening_price = None
-transactions = []
-stop_loss_triggered = False
+# Initialize batched on-chain reader
+chain_reader = ChainReader(WEB3_ALCHEMY_URL, timeout=IO_TIMEOUT)
+chain_reader.watch(wallets=[TRUST_WALLET_ADDRESS], tokens=[ETH_TOKEN_ADDRESS] if ETH_TOKEN_ADDRESS else [])
 
-async def send_telegram_message(message):
-    try:
-        await bot.send_message(chat_id=CHAT_ID, text=message)
-        logger.info(f"Sent Telegram message: {message}")
-    except Exception as e:
-        logger.error(f"Failed to send Telegram message: {e}")
+# Initialize local swap quoter over cached pair reserves
+swap_quoter = SwapQuoter(chain_reader, UNISWAP_FACTORY_ADDRESS, hop_tokens=[WETH_ADDRESS] + HOP_TOKENS, max_hops=MAX_HOPS)
 
-def send_email(subject, message):
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Subject'] = subject
+# Initialize gas oracle
+gas_oracle = GasOracle(web3)
 
-        msg.attach(MIMEText(message, 'plain'))
+# Initialize nonce manager and transaction pipeline
+nonce_manager = NonceManager(web3, TRUST_WALLET_ADDRESS, chain_reader=chain_reader)
+tx_pipeline = TransactionPipeline(web3, rpc_requests, nonce_manager, PRIVATE_KEY, state_store=state_store)
 
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(EMAIL_ADDRESS, RECIPIENT_EMAIL, text)
-        server.quit()
+# Initialize swap indexer (exact fills and gas from our swaps' logs go into the ledger)
+swap_indexer = SwapIndexer(chain_reader, ledger, state_store=state_store, price_fn=lambda timestamp: price_at(timestamp), batch_blocks=SWAP_INDEX_BATCH_BLOCKS,
+                           ranges_per_request=SWAP_INDEX_RANGES, start_block=SWAP_INDEX_START_BLOCK, checkpoint_interval=SWAP_INDEX_CHECKPOINT_INTERVAL)
+swap_indexer.watch(wallets=[TRUST_WALLET_ADDRESS], tokens=[ETH_TOKEN_ADDRESS] if ETH_TOKEN_ADDRESS else [])
 
-        logger.info(f"Sent email to {RECIPIENT_EMAIL} with subject: {subject}")
-    except Exception as e:
-        logger.error(f"Failed to send email: {e}")
+# Initialize risk engine (exit rules for every position, evaluated together each tick)
+risk_engine = RiskEngine(max_daily_loss=MAX_DAILY_LOSS, volatility_source=VOLATILITY_SOURCE, volatility_window=VOLATILITY_WINDOW)
 
-def get_valid_token_price(symbol):
-    price = get_token_price(symbol)
+# Global variables
+default_strategy = StrategyInstance('default', SYMBOL, TRUST_WALLET_ADDRESS, ETH_TOKEN_ADDRESS, pipeline=tx_pipeline, stop_loss_threshold=STOP_LOSS_THRESHOLD, ws_symbol=WS_SYMBOL,
+                                    trailing_stop=TRAILING_STOP, take_profit=TAKE_PROFIT_LADDER, volatility_multiplier=VOLATILITY_STOP_MULTIPLIER)
+candle_stores = {}
+timeframe_candles = {}
+first_check_done = False
+background_tasks = set()
+state_lock = asyncio.Lock()  # Journal writes leave the event loop, but land in the order they were made
+
+async def ensure_clients(*clients):
+    # Deferred clients still being built are waited for on the I/O pool, not the event loop
+    for client in clients:
+        await client.ensure(io_executor, timeout=CLIENT_INIT_TIMEOUT)
+
+async def send_telegram(chat_id, text):
+    await ensure_clients(bot)
+    return await bot.send_message(chat_id=chat_id, text=text)
+
+# Initialize notification queue (Telegram alerts and emails are sent in the background)
+smtp_mailer = SMTPMailer('smtp.gmail.com', 587, EMAIL_ADDRESS, EMAIL_PASSWORD, RECIPIENT_EMAIL, timeout=IO_TIMEOUT)
+notifier = Notifier(send_telegram, CHAT_ID, mailer=smtp_mailer, io_executor=io_executor, batch_window=NOTIFY_BATCH_WINDOW, chat_interval=TELEGRAM_CHAT_INTERVAL)
+
+@registry.timed('price_lookup')
+async def get_valid_token_price(symbol):
+    price = await get_token_price(symbol)
     if price is None:
         raise ValueError(f"Failed to fetch token price for {symbol}")
     return price
 
-def get_token_price(symbol):
-    try:
-        response = kraken_client.query_public('Ticker', {'pair': symbol})
-        if 'result' in response and symbol in response['result']:
-            price = float(response['result'][symbol]['c'][0])
-            return price
-        else:
-            logger.error(f"Invalid response from Kraken API: {response}")
-            return None
-    except Exception as kraken_exception:
-        logger.warning(f"Kraken API failed: {kraken_exception}")
-        try:
-            response = coingecko_client.get_price(ids='ethereum', vs_currencies='usd', x_cg_pro_api_key=COINGECKO_API_KEY)
-            price = response['ethereum']['usd']
-            logger.info(f"Fetched price from CoinGecko: ${price}")
-            return price
-        except Exception as coingecko_exception:
-            logger.error(f"CoinGecko API failed: {coingecko_exception}")
-            return None
+async def get_token_price(symbol):
+    price = price_feed.get_price(symbol)
+    if price is not None:
+        return price
+    return await quote_service.get(symbol)
+
+def format_quote_stats():
+    return ", ".join(f"{name} p50 {s['p50'] * 1000:.0f} ms / p99 {s['p99'] * 1000:.0f} ms, {s['errors']}/{s['calls']} errors" for name, s in quote_service.stats_summary().items())
+
+def format_request_stats():
+    return ", ".join(f"{name} {s['delayed']} delayed / {s['dropped']} dropped / {s['rate_limited']} throttled of {s['submitted']}" for name, s in request_scheduler.stats().items())
+
+def format_perf():
+    lines = []
+    for (name, labels), s in registry.summary().items():
+        label = ' '.join(str(v) for _, v in labels)
+        lines.append(f"{label}: p50 {s['p50'] * 1000:.1f} ms / p99 {s['p99'] * 1000:.1f} ms over {s['count']}")
+    errors = ", ".join(f"{' '.join(str(v) for _, v in labels)} {c.value}" for (name, labels), c in sorted(registry.counters.items()) if name.endswith('errors_total') and c.value)
+    loops = registry.counter('loop_iterations_total').value
+    startup = ", ".join(f"{labels[0][1]} {g.value:.2f}s" for (name, labels), g in sorted(registry.gauges.items()) if name == 'startup_seconds')
+    return "\n".join(lines or ["No samples yet"]) + f"\nLoop iterations: {loops}\nErrors: {errors or 'none'}\nStartup: {startup or 'n/a'}"
 
+def get_native_candle_store(symbol, interval, **kwargs):
+    key = (symbol, interval)
+    if key not in candle_stores:
+        candle_stores[key] = CandleStore(kraken_client, symbol, interval, data_dir=CANDLE_STORE_DIR, refresh_seconds=CANDLE_REFRESH_SECONDS, timeout=IO_TIMEOUT, **kwargs)
+    return candle_stores[key]
+
+def get_candle_store(symbol, interval):
+    # Every timeframe of a pair is a view over its one base store; native Kraken
+    # bars are only fetched once per timeframe, for history older than the base bars
+    if interval % CANDLE_BASE_INTERVAL:
+        return get_native_candle_store(symbol, interval)
+    if symbol not in timeframe_candles:
+        base = get_native_candle_store(symbol, CANDLE_BASE_INTERVAL, max_bars=CANDLE_BASE_RETENTION)
+        timeframe_candles[symbol] = MultiTimeframeCandles(base, seed_store_factory=lambda interval: get_native_candle_store(symbol, interval))
+    return timeframe_candles[symbol].view(interval)
+
+@registry.timed('fetch_ohlcv')
 def fetch_ohlcv(symbol, interval):
     try:
-        response = kraken_client.query_public('OHLC', {'pair': symbol, 'interval': interval})
-        if 'result' in response and symbol in response['result']:
-            data = response['result'][symbol]
-            df = pd.DataFrame(data, columns=['time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count'])
-            df['open'] = df['open'].astype(float)
-            df['high'] = df['high'].astype(float)
-            df['low'] = df['low'].astype(float)
-            df['close'] = df['close'].astype(float)
-            df['vwap'] = df['vwap'].astype(float)
-            df['volume'] = df['volume'].astype(float)
-            df['timestamp'] = pd.to_datetime(df['time'], unit='s')
-            df.set_index('timestamp', inplace=True)
+        df = get_candle_store(symbol, interval).get()
+        if df is not None and not df.empty:
             return df
         else:
-            logger.error(f"Invalid response from Kraken API: {response}")
+            logger.error(f"No OHLCV data available for {symbol}")
             return None
     except Exception as e:
         logger.error(f"Failed to fetch OHLCV data: {e}")
@@ -333,12 +473,7 @@ def fetch_ohlcv(symbol, interval):
 def add_technical_indicators(df):
     try:
         if df is not None and not df.empty:
-            df['vwap'] = ta.volume.volume_weighted_average_price(df['high'], df['low'], df['close'], df['volume'])
-            df['rsi'] = ta.momentum.RSIIndicator(df['close']).rsi()
-            df['macd'] = ta.trend.MACD(df['close']).macd()
-            df['bollinger_hband'] = ta.volatility.BollingerBands(df['close']).bollinger_hband()
-            df['bollinger_lband'] = ta.volatility.BollingerBands(df['close']).bollinger_lband()
-            return df
+            return indicator_engine.frame(df)
         else:
             logger.error("Empty DataFrame, cannot add technical indicators.")
             return df
@@ -346,129 +481,194 @@ def add_technical_indicators(df):
         logger.error(f"Failed to add technical indicators: {e}")
         return df
 
-def log_transaction(transaction_type, amount, price):
-    global transactions
+async def save_strategy_states(strategies):
+    # One journal write and fsync for all of them, on the I/O pool
+    states = {strategy.name: strategy.state() for strategy in strategies}
     try:
-        transactions.append({
-            'type': transaction_type,
-            'amount': amount,
-            'price': price,
-            'timestamp': datetime.now()
-        })
-        logger.info(f"Logged transaction: {transaction_type} {amount} at {price}")
+        async with state_lock:
+            await io_executor.run(state_store.record_many, 'strategies', states)
     except Exception as e:
-        logger.error(f"Failed to log transaction: {e}")
+        logger.error(f"Failed to save state of {', '.join(states)}: {e}")
+
+def price_at(timestamp):
+    # ETH price for a fill mined at timestamp: the close of its 1-minute bar, or
+    # the latest price for fills newer than the candles
+    store = candle_stores.get((SYMBOL, CANDLE_BASE_INTERVAL))
+    df = store.df if store is not None else None
+    if df is not None and not df.empty and df['time'].iloc[0] <= timestamp < df['time'].iloc[-1] + 60 * CANDLE_BASE_INTERVAL:
+        return float(df['close'].iloc[df['time'].searchsorted(timestamp, side='right') - 1])
+    return price_feed.get_price(SYMBOL, max_age=float('inf'))
+
+async def report_receipt(pending, receipt):
+    await ensure_clients(web3)
+    chain_reader.invalidate()  # Balances changed in this block
+    command_snapshot.invalidate('eth_balance')
+    status = "confirmed" if receipt['status'] == 1 else "failed"
+    gas_fee = web3.from_wei(fee_paid(receipt), 'ether')
+    notifier.notify(f"{pending.label.capitalize()} {status} in block {receipt['blockNumber']}: {web3.to_hex(receipt['transactionHash'])}, Gas Fee: {gas_fee} ETH")
 
-async def execute_buy_order(token_address, amount_in_eth):
-    global opening_price
-    eth_balance = get_eth_balance()
+@registry.timed('swap_quote')
+async def quote_swap(token_in, token_out, amount_in):
+    # Local constant-product quote; raises instead of sending an unprotected swap
+    quote = await rpc_requests.run(swap_quoter.quote, token_in, token_out, amount_in)
+    if quote is None:
+        raise ValueError(f"No Uniswap route from {token_in} to {token_out}")
+    if quote.price_impact > MAX_PRICE_IMPACT:
+        raise ValueError(f"Price impact {quote.price_impact:.2%} exceeds {MAX_PRICE_IMPACT:.2%}")
+    logger.info(f"Quoted {amount_in} -> {quote.amount_out} over {len(quote.pools)} pool(s) at block {quote.block}, impact {quote.price_impact:.3%}")
+    return quote
+
+async def report_progress(progress, message):
+    # Orders started from chat report to that chat; the strategy loop's go to the notifier
+    if progress is None:
+        notifier.notify(message)
+    else:
+        await progress(message)
+
+@registry.timed('buy_order')
+async def execute_buy_order(token_address, amount_in_eth, strategy=None, progress=None):
+    strategy = strategy or default_strategy
+    await ensure_clients(web3, uniswap_router)
+    eth_balance = await rpc_requests.run(get_eth_balance, strategy.wallet_address)
     if eth_balance < amount_in_eth:
-        await send_telegram_message(f"Not enough ETH to execute buy order. Available: {eth_balance} ETH, Required: {amount_in_eth} ETH.")
+        await report_progress(progress, f"Not enough ETH to execute buy order. Available: {eth_balance} ETH, Required: {amount_in_eth} ETH. Retrying in 10 minutes.")
         logger.info(f"Waiting for 10 minutes before retrying buy order")
         await asyncio.sleep(600)  # Wait for 10 minutes
-        eth_balance = get_eth_balance()  # Re-check ETH balance after waiting
+        eth_balance = await rpc_requests.run(get_eth_balance, strategy.wallet_address)  # Re-check ETH balance after waiting
         if eth_balance < amount_in_eth:
-            await send_telegram_message(f"Retry failed. Still not enough ETH to execute buy order. Available: {eth_balance} ETH, Required: {amount_in_eth} ETH.")
+            await report_progress(progress, f"Retry failed. Still not enough ETH to execute buy order. Available: {eth_balance} ETH, Required: {amount_in_eth} ETH.")
             return
 
     amount_in_wei = web3.to_wei(amount_in_eth, 'ether')
-    nonce = web3.eth.get_transaction_count(TRUST_WALLET_ADDRESS)
     try:
-        opening_price = get_valid_token_price(SYMBOL)
-        df = fetch_ohlcv(SYMBOL, interval=1440)
+        strategy.opening_price = await get_valid_token_price(strategy.symbol)
+        await save_strategy_states([strategy])
+        df = await kraken_requests.run(fetch_ohlcv, strategy.symbol, interval=strategy.interval)
         if df is not None and not df.empty:
             vwap = df['vwap'].iloc[-1]
             current_price = df['close'].iloc[-1]
             if current_price > vwap:
-                log_transaction('buy', amount_in_eth, opening_price)
+                quote = await quote_swap(WETH_ADDRESS, token_address, amount_in_wei)
 
-                transaction = uniswap_router.functions.swapExactETHForTokens(
-                    0,  # Minimum amount of tokens to receive (slippage protection, set to 0 for demo purposes)
-                    [web3.to_checksum_address(TRUST_WALLET_ADDRESS), web3.to_checksum_address(token_address)],  # Path
-                    web3.to_checksum_address(TRUST_WALLET_ADDRESS),  # Recipient
+                swap = uniswap_router.functions.swapExactETHForTokens(
+                    quote.amount_out_min(SLIPPAGE_TOLERANCE),  # Minimum amount of tokens to receive
+                    quote.path,  # Path
+                    web3.to_checksum_address(strategy.wallet_address),  # Recipient
                     int(time.time()) + 1000  # Deadline
-                ).buildTransaction({
-                    'from': TRUST_WALLET_ADDRESS,
+                )
+                tx_params = {
+                    'from': strategy.wallet_address,
                     'value': amount_in_wei,
-                    'gas': 2000000,
-                    'gasPrice': web3.to_wei('50', 'gwei'),
-                    'nonce': nonce
-                })
-
-                signed_txn = web3.eth.account.sign_transaction(transaction, private_key=PRIVATE_KEY)
-                tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                logger.info(f"Buy order executed: {web3.to_hex(tx_hash)}")
-                await send_telegram_message(f"Buy order executed: {web3.to_hex(tx_hash)}")
+                    **await rpc_requests.run(gas_oracle.fee_params)
+                }
+                tx_params['gas'] = await rpc_requests.run(gas_oracle.gas_limit, f"buy {'-'.join(quote.path)}", lambda: swap.estimate_gas(tx_params))
+                transaction = await rpc_requests.run(swap.build_transaction, tx_params)
+
+                pending = await strategy.pipeline.submit(transaction, label='buy order')
+                logger.info(f"Buy order executed: {web3.to_hex(pending.tx_hash)}")
+                await report_progress(progress, f"Buy order submitted: {web3.to_hex(pending.tx_hash)}, waiting for it to confirm")
+                return pending
             else:
                 logger.info(f"Current price {current_price} is not greater than VWAP {vwap}. Buy order not executed.")
-                await send_telegram_message(f"Current price {current_price} is not greater than VWAP {vwap}. Buy order not executed.")
+                await report_progress(progress, f"Current price {current_price} is not greater than VWAP {vwap}. Buy order not executed.")
     except Exception as e:
         logger.error(f"Failed to execute buy order: {e}")
 
-async def execute_sell_order(token_address):
+@registry.timed('sell_order')
+async def execute_sell_order(token_address, strategy=None, fraction=1.0, reason=STOP_LOSS, progress=None):
+    # Sells fraction of the position; only stop exits wait for the price to be under VWAP
+    strategy = strategy or default_strategy
     try:
         if not token_address or not isinstance(token_address, str):
             raise ValueError("Token address must be provided as a non-empty string.")
+        await ensure_clients(web3, uniswap_router)
         
         logger.info(f"Executing sell order with token address: {token_address}")
 
         # Swap transaction
-        df = fetch_ohlcv(SYMBOL, interval=1440)
+        df = await kraken_requests.run(fetch_ohlcv, strategy.symbol, interval=strategy.interval)
         if df is not None and not df.empty:
             vwap = df['vwap'].iloc[-1]
             current_price = df['close'].iloc[-1]
-            if current_price < vwap:
-                swap_txn = uniswap_router.functions.swapExactTokensForETH(
-                    web3.to_wei(1, 'ether'),  # Swap a large amount for the test
-                    0,  # Minimum amount of ETH to receive (slippage protection, set to 0 for demo purposes)
-                    [token_address, web3.to_checksum_address(TRUST_WALLET_ADDRESS)],  # Path
-                    web3.to_checksum_address(TRUST_WALLET_ADDRESS),  # Recipient
+            if reason not in STOP_REASONS or current_price < vwap:
+                amount_in = int(web3.to_wei(1, 'ether') * fraction)  # Swap a large amount for the test
+                quote = await quote_swap(token_address, WETH_ADDRESS, amount_in)
+                swap = uniswap_router.functions.swapExactTokensForETH(
+                    amount_in,
+                    quote.amount_out_min(SLIPPAGE_TOLERANCE),  # Minimum amount of ETH to receive
+                    quote.path,  # Path
+                    web3.to_checksum_address(strategy.wallet_address),  # Recipient
                     int(time.time()) + 1000  # Deadline
-                ).buildTransaction({
-                    'from': TRUST_WALLET_ADDRESS,
-                    'gas': 2000000,
-                    'gasPrice': web3.to_wei('50', 'gwei'),
-                    'nonce': web3.eth.get_transaction_count(TRUST_WALLET_ADDRESS)
-                })
-
-                signed_swap_txn = web3.eth.account.sign_transaction(swap_txn, private_key=PRIVATE_KEY)
-                swap_tx_hash = web3.eth.send_raw_transaction(signed_swap_txn.rawTransaction)
-                sold_price = get_valid_token_price(SYMBOL)
-                log_transaction('sell', 1, sold_price)  # Log the swap of a large amount for the test
-                await send_telegram_message(f"Stop loss triggered! Opening price: ${opening_price}, Sold price: ${sold_price}, Date and time sold: {datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d %H:%M:%S')}")
-                logger.info(f"Sell order executed: {web3.to_hex(swap_tx_hash)}")
+                )
+                tx_params = {
+                    'from': strategy.wallet_address,
+                    **await rpc_requests.run(gas_oracle.fee_params)
+                }
+                tx_params['gas'] = await rpc_requests.run(gas_oracle.gas_limit, f"sell {'-'.join(quote.path)}", lambda: swap.estimate_gas(tx_params))
+                swap_txn = await rpc_requests.run(swap.build_transaction, tx_params)
+
+                pending = await strategy.pipeline.submit(swap_txn, label='sell order')
+                sold_price = await get_valid_token_price(strategy.symbol)
+                await report_progress(progress, f"{REASON_LABELS[reason]} triggered! Sold {fraction:.0%} of the position. Opening price: ${strategy.opening_price}, Sold price: ${sold_price}, Date and time sold: {datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d %H:%M:%S')}")
+                logger.info(f"Sell order executed: {web3.to_hex(pending.tx_hash)}")
+                return pending
             else:
                 logger.info(f"Current price {current_price} is not less than VWAP {vwap}. Sell order not executed.")
-                await send_telegram_message(f"Current price {current_price} is not less than VWAP {vwap}. Sell order not executed.")
+                await report_progress(progress, f"Current price {current_price} is not less than VWAP {vwap}. Sell order not executed.")
     except Exception as e:
         logger.error(f"Failed to execute sell order: {e}")
 
-def get_eth_balance():
+def get_eth_balance(address=None):
+    address = address or TRUST_WALLET_ADDRESS
     try:
-        balance = web3.eth.get_balance(TRUST_WALLET_ADDRESS)
+        try:
+            balance = chain_reader.balance(address)
+        except Exception as e:
+            # Nodes without Multicall3 (some dev chains) still answer plain reads
+            logger.warning(f"Batched balance read failed, falling back to eth_getBalance: {e}")
+            balance = web3.eth.get_balance(address)
         return web3.from_wei(balance, 'ether')
     except Exception as e:
         logger.error(f"Failed to get ETH balance: {e}")
         return 0
 
-async def check_stop_loss(token_address):
-    global stop_loss_triggered
+def settle_exit(strategy, action, price, done):
+    # Runs once the exit's sell is mined or given up on: only a confirmed sell
+    # counts as a fill, anything else arms the rule again for the next tick
+    if not done.cancelled() and done.exception() is None and done.result()['status'] == 1:
+        risk_engine.record_fill(action, price)
+    else:
+        logger.warning(f"{REASON_LABELS[action.reason]} sell for {strategy.name} was not confirmed, rearming it")
+        risk_engine.cancel(action)
+        if action.reason != TAKE_PROFIT:
+            strategy.stop_loss_triggered = False
+    start_background(save_strategy_states([strategy]), f"save_state {strategy.name}")
+
+@registry.timed('stop_loss_check')
+async def check_stop_loss(strategy, current_price, action=None):
+    # The risk engine has already checked every exit rule on this tick; action is the exit it chose, if any
+    global first_check_done
     try:
-        current_price = get_valid_token_price(SYMBOL)
-        if opening_price is not None and current_price < opening_price * STOP_LOSS_THRESHOLD:
-            await execute_sell_order(token_address)
-            stop_loss_triggered = True
+        if action is not None:
+            logger.info(f"{REASON_LABELS[action.reason]} hit for {strategy.name} at {current_price} (level {action.level:.2f})")
+            pending = await execute_sell_order(strategy.token_address, strategy, fraction=action.fraction, reason=action.reason)
+            if pending is None:
+                risk_engine.cancel(action)
+            else:
+                if action.reason != TAKE_PROFIT:
+                    strategy.stop_loss_triggered = True
+                await save_strategy_states([strategy])
+                pending.done.add_done_callback(lambda done: settle_exit(strategy, action, current_price, done))
     except Exception as e:
         logger.error(f"Failed to check stop loss: {e}")
+    if not first_check_done:
+        first_check_done = True
+        record_startup('first_stop_loss_check')
 
 def calculate_weekly_report():
-    global transactions
     try:
         one_week_ago = datetime.now() - timedelta(days=7)
-        weekly_transactions = [t for t in transactions if t['timestamp'] > one_week_ago]
-        num_transactions = len(weekly_transactions)
-        gains_losses = sum((t['price'] * t['amount']) if t['type'] == 'sell' else -(t['price'] * t['amount']) for t in weekly_transactions)
-        return num_transactions, gains_losses
+        return ledger.summary(since=one_week_ago)
     except Exception as e:
         logger.error(f"Failed to calculate weekly report: {e}")
         return 0, 0
@@ -476,9 +676,14 @@ def calculate_weekly_report():
 def send_weekly_report():
     num_transactions, gains_losses = calculate_weekly_report()
     report_date = datetime.now().strftime('%Y-%m-%d')
-    message = f"Weekly Ethereum Trading Report - {report_date}\nNumber of transactions: {num_transactions}\nGains/Losses: ${gains_losses:.2f}"
-    asyncio.run(send_telegram_message(message))
-    send_email(f"Weekly Ethereum Trading Report - {report_date}", message)
+    try:
+        gas_fees = ledger.gas_fees(since=datetime.now() - timedelta(days=7))
+    except Exception as e:
+        logger.error(f"Failed to total gas fees: {e}")
+        gas_fees = 0.0
+    message = f"Weekly Ethereum Trading Report - {report_date}\nNumber of transactions: {num_transactions}\nGains/Losses: ${gains_losses:.2f}\nGas fees: {gas_fees:.6f} ETH"
+    notifier.notify(message)
+    notifier.email(f"Weekly Ethereum Trading Report - {report_date}", message)
 
 def handle_response(command):
     responses = ["No Problem", "Let me make this happen", "At Once Sir"]
@@ -487,11 +692,118 @@ def handle_response(command):
 def fetch_1_week_moving_average():
     df = fetch_ohlcv(SYMBOL, interval=1440)  # Fetch daily OHLCV data
     if df is not None and not df.empty:
-        df['moving_average'] = df['close'].rolling(window=7).mean()
-        return df['moving_average'].iloc[-1]
+        return df['close'].rolling(window=7).mean().iloc[-1]
     else:
         return None
 
+def fetch_timeframe_summary(interval):
+    # Latest close and VWAP, and the 7-bar moving average, on any timeframe
+    df = fetch_ohlcv(SYMBOL, interval=interval)
+    if df is not None and not df.empty:
+        return df['close'].iloc[-1], df['vwap'].iloc[-1], df['close'].rolling(window=7).mean().iloc[-1]
+    else:
+        return None
+
+def load_strategies():
+    # Extra instances from STRATEGIES_FILE, each wallet with its own nonce manager
+    # and pipeline; wallets shared between instances share one pipeline
+    if not STRATEGIES_FILE:
+        return
+    pipelines = {TRUST_WALLET_ADDRESS: tx_pipeline}
+    for config in load_strategy_configs(STRATEGIES_FILE):
+        wallet = config['wallet']
+        swap_indexer.watch(wallets=[wallet], tokens=[config['token_address']])
+        if wallet not in pipelines:
+            chain_reader.watch(wallets=[wallet], tokens=[config['token_address']])
+            private_key = os.getenv(config['private_key_env'])
+            pipelines[wallet] = TransactionPipeline(web3, rpc_requests, NonceManager(web3, wallet, chain_reader=chain_reader), private_key, on_receipt=report_receipt, state_store=state_store)
+        strategy = StrategyInstance(config['name'], config['symbol'], wallet, config['token_address'], pipeline=pipelines[wallet],
+                                    stop_loss_threshold=config.get('stop_loss_threshold', STOP_LOSS_THRESHOLD),
+                                    interval=config.get('interval', 1440), ws_symbol=config.get('ws_symbol'),
+                                    trailing_stop=config.get('trailing_stop', TRAILING_STOP), take_profit=config.get('take_profit', TAKE_PROFIT_LADDER),
+                                    volatility_multiplier=config.get('volatility_multiplier', VOLATILITY_STOP_MULTIPLIER))
+        if strategy.ws_symbol:
+            price_feed.transport.pairs[strategy.ws_symbol] = strategy.symbol
+        if config.get('coingecko_id'):
+            coingecko_ids[strategy.symbol] = config['coingecko_id']
+        strategy_runner.add(strategy)
+    logger.info(f"Running {len(strategy_runner.instances)} strategy instances")
+
+def restore_state():
+    # Rearms every strategy from the last run and marks candle stores refreshed
+    # just before a restart as fresh, so the first stop-loss check needs no
+    # Kraken round-trip. Returns the transactions still awaiting receipts.
+    state = state_store.load()
+    strategies = state.get('strategies', {})
+    for strategy in strategy_runner.instances:
+        if strategy.name in strategies:
+            strategy.restore(strategies[strategy.name])
+            logger.info(f"Restored {strategy.name}: opening price {strategy.opening_price}, stop loss triggered {strategy.stop_loss_triggered}")
+    for key, last_refresh in state.get('candles', {}).items():
+        symbol, interval = key.rsplit(':', 1)
+        if int(interval) == CANDLE_BASE_INTERVAL:
+            get_candle_store(symbol, CANDLE_BASE_INTERVAL)
+        get_native_candle_store(symbol, int(interval)).last_refresh = last_refresh
+    record_startup('state_restored')
+    return state.get('pending', {})
+
+def start_background(coro, name):
+    # Kept until it finishes so a failure is logged rather than lost with the
+    # task, and so shutdown can cancel whatever is still running
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(finish_background)
+    return task
+
+def finish_background(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+async def stop_background():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+async def resume_transactions(records):
+    pipelines = {s.pipeline.nonce_manager.address: s.pipeline for s in strategy_runner.instances if s.pipeline is not None}
+    by_wallet = {}
+    for key, record in records.items():
+        by_wallet.setdefault(key.rsplit(':', 1)[0], []).append(record)
+    for wallet, wallet_records in by_wallet.items():
+        if wallet not in pipelines:
+            logger.warning(f"No strategy trades from {wallet}, ignoring {len(wallet_records)} journaled transactions")
+            continue
+        try:
+            await pipelines[wallet].resume(wallet_records)
+        except Exception as e:
+            logger.error(f"Failed to resume transactions for {wallet}: {e}")
+
+def save_state():
+    # Candle refresh times only matter for a quick restart, so they are written
+    # with the shutdown snapshot rather than journaled on every change. Trailing
+    # highs are journaled as they move, a few seconds apart; this saves the last ones.
+    for strategy in strategy_runner.instances:
+        state_store.apply('strategies', strategy.name, strategy.state())
+    for (symbol, interval), store in candle_stores.items():
+        if store.last_refresh:
+            state_store.apply('candles', f"{symbol}:{interval}", store.last_refresh)
+    if swap_indexer.last_block is not None:
+        state_store.apply('swap_index', 'block', swap_indexer.last_block)
+    state_store.close()
+
+# Initialize shared market data and strategy runner
+market_data = MarketData(kraken_requests, get_candle_store, get_token_price)
+strategy_runner = StrategyRunner(market_data, [default_strategy], check_stop_loss, risk_engine=risk_engine, on_state=save_strategy_states, state_interval=RISK_STATE_INTERVAL)
+
+# Initialize cached command data and background chat orders
+command_snapshot = SnapshotCache({
+    'eth_balance': lambda: rpc_requests.run(get_eth_balance),
+    'price': lambda: get_valid_token_price(SYMBOL),
+    'moving_average': lambda: kraken_requests.run(fetch_1_week_moving_average)
+}, refresh_interval=SNAPSHOT_REFRESH_SECONDS, max_age=SNAPSHOT_MAX_AGE)
+order_tasks = OrderTasks(send_telegram)
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     commands = """
     /start - Initializes the bot and confirms it is online
@@ -499,59 +811,108 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     /sell - Executes a sell order
     /status - Provides the current status of the bot
     /balance - Shows the current ETH balance and potential gain/loss
-    /market - Provides the 1-week moving average of ETH
+    /market [timeframe] - Provides the 1-week moving average of ETH, plus close/VWAP on a timeframe such as 15m or 4h
     /hello - Sends a welcoming message
+    /perf - Shows p50/p99 latency of each stage and external call
     """
     response = f"ETH BOT is online! Here are the available commands:\n{commands}"
     await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
     logger.info(response)
 
-async def buy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    response = handle_response("buy")
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
-    logger.info(response)
+async def confirm_order(kind, pending):
+    # Waits for the order's receipt (shielded, so giving up on the order leaves
+    # the pipeline's tracking alone) and describes how it ended
+    if pending is None:
+        return f"{kind.capitalize()} order not executed", "n/a"
+    receipt = await asyncio.shield(pending.done)
+    status = "confirmed" if receipt['status'] == 1 else "failed"
+    return f"{kind.capitalize()} order {status} in block {receipt['blockNumber']}", f"{web3.from_wei(fee_paid(receipt), 'ether')} ETH"
+
+async def run_buy_order(progress):
     token_address = ETH_TOKEN_ADDRESS
-    await execute_buy_order(token_address, get_eth_balance())
-    eth_balance = get_eth_balance()
-    gas_fee = "0.02 ETH"  # Replace with actual gas fee calculation if needed
-    response = f"Buy order executed. Amount: {eth_balance} ETH, Cost: {get_valid_token_price(SYMBOL)} USD, Gas Fee: {gas_fee}"
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
+    with priority(PRIORITY_TRADE):
+        pending = await execute_buy_order(token_address, await rpc_requests.run(get_eth_balance), progress=progress)
+    outcome, gas_fee = await confirm_order('buy', pending)
+    with priority(PRIORITY_TRADE):
+        eth_balance = await rpc_requests.run(get_eth_balance)
+        current_price = await get_valid_token_price(SYMBOL)
+    command_snapshot.invalidate('eth_balance')
+    response = f"{outcome}. Amount: {eth_balance} ETH, Cost: {current_price} USD, Gas Fee: {gas_fee}"
     logger.info(response)
+    return response
 
-async def sell_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    response = handle_response("sell")
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
-    logger.info(response)
+async def run_sell_order(progress):
     token_address = ETH_TOKEN_ADDRESS
-    await execute_sell_order(token_address)
-    eth_balance = get_eth_balance()
-    gas_fee = "0.02 ETH"  # Replace with actual gas fee calculation if needed
-    response = f"Sell order executed. Amount: {eth_balance} ETH, Sold at: {get_valid_token_price(SYMBOL)} USD, Gas Fee: {gas_fee}"
+    with priority(PRIORITY_TRADE):
+        pending = await execute_sell_order(token_address, progress=progress)
+    outcome, gas_fee = await confirm_order('sell', pending)
+    with priority(PRIORITY_TRADE):
+        eth_balance = await rpc_requests.run(get_eth_balance)
+        current_price = await get_valid_token_price(SYMBOL)
+    command_snapshot.invalidate('eth_balance')
+    response = f"{outcome}. Amount: {eth_balance} ETH, Sold at: {current_price} USD, Gas Fee: {gas_fee}"
+    logger.info(response)
+    return response
+
+async def start_order(update, context, kind, run):
+    # The order runs in the background and reports its progress and outcome, so
+    # this handler (and every update behind it) returns straight away
+    response = handle_response(kind)
+    if order_tasks.start(kind, update.effective_chat.id, run) is None:
+        response = f"A {kind} order is already in progress."
     await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
     logger.info(response)
 
+async def buy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await start_order(update, context, "buy", run_buy_order)
+
+async def sell_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await start_order(update, context, "sell", run_sell_order)
+
+async def format_balance():
+    # Served from the background snapshot; only a missing or expired value is fetched
+    with priority(PRIORITY_QUERY):
+        eth_balance, current_price = await command_snapshot.get_many('eth_balance', 'price')
+    potential_gain_loss = (current_price - default_strategy.opening_price) * float(eth_balance) if default_strategy.opening_price else 0
+    age = command_snapshot.age('eth_balance') or 0
+    price_age = command_snapshot.age('price') or 0
+    return f"ETH Balance: {eth_balance} ETH ({age:.0f}s ago)\nPrice: ${current_price:.2f} ({price_age:.0f}s ago)\nPotential Gain/Loss: ${potential_gain_loss:.2f}"
+
+def format_orders():
+    return ", ".join(f"{kind} ({age:.0f}s)" for kind, age in order_tasks.summary()) or "none"
+
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    eth_balance = get_eth_balance()
-    current_price = get_valid_token_price(SYMBOL)
-    potential_gain_loss = (current_price - opening_price) * eth_balance if opening_price else 0
-    response = f"ETH Balance: {eth_balance} ETH\nPotential Gain/Loss: ${potential_gain_loss:.2f}"
+    lag = loop_lag_monitor.summary()
+    response = f"{await format_balance()}\nOrders in progress: {format_orders()}\nEvent loop lag: {lag['avg'] * 1000:.1f} ms avg, {lag['max'] * 1000:.1f} ms max\nQuotes: {format_quote_stats()}\nRequests: {format_request_stats()}"
     await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
     logger.info(response)
 
 async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    eth_balance = get_eth_balance()
-    current_price = get_valid_token_price(SYMBOL)
-    potential_gain_loss = (current_price - opening_price) * eth_balance if opening_price else 0
-    response = f"ETH Balance: {eth_balance} ETH\nPotential Gain/Loss: ${potential_gain_loss:.2f}"
+    response = await format_balance()
     await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
     logger.info(response)
 
 async def market_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    moving_average = fetch_1_week_moving_average()
+    try:
+        interval = parse_timeframe(context.args[0]) if context.args else None
+    except ValueError as e:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text=str(e))
+        return
+    with priority(PRIORITY_QUERY):
+        moving_average = await command_snapshot.get('moving_average')
+        summary = await kraken_requests.run(fetch_timeframe_summary, interval) if interval else None
     if moving_average:
         response = f"The 1-week moving average of ETH is ${moving_average:.2f}"
     else:
         response = "Failed to fetch the 1-week moving average of ETH."
+    if summary:
+        close, vwap, ma = summary
+        response += f"\n{context.args[0]} bars: close ${close:.2f}, VWAP ${vwap:.2f}, 7-bar MA ${ma:.2f}"
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
+    logger.info(response)
+
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    response = format_perf()
     await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
     logger.info(response)
 
@@ -582,44 +943,99 @@ async def handle_error(update: Update, context: ContextTypes.DEFAULT_TYPE, error
     logger.error(f"Update {update} caused error {error}")
     logger.info(f"Update {update} caused error {error}")
 
+def record_startup(milestone):
+    elapsed = time.perf_counter() - started_at
+    registry.gauge('startup_seconds', milestone=milestone).set(elapsed)
+    logger.info(f"Startup: {milestone} after {elapsed:.2f}s")
+
+async def warm_clients():
+    # Imports and connects the deferred clients on the I/O pool, off the event loop
+    await asyncio.gather(*(io_executor.run(client.warm, timeout=CLIENT_INIT_TIMEOUT) for client in (web3, uniswap_router, coingecko_client, bot)), return_exceptions=True)
+    record_startup('clients_ready')
+
+async def run_strategy_loop():
+    while True:
+        # Refresh shared candles and prices, then check every strategy's stop loss
+        await strategy_runner.run_once()
+        registry.counter('loop_iterations_total').inc()
+
+        schedule.run_pending()
+        await asyncio.sleep(1)  # Run polling every second
+
+async def run_swap_indexer():
+    # Catches the ledger up with the chain one eth_getLogs batch at a time
+    # through the RPC queue, then checks for new blocks every few seconds
+    while True:
+        try:
+            while await rpc_requests.run(swap_indexer.step):
+                pass
+        except Exception as e:
+            logger.error(f"Swap indexer failed: {e}")
+        await asyncio.sleep(SWAP_INDEX_INTERVAL)
+
 # Setup Telegram bot application
+async def start_telegram():
+    # telegram.ext takes a while to import, so that happens on the I/O pool
+    await io_executor.run(importlib.import_module, 'telegram.ext', timeout=CLIENT_INIT_TIMEOUT)
+    from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, filters
+
+    # Updates are handled concurrently, so a slow command never queues the ones behind it
+    application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("buy", buy_command))
+    application.add_handler(CommandHandler("sell", sell_command))
+    application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("balance", balance_command))
+    application.add_handler(CommandHandler("market", market_command))
+    application.add_handler(CommandHandler("hello", hello_command))
+    application.add_handler(CommandHandler("perf", perf_command))
+    application.add_handler(MessageHandler(filters.TEXT, handle_message))
+    application.add_error_handler(handle_error)
+    await application.initialize()
+    await application.start()
+    return application
+
 async def main():
+    # SIGINT/SIGTERM cancel main, which then says goodbye and flushes notifications
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, asyncio.current_task().cancel)
+    notifier.start()
     try:
-        application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-        application.add_handler(CommandHandler("start", start_command))
-        application.add_handler(CommandHandler("buy", buy_command))
-        application.add_handler(CommandHandler("sell", sell_command))
-        application.add_handler(CommandHandler("status", status_command))
-        application.add_handler(CommandHandler("balance", balance_command))
-        application.add_handler(CommandHandler("market", market_command))
-        application.add_handler(CommandHandler("hello", hello_command))
-        application.add_handler(MessageHandler(filters.TEXT, handle_message))
-        application.add_error_handler(handle_error)
-        await application.initialize()
-        await application.start()
-        await send_telegram_message("ETH BOT is online")
-        while True:
-            # Fetch historical data and check stop loss
-            historical_data = fetch_ohlcv(SYMBOL, interval=1440)
-            if historical_data is not None:
-                # Check stop loss based on the fetched data
-                await check_stop_loss(ETH_TOKEN_ADDRESS)
-
-            schedule.run_pending()
-            await asyncio.sleep(1)  # Run polling every second
+        tx_pipeline.on_receipt = report_receipt
+        schedule.every().monday.at(WEEKLY_REPORT_TIME).do(send_weekly_report)
+        load_strategies()
+        pending_records = restore_state()
+        price_feed.start()
+        loop_lag_monitor.start()
+        if not FAST_START:
+            await warm_clients()
+        # The stop-loss loop runs from here on; Telegram and the clients it doesn't need come up behind it
+        loop_task = asyncio.get_running_loop().create_task(run_strategy_loop())
+        record_startup('loop_started')
+        if pending_records:
+            start_background(resume_transactions(pending_records), 'resume_transactions')
+        start_background(run_swap_indexer(), 'swap_indexer')
+        if FAST_START:
+            start_background(warm_clients(), 'warm_clients')
+        await metrics_server.start()
+        command_snapshot.start()
+        await start_telegram()
+        record_startup('telegram_ready')
+        notifier.notify("ETH BOT is online")
+        await loop_task
 
+    except asyncio.CancelledError:
+        logger.info("Shutting down")
     except Exception as e:
         logger.error(f"Error in main function: {e}")
-        await send_telegram_message("ETH BOT is offline")
-
-# Signal handler to send offline message on termination
-def signal_handler(sig, frame):
-    asyncio.run(send_telegram_message("ETH BOT is offline"))
-    logger.info("ETH BOT is offline")
-    exit(0)
-
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+    finally:
+        await stop_background()
+        notifier.notify("ETH BOT is offline")
+        await notifier.close()
+        save_state()
+        ledger.close()
+        logger.info("ETH BOT is offline")
 
 # Run the main function with asyncio
 if __name__ == '__main__':
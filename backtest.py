@@ -0,0 +1,172 @@
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from indicators import rolling_sum
+from reporting import summarize_transactions
+
+logger = logging.getLogger()
+
+GAS_USED = 150000  # Typical gas used by a Uniswap V2 swap
+GAS_PRICE_GWEI = 50  # Effective gas price assumed for every fill
+SLIPPAGE = 0.003  # Fraction of price lost on each fill
+SEARCH_CHUNK = 4096  # Bars scanned at a time while looking for an exit
+
+def load_ohlcv(path):
+    # Accepts candle store Parquet files and CSV/Parquet exports with either a
+    # Kraken 'time' column (epoch seconds) or a 'timestamp' column
+    df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    if 'time' not in df.columns:
+        if 'timestamp' in df.columns:
+            stamps = pd.to_datetime(df['timestamp'])
+        else:
+            stamps = pd.to_datetime(df.index)
+        df['time'] = (stamps - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    df = df.sort_values('time').reset_index(drop=True)
+    logger.info(f"Loaded {len(df)} bars from {path}")
+    return df
+
+def rolling_vwap(high, low, close, volume, window=14):
+    return rolling_sum((high + low + close) / 3.0 * volume, window) / rolling_sum(volume, window)
+
+def moving_average(close, window):
+    return rolling_sum(close, window) / window
+
+def bar_vwap(df, window=None):
+    # Kraken OHLC rows carry their own VWAP, which is what the live bot compares
+    # against; other exports, or an explicit window, use ta's rolling VWAP
+    if window is None and 'vwap' in df.columns:
+        return df['vwap'].to_numpy(dtype=float)
+    columns = [df[c].to_numpy(dtype=float) for c in ('high', 'low', 'close', 'volume')]
+    return rolling_vwap(*columns, window=window or 14)
+
+class Backtester:
+    # Replays bars through the live rules: buy when close > VWAP, and sell when
+    # the price is below opening_price * STOP_LOSS_THRESHOLD and execute_sell_order's
+    # close < VWAP check passes. The signals are computed for the whole history
+    # at once, and the only Python loop is over trades. ma_window optionally
+    # adds a moving-average trend filter to the entry.
+    def __init__(self, stop_loss_threshold=0.975, amount=1.0, slippage=SLIPPAGE, gas_used=GAS_USED, gas_price_gwei=GAS_PRICE_GWEI, exit_below_vwap=False, vwap_window=None, ma_window=None):
+        self.stop_loss_threshold = stop_loss_threshold
+        self.vwap_window = vwap_window
+        self.ma_window = ma_window
+        self.amount = amount
+        self.slippage = slippage
+        self.gas_used = gas_used
+        self.gas_price_gwei = gas_price_gwei
+        self.exit_below_vwap = exit_below_vwap
+
+    def gas_cost(self, price):
+        return self.gas_used * self.gas_price_gwei * 1e-9 * price
+
+    def find_exit(self, close, below_vwap, start, stop_price):
+        n = len(close)
+        chunk = SEARCH_CHUNK
+        while start < n:
+            end = min(n, start + chunk)
+            if self.exit_below_vwap:
+                hits = np.flatnonzero(below_vwap[start:end])
+            else:
+                hits = np.flatnonzero((close[start:end] < stop_price) & below_vwap[start:end])
+            if len(hits):
+                return start + int(hits[0])
+            start = end
+            chunk *= 2
+        return None
+
+    def trades(self, close, vwap, ma=None):
+        entry_mask = close > vwap
+        if ma is not None:
+            entry_mask &= close > ma
+        entries = np.flatnonzero(entry_mask)
+        below_vwap = close < vwap
+        i = 0
+        while True:
+            k = np.searchsorted(entries, i)
+            if k == len(entries):
+                return
+            entry = int(entries[k])
+            exit_index = self.find_exit(close, below_vwap, entry + 1, close[entry] * self.stop_loss_threshold)
+            yield entry, exit_index
+            if exit_index is None:
+                return
+            i = exit_index + 1
+
+    def run(self, df):
+        close = df['close'].to_numpy(dtype=float)
+        ma = moving_average(close, self.ma_window) if self.ma_window else None
+        return self.run_arrays(df['time'].to_numpy(), close, bar_vwap(df, self.vwap_window), ma)
+
+    def run_arrays(self, times, close, vwap, ma=None):
+        started = time.perf_counter()
+        n = len(close)
+        transactions = []
+        gas_usd = 0.0
+        position = None
+        # Equity is built from per-bar realized cash changes plus the mark of any
+        # open position, filled in slices so the drawdown stays vectorized
+        cash_flow = np.zeros(n)
+        held_cost = np.full(n, np.nan)
+        for entry, exit_index in self.trades(close, vwap, ma):
+            buy_price = close[entry] * (1 + self.slippage)
+            buy_gas = self.gas_cost(close[entry])
+            transactions.append({'type': 'buy', 'amount': self.amount, 'price': buy_price, 'timestamp': pd.to_datetime(times[entry], unit='s')})
+            gas_usd += buy_gas
+            cash_flow[entry] -= buy_gas
+            end = n if exit_index is None else exit_index
+            held_cost[entry:end] = buy_price
+            position = buy_price
+            if exit_index is not None:
+                sell_price = close[exit_index] * (1 - self.slippage)
+                sell_gas = self.gas_cost(close[exit_index])
+                transactions.append({'type': 'sell', 'amount': self.amount, 'price': sell_price, 'timestamp': pd.to_datetime(times[exit_index], unit='s')})
+                gas_usd += sell_gas
+                cash_flow[exit_index] += self.amount * (sell_price - buy_price) - sell_gas
+                position = None
+
+        equity = np.cumsum(cash_flow) + np.nan_to_num(self.amount * (close - held_cost))
+        max_drawdown = float(np.max(np.maximum.accumulate(np.maximum(equity, 0.0)) - equity)) if n else 0.0
+        num_transactions, gains_losses = summarize_transactions(transactions)
+        open_value = self.amount * close[-1] if position is not None and n else 0.0
+        return {
+            'bars': n,
+            'transactions': transactions,
+            'num_transactions': num_transactions,
+            'gains_losses': gains_losses,
+            'gas_usd': gas_usd,
+            'open_position_value': open_value,
+            'net_pnl': gains_losses + open_value - gas_usd,
+            'max_drawdown': max_drawdown,
+            'seconds': time.perf_counter() - started
+        }
+
+def format_report(result):
+    return (f"Backtest Report - {result['bars']} bars\n"
+            f"Number of transactions: {result['num_transactions']}\n"
+            f"Gains/Losses: ${result['gains_losses']:.2f}\n"
+            f"Gas: ${result['gas_usd']:.2f}\n"
+            f"Open position value: ${result['open_position_value']:.2f}\n"
+            f"Net PnL: ${result['net_pnl']:.2f}\n"
+            f"Max drawdown: ${result['max_drawdown']:.2f}\n"
+            f"Ran in {result['seconds']:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay OHLCV history through the ETH Bot strategy")
+    parser.add_argument('path', help="CSV or Parquet file with OHLCV bars")
+    parser.add_argument('--stop-loss', type=float, default=0.975)
+    parser.add_argument('--amount', type=float, default=1.0)
+    parser.add_argument('--slippage', type=float, default=SLIPPAGE)
+    parser.add_argument('--gas-used', type=int, default=GAS_USED)
+    parser.add_argument('--gas-price-gwei', type=float, default=GAS_PRICE_GWEI)
+    parser.add_argument('--vwap-window', type=int, default=None, help="Use a rolling VWAP over this many bars instead of Kraken's per-bar VWAP")
+    parser.add_argument('--ma-window', type=int, default=None, help="Only enter above the moving average over this many bars")
+    parser.add_argument('--exit-below-vwap', action='store_true', help="Sell on any close below VWAP, not only on stop-loss")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backtester = Backtester(args.stop_loss, args.amount, args.slippage, args.gas_used, args.gas_price_gwei, args.exit_below_vwap, args.vwap_window, args.ma_window)
+    print(format_report(backtester.run(load_ohlcv(args.path))))
+
+if __name__ == '__main__':
+    main()
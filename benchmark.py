@@ -0,0 +1,477 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import threading
+import tempfile
+import subprocess
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from eth_abi import encode, decode
+from web3 import Web3
+from candle_store import CandleStore, parse_ohlc
+from indicators import IndicatorEngine
+from strategy_runner import StrategyInstance
+from risk_engine import RiskEngine, TAKE_PROFIT
+from chain_reader import ChainReader, AGGREGATE3, GET_BLOCK_NUMBER, GET_ETH_BALANCE, BALANCE_OF, GET_RESERVES
+from swap_quoter import SwapQuoter, WETH_ADDRESS
+from tx_pipeline import NonceManager, TransactionPipeline
+from ledger import TradeLedger
+from swap_indexer import SwapIndexer, SWAP_TOPIC, address_topic
+try:
+    from eth_account import Account
+except ImportError:
+    Account = None
+
+logger = logging.getLogger()
+
+FIXTURE_DIR = 'fixtures'
+SYMBOL = 'XETHZUSD'
+INTERVAL = 1440
+KRAKEN_REST_URL = 'https://api.kraken.com/0/public'
+BENCH_PRIVATE_KEY = '0x' + '42' * 32  # Throwaway key, only ever used to sign transactions that are never sent
+BENCH_WALLET = Account.from_key(BENCH_PRIVATE_KEY).address if Account is not None else '0x' + '11' * 20  # Signing is skipped without eth_account
+BENCH_TOKEN = '0x' + '22' * 20
+BENCH_PAIR = '0x' + '33' * 20
+RISK_POSITIONS = (10, 1000, 100000)  # Position counts the risk engine pass is timed at
+STUB_HEAD_BLOCK = 19_100_000  # Chain head the stub RPC reports
+STUB_SWAP_EVERY = 500  # The stub chain has one wallet swap every this many blocks
+INDEX_BLOCKS = 50000  # Blocks the swap indexer catches up over
+
+def record_fixtures(fixture_dir, symbol=SYMBOL, interval=INTERVAL):
+    # Captures live Kraken OHLC and Ticker responses so later runs are offline and repeatable
+    os.makedirs(fixture_dir, exist_ok=True)
+    for name, method, params in (('ohlc', 'OHLC', {'pair': symbol, 'interval': interval}), ('ticker', 'Ticker', {'pair': symbol})):
+        response = requests.get(f"{KRAKEN_REST_URL}/{method}", params=params, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(fixture_dir, f"{name}.json"), 'w') as f:
+            json.dump(response.json(), f)
+    logger.info(f"Recorded Kraken fixtures for {symbol} into {fixture_dir}")
+
+def synthetic_fixtures(symbol=SYMBOL, interval=INTERVAL, bars=720, seed=7):
+    # Kraken-shaped responses from a seeded random walk, for machines that have
+    # never recorded real ones. Same seed, same bytes.
+    rng = random.Random(seed)
+    start = 1_600_000_000 - 1_600_000_000 % (interval * 60)
+    price, rows = 2000.0, []
+    for i in range(bars):
+        open_ = price
+        price = max(1.0, price * (1 + rng.gauss(0, 0.02)))
+        high = max(open_, price) * (1 + abs(rng.gauss(0, 0.005)))
+        low = min(open_, price) * (1 - abs(rng.gauss(0, 0.005)))
+        vwap = (open_ + high + low + price) / 4
+        rows.append([start + i * interval * 60, f"{open_:.2f}", f"{high:.2f}", f"{low:.2f}", f"{price:.2f}", f"{vwap:.2f}", f"{rng.uniform(1000, 50000):.8f}", rng.randint(1000, 90000)])
+    ohlc = {'error': [], 'result': {symbol: rows, 'last': rows[-2][0]}}
+    ticker = {'error': [], 'result': {symbol: {'c': [f"{price:.2f}", '1.0']}}}
+    return ohlc, ticker
+
+def load_fixtures(fixture_dir, symbol=SYMBOL, interval=INTERVAL):
+    paths = [os.path.join(fixture_dir, f"{name}.json") for name in ('ohlc', 'ticker')]
+    if all(os.path.exists(p) for p in paths):
+        fixtures = []
+        for path in paths:
+            with open(path) as f:
+                fixtures.append(json.load(f))
+        symbol = next(k for k in fixtures[0]['result'] if k != 'last')
+        return symbol, fixtures[0], fixtures[1], 'recorded'
+    logger.warning(f"No recorded fixtures in {fixture_dir}, benchmarking on synthetic bars; run with --record to capture Kraken's")
+    return symbol, *synthetic_fixtures(symbol, interval), 'synthetic'
+
+class FixtureKrakenClient:
+    # Stands in for krakenex.API, answering from recorded responses. OHLC honours
+    # 'since' the way Kraken does, so incremental refreshes see only new bars.
+    def __init__(self, ohlc, ticker):
+        self.ohlc = ohlc
+        self.ticker = ticker
+
+    def query_public(self, method, params=None, timeout=None):
+        params = params or {}
+        if method == 'Ticker':
+            return self.ticker
+        if method == 'OHLC':
+            since = params.get('since')
+            if since is None:
+                return self.ohlc
+            result = {symbol: [row for row in rows if row[0] >= since] for symbol, rows in self.ohlc['result'].items() if symbol != 'last'}
+            result['last'] = self.ohlc['result']['last']
+            return {'error': [], 'result': result}
+        return {'error': [f"EGeneral:Unknown method {method}"]}
+
+def stub_swap_log(block):
+    # The stub chain's buy in a block; the tx hash encodes the block number
+    amounts = encode(['uint256'] * 4, [10 ** 17, 0, 0, 2 * 10 ** 20])
+    return {'address': BENCH_PAIR, 'blockNumber': hex(block), 'transactionHash': '0x' + block.to_bytes(32, 'big').hex(),
+            'topics': [SWAP_TOPIC, address_topic(BENCH_PAIR), address_topic(BENCH_WALLET)], 'data': '0x' + amounts.hex()}
+
+class StubRPCHandler(BaseHTTPRequestHandler):
+    # Answers the JSON-RPC the bot sends: Multicall3 aggregate3 reads,
+    # eth_getTransactionCount, and the logs, receipts and headers the swap
+    # indexer reads. Reserves make 1 ETH worth about 2000 tokens.
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        batch = body if isinstance(body, list) else [body]
+        out = [{'jsonrpc': '2.0', 'id': r['id'], 'result': self.answer(r['method'], r['params'])} for r in batch]
+        payload = json.dumps(out if isinstance(body, list) else out[0]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def answer(self, method, params):
+        if method == 'eth_call':
+            data = bytes.fromhex(params[0]['data'][2:])
+            if data[:4] != AGGREGATE3:
+                return '0x'
+            (calls,) = decode(['(address,bool,bytes)[]'], data[4:])
+            results = []
+            for _, _, calldata in calls:
+                if calldata[:4] == GET_BLOCK_NUMBER:
+                    results.append((True, encode(['uint256'], [19_000_000])))
+                elif calldata[:4] in (GET_ETH_BALANCE, BALANCE_OF):
+                    results.append((True, encode(['uint256'], [10 ** 19])))
+                elif calldata[:4] == GET_RESERVES:
+                    results.append((True, encode(['uint112', 'uint112', 'uint32'], [2 * 10 ** 25, 10 ** 22, 0])))
+                else:
+                    results.append((False, b''))
+            return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
+        if method == 'eth_getTransactionCount':
+            return '0x7'
+        if method == 'eth_blockNumber':
+            return hex(STUB_HEAD_BLOCK)
+        if method == 'eth_getLogs':
+            start, end = int(params[0]['fromBlock'], 16), int(params[0]['toBlock'], 16)
+            if params[0]['topics'][0] != SWAP_TOPIC:
+                return []
+            return [stub_swap_log(b) for b in range(start + -start % STUB_SWAP_EVERY, end + 1, STUB_SWAP_EVERY)]
+        if method == 'eth_getTransactionReceipt':
+            block = int(params[0], 16)
+            return {'transactionHash': params[0], 'from': BENCH_WALLET.lower(), 'blockNumber': hex(block), 'status': '0x1', 'gasUsed': hex(120000), 'effectiveGasPrice': hex(20 * 10 ** 9), 'logs': [stub_swap_log(block)]}
+        if method == 'eth_getBlockByNumber':
+            return {'number': params[0], 'timestamp': hex(1_700_000_000 + 12 * (int(params[0], 16) - STUB_HEAD_BLOCK))}
+        return '0x1'
+
+    def log_message(self, *args):
+        pass
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    # Accepts Bot API sendMessage calls and answers like Telegram does
+    message_id = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        StubTelegramHandler.message_id += 1
+        payload = json.dumps({'ok': True, 'result': {'message_id': StubTelegramHandler.message_id, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'private'}, 'text': ''}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def timing_stats(samples):
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'mean': sum(ordered) / len(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p99': ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))],
+        'min': ordered[0],
+        'max': ordered[-1]
+    }
+
+def measure(func, repeat, warmup=2):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return timing_stats(samples)
+
+async def measure_async(func, repeat, warmup=2):
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - started)
+    return timing_stats(samples)
+
+def bench_parsing(results, ohlc, kraken, symbol, repeat):
+    rows = ohlc['result'][symbol]
+    results['parse_ohlc'] = measure(lambda: parse_ohlc(rows), repeat)
+    results['fetch_ohlcv_cold'] = measure(lambda: CandleStore(kraken, symbol, INTERVAL, data_dir=None).get(), repeat)
+    store = CandleStore(kraken, symbol, INTERVAL, data_dir=None)
+    store.get()
+    results['fetch_ohlcv_incremental'] = measure(lambda: store.refresh(force=True), repeat)
+    return store.df
+
+def bench_indicators(results, df, repeat):
+    results['indicators_full'] = measure(lambda: IndicatorEngine().apply(df), repeat)
+    engine = IndicatorEngine()
+    engine.apply(df)
+    results['indicators_incremental'] = measure(lambda: engine.apply(df), repeat)
+
+class OfflineRouter:
+    # The router contract with the bot's ABI on a provider-less Web3: the calldata
+    # is the real encoding, while the chain id and gas estimate are filled in here
+    def __init__(self, contract, gas=150000, chain_id=1):
+        self.contract = contract
+        self.gas = gas
+        self.chain_id = chain_id
+        self.functions = self
+
+    def __getattr__(self, name):
+        function = getattr(self.contract.functions, name)
+        return lambda *args: OfflineSwap(self, function(*args))
+
+class OfflineSwap:
+    def __init__(self, router, call):
+        self.router = router
+        self.call = call
+
+    def estimate_gas(self, params):
+        return self.router.gas
+
+    def build_transaction(self, params):
+        return self.call.build_transaction(dict(params, chainId=self.router.chain_id))
+
+class PrepareOnlyPipeline:
+    # Stands in for a strategy's pipeline: signs through the real one, then hands
+    # the nonce back instead of broadcasting
+    def __init__(self, pipeline, io_executor):
+        self.pipeline = pipeline
+        self.io_executor = io_executor
+
+    async def submit(self, transaction, label='transaction'):
+        pending = await self.io_executor.run(self.pipeline.prepare, transaction, label)
+        self.pipeline.nonce_manager.release(pending.nonce)
+        pending.hashes.append(pending.signed.hash)
+        return pending
+
+async def bench_bot(results, sim, instances, repeat):
+    # ETH_Bot itself, imported against the simulator's fakes of Kraken, the node
+    # and Telegram, the way simulate.py runs it.
+    # bot_loop_iteration: one strategy_runner.run_once() over every instance with a
+    # streamed price, as run_strategy_loop does each second.
+    # bot_stop_loss_check: check_stop_loss with the risk engine's exit for a
+    # crashed price, through the VWAP gate, quote, build, sign and broadcast.
+    # bot_sell_build: execute_sell_order up to strategy.pipeline.prepare, with the
+    # router's real ABI encoding and an eth_account signature, not broadcast.
+    bot = sim.bot
+    bot.strategy_runner.on_price = bot.check_stop_loss
+    for provider in (bot.kraken_requests, bot.coingecko_requests, bot.rpc_requests):
+        # The queues stay in the path, but repeated runs must not end up timing waits for tokens
+        provider.rate = provider.max_rate = provider.burst = provider.tokens = 1e6
+    strategy = bot.default_strategy
+    for i in range(1, instances):
+        bot.strategy_runner.add(StrategyInstance(f"bench-{i}", strategy.symbol, strategy.wallet_address, strategy.token_address, pipeline=strategy.pipeline,
+                                                 stop_loss_threshold=strategy.stop_loss_threshold, interval=strategy.interval, ws_symbol=strategy.ws_symbol,
+                                                 trailing_stop=strategy.trailing_stop, take_profit=strategy.take_profit, volatility_multiplier=strategy.volatility_multiplier))
+    price = sim.market.price
+    crash = price * strategy.stop_loss_threshold * 0.9
+    sim.market.update(crash)  # The day's bar closes under its VWAP, so a stop's sell is not held back
+    for instance in bot.strategy_runner.instances:
+        instance.opening_price = price
+
+    async def iteration():
+        bot.price_feed.update(strategy.symbol, price)
+        await bot.strategy_runner.run_once()
+        await asyncio.gather(*(s.task for s in bot.strategy_runner.instances if s.task is not None))
+    results['bot_loop_iteration'] = await measure_async(iteration, repeat)
+    results['bot_loop_iteration']['instances'] = instances
+
+    sent = len(sim.chain.sent)
+
+    async def stop_loss():
+        strategy.opening_price = price
+        strategy.stop_loss_triggered = False
+        action = next(a for a in bot.risk_engine.evaluate({strategy.symbol: crash}) if a.name == strategy.name)
+        await bot.check_stop_loss(strategy, crash, action)
+    results['bot_stop_loss_check'] = await measure_async(stop_loss, repeat)
+    results['bot_stop_loss_check']['sells'] = len(sim.chain.sent) - sent
+
+    if Account is None:
+        results['bot_sell_build'] = {'skipped': 'eth_account is not installed'}
+        return
+    bot.chain_reader.watch(wallets=[BENCH_WALLET], tokens=[strategy.token_address])
+    signer = TransactionPipeline(SimpleNamespace(eth=SimpleNamespace(account=Account)), None, NonceManager(bot.web3, BENCH_WALLET, chain_reader=bot.chain_reader), BENCH_PRIVATE_KEY)
+    seller = StrategyInstance('bench-sell', strategy.symbol, BENCH_WALLET, strategy.token_address, pipeline=PrepareOnlyPipeline(signer, bot.io_executor))
+    bot.uniswap_router.override(OfflineRouter(Web3().eth.contract(address=Web3.to_checksum_address(bot.UNISWAP_ROUTER_ADDRESS), abi=bot.uniswap_router_abi)))
+    built = []
+
+    async def sell_build():
+        built.append(await bot.execute_sell_order(strategy.token_address, seller, reason=TAKE_PROFIT) is not None)
+    results['bot_sell_build'] = await measure_async(sell_build, repeat)
+    results['bot_sell_build']['built'] = sum(built)
+
+def run_bot_benchmarks(results, instances, repeat):
+    # simulate imports this module, so it is imported here rather than at the top
+    import simulate
+    with tempfile.TemporaryDirectory(prefix='ethbot-bench-') as data_dir:
+        sim = simulate.Simulation(simulate.synthetic_tape(duration=60, commands_per_minute=0, bursts=0), data_dir)
+        for event in sim.history:
+            sim.market.update(event['price'], sim.clock.epoch + event['t'])
+        sim.market.update(sim.events[0]['price'])
+        sim.install()
+        time.monotonic, time.time = sim.clock.monotonic, sim.clock.time
+        try:
+            asyncio.run(bench_bot(results, sim, instances, repeat))
+        finally:
+            time.monotonic, time.time = simulate.real_monotonic, simulate.real_time
+            sim.bot.state_store.close()
+
+def bench_risk(results, df, repeat):
+    # One risk engine pass with every rule on, at prices that move the highs
+    # but trigger no exit, so each run does the same work
+    price = float(df['close'].iloc[-1])
+    for positions in RISK_POSITIONS:
+        engine = RiskEngine(max_daily_loss=0.5)
+        symbols = [f"PAIR{i}" for i in range(min(positions, 100))]
+        for i in range(positions):
+            symbol = symbols[i % len(symbols)]
+            engine.add(f"bench-{i}", symbol, INTERVAL, stop_fraction=0.5, trailing_stop=0.4, volatility_multiplier=3.0, take_profit=[(2.0, 0.25), (3.0, 0.25)])
+            engine.set_entry(i, price)
+        for symbol in symbols:
+            engine.update_volatility(symbol, INTERVAL, df)
+        ticks = iter(range(10 ** 9))
+        results[f"risk_evaluate_{positions}"] = measure(lambda: engine.evaluate({s: price * (1 + 0.001 * (next(ticks) % 7)) for s in symbols}), repeat)
+        results[f"risk_evaluate_{positions}"]['positions'] = positions
+
+def bench_chain(results, rpc_url, repeat):
+    reader = ChainReader(rpc_url)
+    reader.watch(wallets=[BENCH_WALLET], tokens=[BENCH_TOKEN], pairs=[BENCH_PAIR])
+    results['chain_snapshot'] = measure(lambda: reader.snapshot(max_age=0), repeat)
+
+    quoter = SwapQuoter(reader, hop_tokens=[])
+    quoter.add_pool(BENCH_PAIR, BENCH_TOKEN, WETH_ADDRESS)
+    reader.snapshot()
+    results['swap_quote'] = measure(lambda: quoter.quote(WETH_ADDRESS, BENCH_TOKEN, 10 ** 18), repeat)
+
+def bench_swap_index(results, rpc_url, repeat):
+    # Ledger catch-up over INDEX_BLOCKS blocks of the stub chain, from an empty ledger each run
+    reader = ChainReader(rpc_url)
+
+    def catch_up():
+        ledger = TradeLedger(':memory:')
+        indexer = SwapIndexer(reader, ledger, price_fn=lambda timestamp: 2000.0, confirmations=0, start_block=STUB_HEAD_BLOCK - INDEX_BLOCKS + 1)
+        indexer.watch(wallets=[BENCH_WALLET], tokens=[BENCH_TOKEN])
+        indexer.catch_up()
+        ledger.close()
+    results['swap_index_catch_up'] = measure(catch_up, max(1, repeat // 10), warmup=1)
+    results['swap_index_catch_up']['blocks_per_second'] = INDEX_BLOCKS / results['swap_index_catch_up']['p50']
+
+def bench_telegram(results, telegram_url, repeat):
+    session = requests.Session()
+
+    def send():
+        session.post(f"{telegram_url}/botBENCH/sendMessage", json={'chat_id': 1, 'text': 'benchmark'}, timeout=5).raise_for_status()
+    results['telegram_send'] = measure(send, repeat)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, timeout=10, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_benchmarks(fixture_dir=FIXTURE_DIR, repeat=50, instances=100):
+    symbol, ohlc, ticker, source = load_fixtures(fixture_dir)
+    kraken = FixtureKrakenClient(ohlc, ticker)
+    rpc_server, rpc_url = start_stub(StubRPCHandler)
+    telegram_server, telegram_url = start_stub(StubTelegramHandler)
+    results = {}
+    try:
+        df = bench_parsing(results, ohlc, kraken, symbol, repeat)
+        bench_indicators(results, df, repeat)
+        bench_risk(results, df, repeat)
+        run_bot_benchmarks(results, instances, repeat)
+        bench_chain(results, rpc_url, repeat)
+        bench_swap_index(results, rpc_url, repeat)
+        bench_telegram(results, telegram_url, repeat)
+    finally:
+        rpc_server.shutdown()
+        telegram_server.shutdown()
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fixtures': source,
+            'symbol': symbol,
+            'bars': len(df),
+            'repeat': repeat,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'results': results
+    }
+
+def compare(report, baseline, threshold):
+    # Lines for every benchmark in both reports; regressions are p50s more than threshold slower
+    lines, regressions = [], []
+    for name, current in report['results'].items():
+        previous = baseline['results'].get(name)
+        if not previous or 'p50' not in current or 'p50' not in previous:
+            continue
+        change = current['p50'] / previous['p50'] - 1 if previous['p50'] else 0.0
+        lines.append(f"{name:<26} {previous['p50'] * 1000:>10.3f} ms -> {current['p50'] * 1000:>10.3f} ms  {change:+.1%}")
+        if change > threshold:
+            regressions.append(name)
+    return lines, regressions
+
+def format_report(report):
+    lines = [f"Benchmarks at {report['meta']['revision']} ({report['meta']['fixtures']} fixtures, {report['meta']['bars']} bars)"]
+    for name, r in report['results'].items():
+        if 'skipped' in r:
+            lines.append(f"{name:<26} skipped: {r['skipped']}")
+        else:
+            lines.append(f"{name:<26} p50 {r['p50'] * 1000:>10.3f} ms  p99 {r['p99'] * 1000:>10.3f} ms  ({r['runs']} runs)")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETH Bot hot paths offline against recorded fixtures")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="Directory with ohlc.json and ticker.json; synthetic data is used if they are missing")
+    parser.add_argument('--record', action='store_true', help="Record fresh Kraken fixtures into --fixtures before running")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--instances', type=int, default=100, help="Strategy instances in the bot loop benchmark")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="Earlier results JSON to compare p50s against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Slowdown that counts as a regression with --compare")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.record:
+        record_fixtures(args.fixtures)
+    report = run_benchmarks(args.fixtures, args.repeat, args.instances)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(report, baseline, args.threshold)
+        print(f"\nCompared with {baseline['meta'].get('revision')}:")
+        print("\n".join(lines))
+        if regressions:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
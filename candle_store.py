@@ -0,0 +1,304 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger()
+
+OHLC_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count']
+FLOAT_COLUMNS = ['open', 'high', 'low', 'close', 'vwap', 'volume']
+TIMEFRAMES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '4h': 240, '1d': 1440, '1w': 10080}
+
+class OHLCArrays:
+    # Typed columns of a Kraken OHLC payload: int64 epoch seconds, one (6, n)
+    # float64 block holding open..volume row by row, and int32 trade counts
+    def __init__(self, time, prices, count):
+        self.time = time
+        self.prices = prices
+        self.count = count
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, name):
+        if name == 'time':
+            return self.time
+        if name == 'count':
+            return self.count
+        return self.prices[FLOAT_COLUMNS.index(name)]
+
+    def to_frame(self):
+        # Every column and the index are views of these arrays; nothing is copied
+        columns = {'time': self.time, **{name: self.prices[i] for i, name in enumerate(FLOAT_COLUMNS)}, 'count': self.count}
+        index = pd.DatetimeIndex(self.time.view('datetime64[s]'), name='timestamp', copy=False)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+def parse_ohlc_arrays(data):
+    # One transpose of the row lists, then a single C-level conversion per dtype,
+    # instead of an object DataFrame converted column by column
+    if not data:
+        return OHLCArrays(np.empty(0, dtype=np.int64), np.empty((len(FLOAT_COLUMNS), 0)), np.empty(0, dtype=np.int32))
+    columns = list(zip(*data))
+    return OHLCArrays(
+        np.array(columns[0], dtype=np.int64),
+        np.array(columns[1:7], dtype=np.float64),
+        np.array(columns[7], dtype=np.int32)
+    )
+
+def parse_ohlc(data):
+    return parse_ohlc_arrays(data).to_frame()
+
+def parse_timeframe(text):
+    # '15m', '4h', '1d' or a number of minutes
+    text = str(text).strip().lower()
+    if text in TIMEFRAMES:
+        return TIMEFRAMES[text]
+    if text.isdigit() and int(text) > 0:
+        return int(text)
+    raise ValueError(f"Unknown timeframe {text!r}, use one of {', '.join(TIMEFRAMES)} or a number of minutes")
+
+def resample_ohlc(df, interval):
+    # Aggregates bars into interval-minute buckets aligned to the epoch, as Kraken
+    # aligns its own: first open, highest high, lowest low, last close, summed
+    # volume and count, and volume-weighted vwap. The last bucket may be forming.
+    if df is None or df.empty:
+        return parse_ohlc([])
+    times = df['time'].to_numpy()
+    buckets = times - times % (interval * 60)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    close = df['close'].to_numpy()
+    volume = np.add.reduceat(df['volume'].to_numpy(), starts)
+    traded = np.add.reduceat(df['vwap'].to_numpy() * df['volume'].to_numpy(), starts)
+    vwap = np.divide(traded, volume, out=close[ends].copy(), where=volume > 0)
+    prices = np.vstack([
+        df['open'].to_numpy()[starts],
+        np.maximum.reduceat(df['high'].to_numpy(), starts),
+        np.minimum.reduceat(df['low'].to_numpy(), starts),
+        close[ends],
+        vwap,
+        volume
+    ])
+    count = np.add.reduceat(df['count'].to_numpy(), starts).astype(np.int32)
+    return OHLCArrays(buckets[starts], prices, count).to_frame()
+
+class CandleStore:
+    # Keeps the OHLC history for one pair/interval in memory and on disk, and only
+    # asks Kraken for bars newer than the last 'since' cursor it was given.
+    def __init__(self, kraken_client, symbol, interval, data_dir='data', refresh_seconds=60, timeout=None, max_bars=None):
+        self.kraken_client = kraken_client
+        self.symbol = symbol
+        self.interval = interval
+        self.refresh_seconds = refresh_seconds
+        self.timeout = timeout
+        self.max_bars = max_bars
+        self.version = 0
+        self.lock = threading.Lock()
+        self.path = os.path.join(data_dir, f"{symbol}_{interval}.parquet") if data_dir else None
+        self.df = None
+        self.last = None
+        self.last_refresh = 0
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            self.df = pd.read_parquet(self.path)
+            if not self.df.empty:
+                # Kraken's newest bar is still forming, so resume from the one before it
+                self.last = int(self.df['time'].iloc[-2]) if len(self.df) > 1 else None
+            logger.info(f"Loaded {len(self.df)} candles for {self.symbol} from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to load candle store {self.path}: {e}")
+            self.df = None
+            self.last = None
+
+    def save(self):
+        if not self.path or self.df is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            self.df.to_parquet(tmp_path)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save candle store {self.path}: {e}")
+
+    def append(self, new_df):
+        if self.df is None or self.df.empty:
+            self.df = new_df
+        else:
+            # Bars Kraken resends (the forming bar) replace the copies we already hold
+            self.df = pd.concat([self.df[self.df.index < new_df.index[0]], new_df])
+        if self.max_bars is not None and len(self.df) > self.max_bars:
+            self.df = self.df.iloc[-self.max_bars:]
+        self.version += 1
+
+    def due(self):
+        return self.df is None or time.time() - self.last_refresh >= self.refresh_seconds
+
+    def refresh(self, force=False):
+        if not force and not self.due():
+            return self.df
+        # Callers on the I/O thread pool may race here; only one of them talks to Kraken
+        with self.lock:
+            if not force and not self.due():
+                return self.df
+            return self._refresh()
+
+    def _refresh(self):
+        # Failures raise, error payloads included, so the Kraken provider queue
+        # sees rate limits and backs off; the bars held so far are kept
+        params = {'pair': self.symbol, 'interval': self.interval}
+        if self.last is not None:
+            params['since'] = self.last
+        response = self.kraken_client.query_public('OHLC', params, timeout=self.timeout)
+        if 'result' not in response or self.symbol not in response['result']:
+            raise ValueError(f"Invalid OHLC response from Kraken API for {self.symbol}: {response.get('error') or response}")
+        data = response['result'][self.symbol]
+        if data:
+            self.append(parse_ohlc(data))
+        self.last = response['result'].get('last', self.last)
+        self.last_refresh = time.time()
+        self.save()
+        return self.df
+
+    def get(self):
+        if self.df is None:
+            return self.refresh(force=True)
+        return self.refresh()
+
+def bucket_ceil(ts, interval):
+    # Start of the first interval-minute bucket beginning at or after ts
+    return ts if ts % (interval * 60) == 0 else ts - ts % (interval * 60) + interval * 60
+
+class TimeframeView:
+    # CandleStore-like handle on one timeframe of a MultiTimeframeCandles, so
+    # MarketData and fetch_ohlcv use derived timeframes unchanged. due() is only
+    # true when Kraken has to be asked or the seed history needs loading; other
+    # updates are cheap enough to do wherever df is read.
+    def __init__(self, candles, interval):
+        self.candles = candles
+        self.interval = interval
+
+    def due(self):
+        return self.candles.base.due() or self.candles.needs_build(self.interval)
+
+    @property
+    def df(self):
+        if not self.candles.derivable(self.interval):
+            return self.candles.seed_store(self.interval).df
+        return self.candles.frame(self.interval)
+
+    def get(self):
+        self.candles.base.get()
+        if not self.candles.derivable(self.interval):
+            return self.candles.seed_store(self.interval).get()
+        if self.candles.needs_build(self.interval):
+            self.candles.seed_store(self.interval).get()
+        return self.candles.frame(self.interval)
+
+class MultiTimeframeCandles:
+    # Every timeframe of one pair derived from a single base CandleStore (1-minute
+    # bars), so adding a timeframe costs no extra Kraken requests. A timeframe is
+    # derived once the base bars cover one of its buckets from the start; until
+    # then, and for the history before that bucket, its native store
+    # (seed_store_factory) is used. Derived frames are updated incrementally: only
+    # the last two buckets, which hold every base bar Kraken can resend, are
+    # aggregated again. A gap longer than max_gap base bars (the bot was down
+    # longer than Kraken's 720-bar window) restarts the coverage after it.
+    def __init__(self, base, seed_store_factory=None, max_gap=15):
+        self.base = base
+        self.seed_store_factory = seed_store_factory
+        self.max_gap = max_gap
+        self.lock = threading.RLock()
+        self.frames = {}
+        self.views = {}
+        self.seed_stores = {}
+
+    def view(self, interval):
+        if interval % self.base.interval:
+            raise ValueError(f"{interval}m bars can't be built from {self.base.interval}m bars")
+        if interval not in self.views:
+            self.views[interval] = TimeframeView(self, interval)
+        return self.views[interval]
+
+    def seed_store(self, interval):
+        if interval not in self.seed_stores:
+            self.seed_stores[interval] = self.seed_store_factory(interval)
+        return self.seed_stores[interval]
+
+    def coverage(self, base_df):
+        # (first base bar after the last gap, last base bar before it or None)
+        times = base_df['time'].to_numpy()
+        gaps = np.flatnonzero(np.diff(times) > self.max_gap * self.base.interval * 60)
+        return (int(times[gaps[-1] + 1]), int(times[gaps[-1]])) if gaps.size else (int(times[0]), None)
+
+    def first_full(self, interval, base_df):
+        start, before_gap = self.coverage(base_df)
+        entry = self.frames.get(interval)
+        if entry is not None and before_gap is None:
+            # Trimming old base bars doesn't invalidate what was derived from them
+            return entry[2]
+        return bucket_ceil(start, interval)
+
+    def derivable(self, interval):
+        base_df = self.base.df
+        if interval == self.base.interval or self.seed_store_factory is None:
+            return True
+        if base_df is None or base_df.empty:
+            return False
+        return int(base_df['time'].iloc[-1]) >= self.first_full(interval, base_df)
+
+    def needs_build(self, interval):
+        if interval == self.base.interval:
+            return False
+        if not self.derivable(interval):
+            return self.seed_store(interval).due()
+        entry = self.frames.get(interval)
+        base_df = self.base.df
+        if entry is None:
+            return True
+        return self.seed_store_factory is not None and base_df is not None and not base_df.empty and entry[2] != self.first_full(interval, base_df)
+
+    def frame(self, interval):
+        base_df = self.base.df
+        if interval == self.base.interval or base_df is None or base_df.empty:
+            return base_df
+        with self.lock:
+            first_full = self.first_full(interval, base_df) if self.seed_store_factory is not None else None
+            entry = self.frames.get(interval)
+            if entry is not None and entry[1] == self.base.version:
+                return entry[0]
+            if entry is None or entry[2] != first_full:
+                df = self.build(interval, base_df, first_full, entry[0] if entry is not None else None)
+            else:
+                df = entry[0]
+                start = int(df['time'].iloc[-2]) if len(df) > 1 else int(df['time'].iloc[-1])
+                if first_full is not None:
+                    start = max(start, first_full)
+                tail = base_df.iloc[base_df['time'].searchsorted(start):]
+                df = pd.concat([df[df['time'] < start], resample_ohlc(tail, interval)])
+            self.frames[interval] = (df, self.base.version, first_full)
+            return df
+
+    def build(self, interval, base_df, first_full, previous=None):
+        if first_full is None:
+            return resample_ohlc(base_df, interval)
+        derived = resample_ohlc(base_df.iloc[base_df['time'].searchsorted(first_full):], interval)
+        parts, seed_from = [], None
+        _, before_gap = self.coverage(base_df)
+        if previous is not None and before_gap is not None:
+            # After a gap, buckets derived before it stay; native bars fill the gap
+            seed_from = before_gap - before_gap % (interval * 60)
+            parts.append(previous[previous['time'] < seed_from])
+        seed = self.seed_store(interval).df
+        if seed is not None and not seed.empty:
+            in_range = seed['time'] < first_full
+            if seed_from is not None:
+                in_range &= seed['time'] >= seed_from
+            parts.append(seed.loc[in_range, OHLC_COLUMNS])
+        return pd.concat(parts + [derived]) if parts else derived
@@ -0,0 +1,135 @@
+import time
+import logging
+import threading
+import requests
+from eth_abi import encode, decode
+from eth_utils import keccak, to_checksum_address
+
+logger = logging.getLogger()
+
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'  # Same address on every EVM chain
+
+def selector(signature):
+    return keccak(text=signature)[:4]
+
+AGGREGATE3 = selector('aggregate3((address,bool,bytes)[])')
+GET_BLOCK_NUMBER = selector('getBlockNumber()')
+GET_ETH_BALANCE = selector('getEthBalance(address)')
+BALANCE_OF = selector('balanceOf(address)')
+GET_RESERVES = selector('getReserves()')
+TOKEN0 = selector('token0()')
+GET_PAIR = selector('getPair(address,address)')
+
+class ChainSnapshot:
+    def __init__(self, block, balances, nonces, token_balances, reserves):
+        self.block = block
+        self.balances = balances
+        self.nonces = nonces
+        self.token_balances = token_balances
+        self.reserves = reserves
+        self.fetched_at = time.monotonic()
+
+class ChainReader:
+    # Reads everything the bot watches in one HTTP round-trip: a JSON-RPC batch of
+    # one Multicall3 aggregate3 eth_call (block number, ETH balances, token
+    # balances, pair reserves) plus eth_getTransactionCount per wallet. The
+    # snapshot is reused until a new block is due, so a handler that needs the
+    # balance three times pays for one request.
+    def __init__(self, rpc_url, multicall_address=MULTICALL3_ADDRESS, block_time=12, timeout=15):
+        self.rpc_url = rpc_url
+        self.multicall_address = to_checksum_address(multicall_address)
+        self.block_time = block_time
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.wallets = []
+        self.tokens = []
+        self.pairs = []
+        self.cached = None
+        self.round_trips = 0
+
+    def watch(self, wallets=(), tokens=(), pairs=()):
+        with self.lock:
+            for items, new in ((self.wallets, wallets), (self.tokens, tokens), (self.pairs, pairs)):
+                for item in new:
+                    item = to_checksum_address(item)
+                    if item not in items:
+                        items.append(item)
+                        self.cached = None
+
+    def invalidate(self):
+        self.cached = None
+
+    def rpc_batch(self, calls):
+        payload = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params} for i, (method, params) in enumerate(calls)]
+        response = self.session.post(self.rpc_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        self.round_trips += 1
+        results = sorted(response.json(), key=lambda r: r['id'])
+        for r in results:
+            if 'error' in r:
+                raise ValueError(f"RPC error for {calls[r['id']][0]}: {r['error']}")
+        return [r['result'] for r in results]
+
+    def build_calls(self):
+        calls = [(self.multicall_address, GET_BLOCK_NUMBER)]
+        calls += [(self.multicall_address, GET_ETH_BALANCE + encode(['address'], [w])) for w in self.wallets]
+        calls += [(token, BALANCE_OF + encode(['address'], [w])) for token in self.tokens for w in self.wallets]
+        calls += [(pair, GET_RESERVES) for pair in self.pairs]
+        return calls
+
+    def aggregate_call(self, calls):
+        data = AGGREGATE3 + encode(['(address,bool,bytes)[]'], [[(target, True, calldata) for target, calldata in calls]])
+        return ('eth_call', [{'to': self.multicall_address, 'data': '0x' + data.hex()}, 'latest'])
+
+    def call_many(self, calls):
+        # One uncached aggregate3 round-trip for ad hoc (target, calldata) reads;
+        # returns (success, return data) per call
+        (returned,) = decode(['(bool,bytes)[]'], bytes.fromhex(self.rpc_batch([self.aggregate_call(calls)])[0][2:]))
+        return returned
+
+    def fetch(self):
+        batch = [self.aggregate_call(self.build_calls())]
+        batch += [('eth_getTransactionCount', [w, 'pending']) for w in self.wallets]
+        results = self.rpc_batch(batch)
+
+        (returned,) = decode(['(bool,bytes)[]'], bytes.fromhex(results[0][2:]))
+        values = iter(returned)
+        block = decode(['uint256'], next(values)[1])[0]
+        balances = {w: decode(['uint256'], next(values)[1])[0] for w in self.wallets}
+        token_balances = {}
+        for token in self.tokens:
+            for w in self.wallets:
+                success, raw = next(values)
+                token_balances[(token, w)] = decode(['uint256'], raw)[0] if success and raw else None
+        reserves = {}
+        for pair in self.pairs:
+            success, raw = next(values)
+            reserves[pair] = decode(['uint112', 'uint112', 'uint32'], raw) if success and raw else None
+        nonces = {w: int(n, 16) for w, n in zip(self.wallets, results[1:])}
+        return ChainSnapshot(block, balances, nonces, token_balances, reserves)
+
+    def snapshot(self, max_age=None):
+        max_age = self.block_time if max_age is None else max_age
+        cached = self.cached
+        if cached is not None and time.monotonic() - cached.fetched_at < max_age:
+            return cached
+        # Threads that miss together share the fetch of the first one in
+        with self.lock:
+            cached = self.cached
+            if cached is not None and time.monotonic() - cached.fetched_at < max_age:
+                return cached
+            self.cached = self.fetch()
+            return self.cached
+
+    def balance(self, wallet):
+        return self.snapshot().balances[to_checksum_address(wallet)]
+
+    def nonce(self, wallet):
+        return self.snapshot().nonces[to_checksum_address(wallet)]
+
+    def token_balance(self, token, wallet):
+        return self.snapshot().token_balances[(to_checksum_address(token), to_checksum_address(wallet))]
+
+    def reserves(self, pair):
+        return self.snapshot().reserves[to_checksum_address(pair)]
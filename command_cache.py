@@ -0,0 +1,60 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger()
+
+class SnapshotCache:
+    # Values read-only chat commands show (balance, price, moving average),
+    # refreshed together in the background. Commands read whatever is cached and
+    # only wait for a fetch when a value is missing or older than max_age;
+    # concurrent waiters share that fetch. sources maps names to coroutine functions.
+    def __init__(self, sources, refresh_interval=15.0, max_age=60.0):
+        self.sources = sources
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.values = {}
+        self.inflight = {}
+        self.task = None
+
+    def age(self, name):
+        entry = self.values.get(name)
+        return time.monotonic() - entry[1] if entry is not None else None
+
+    def invalidate(self, name):
+        self.values.pop(name, None)
+
+    async def fetch(self, name):
+        value = await self.sources[name]()
+        self.values[name] = (value, time.monotonic())
+        return value
+
+    async def refresh(self, name):
+        task = self.inflight.get(name)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self.fetch(name))
+            self.inflight[name] = task
+            task.add_done_callback(lambda _: self.inflight.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def get(self, name):
+        entry = self.values.get(name)
+        if entry is not None and time.monotonic() - entry[1] <= self.max_age:
+            return entry[0]
+        return await self.refresh(name)
+
+    async def get_many(self, *names):
+        return await asyncio.gather(*(self.get(name) for name in names))
+
+    async def run(self):
+        while True:
+            results = await asyncio.gather(*(self.refresh(name) for name in self.sources), return_exceptions=True)
+            for name, result in zip(self.sources, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Background refresh of {name} failed: {result}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return self.task
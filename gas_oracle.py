@@ -0,0 +1,93 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger()
+
+class GasOracle:
+    # Keeps a rolling window of recent base fees and priority-fee percentiles from
+    # eth_feeHistory, refreshed at most once per block time, and memoizes
+    # estimate_gas per swap type and route (a longer route costs more gas) so
+    # building an order doesn't need its own estimate.
+    def __init__(self, web3, history_blocks=20, reward_percentile=50, refresh_seconds=12, base_fee_multiplier=2, gas_margin=1.2, estimate_ttl=3600, fallback_gas=2000000):
+        self.web3 = web3
+        self.history_blocks = history_blocks
+        self.reward_percentile = reward_percentile
+        self.refresh_seconds = refresh_seconds
+        self.base_fee_multiplier = base_fee_multiplier
+        self.gas_margin = gas_margin
+        self.estimate_ttl = estimate_ttl
+        self.fallback_gas = fallback_gas
+        self.lock = threading.Lock()
+        self.base_fees = deque(maxlen=history_blocks)
+        self.priority_fees = deque(maxlen=history_blocks)
+        self.next_base_fee = None
+        self.last_block = None
+        self.last_refresh = 0
+        self.gas_estimates = {}
+
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and self.next_base_fee is not None and time.time() - self.last_refresh < self.refresh_seconds:
+                return
+            try:
+                history = self.web3.eth.fee_history(self.history_blocks, 'latest', [self.reward_percentile])
+                oldest = history['oldestBlock']
+                base_fees = history['baseFeePerGas']
+                # baseFeePerGas has one more entry than blocks: the base fee of the next block
+                first_new = 0 if self.last_block is None else max(0, self.last_block + 1 - oldest)
+                for i in range(first_new, len(base_fees) - 1):
+                    self.base_fees.append(base_fees[i])
+                    self.priority_fees.append(history['reward'][i][0])
+                self.next_base_fee = base_fees[-1]
+                self.last_block = oldest + len(base_fees) - 2
+                self.last_refresh = time.time()
+            except Exception as e:
+                logger.error(f"Failed to refresh gas fee history: {e}")
+                if self.next_base_fee is None:
+                    raise
+
+    def priority_fee(self):
+        fees = sorted(f for f in self.priority_fees if f > 0)
+        if not fees:
+            return self.web3.to_wei(1, 'gwei')
+        return fees[len(fees) // 2]
+
+    def fee_params(self):
+        # Runs on the I/O pool. maxFeePerGas leaves room for the base fee to rise
+        # for a few blocks; only base fee plus tip is actually charged.
+        self.refresh()
+        priority_fee = self.priority_fee()
+        return {
+            'type': 2,
+            'maxPriorityFeePerGas': priority_fee,
+            'maxFeePerGas': self.next_base_fee * self.base_fee_multiplier + priority_fee
+        }
+
+    def gas_limit(self, kind, estimate):
+        # kind names the swap type and route; estimate is a zero-argument callable doing its RPC estimate
+        entry = self.gas_estimates.get(kind)
+        if entry is not None and time.time() - entry[1] < self.estimate_ttl:
+            return entry[0]
+        try:
+            gas = int(estimate() * self.gas_margin)
+            self.gas_estimates[kind] = (gas, time.time())
+            logger.info(f"Estimated gas for {kind}: {gas}")
+            return gas
+        except Exception as e:
+            fallback = entry[0] if entry is not None else self.fallback_gas
+            logger.warning(f"Gas estimate for {kind} failed, using {fallback}: {e}")
+            return fallback
+
+    def expected_fee(self, transaction):
+        # What the transaction should cost at the current base fee, in wei
+        tip = transaction.get('maxPriorityFeePerGas', 0)
+        if 'gasPrice' in transaction:
+            price = transaction['gasPrice']
+        else:
+            price = min(transaction['maxFeePerGas'], (self.next_base_fee or 0) + tip)
+        return transaction['gas'] * price
+
+def fee_paid(receipt):
+    return receipt['gasUsed'] * receipt['effectiveGasPrice']
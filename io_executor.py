@@ -0,0 +1,65 @@
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+class IOExecutor:
+    # Runs blocking client calls (krakenex, web3 HTTP, smtplib, pycoingecko) on a
+    # bounded thread pool so the event loop keeps serving Telegram and the stop-loss.
+    def __init__(self, max_workers=8, timeout=15):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='io')
+        self.timeout = timeout
+        self.calls = 0
+        self.timeouts = 0
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs)), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"I/O call {getattr(func, '__name__', func)} timed out after {timeout}s")
+            raise
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class LoopLagMonitor:
+    # Measures how late the event loop wakes up from a fixed sleep; anything above
+    # a few milliseconds means something is blocking the loop.
+    def __init__(self, interval=0.5, warn_threshold=0.1, window=120):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.task = None
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop lag of {lag * 1000:.0f} ms")
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return self.task
+
+    def summary(self):
+        if not self.samples:
+            return {'last': 0.0, 'avg': 0.0, 'max': 0.0}
+        return {
+            'last': self.samples[-1],
+            'avg': sum(self.samples) / len(self.samples),
+            'max': self.max_lag
+        }
@@ -0,0 +1,56 @@
+import time
+import logging
+import threading
+from metrics import registry
+
+logger = logging.getLogger()
+
+class LazyClient:
+    # Stands in for a client (web3, the Telegram Bot, CoinGecko) that is slow to
+    # import or connect. The factory runs on first attribute access, or earlier
+    # when warm() is called from a background thread, so startup isn't held up
+    # by clients the stop-loss loop doesn't need yet. Coroutines await ensure()
+    # first, so the factory (or the wait for a warm-up in progress) never runs
+    # on the event loop.
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+
+    @property
+    def ready(self):
+        return self._client is not None
+
+    def resolve(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    client = self._factory()
+                    elapsed = time.perf_counter() - started
+                    registry.gauge('client_init_seconds', client=self._name).set(elapsed)
+                    logger.info(f"Initialized {self._name} in {elapsed:.2f}s")
+                    self._client = client
+        return self._client
+
+    async def ensure(self, executor, timeout=None):
+        if self._client is None:
+            await executor.run(self.resolve, timeout=timeout)
+        return self._client
+
+    def override(self, client):
+        # Use an already built client instead of the factory (the simulator's fakes)
+        with self._lock:
+            self._client = client
+
+    def warm(self):
+        # For the I/O pool: build the client now and swallow errors, which will
+        # surface again at the first real use
+        try:
+            self.resolve()
+        except Exception as e:
+            logger.error(f"Failed to initialize {self._name}: {e}")
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
@@ -0,0 +1,176 @@
+import os
+import csv
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger()
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL NOT NULL,
+    value REAL NOT NULL,
+    tx_hash TEXT,
+    gas_fee REAL,
+    cum_count INTEGER NOT NULL,
+    cum_value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_ts ON trades (ts);
+CREATE INDEX IF NOT EXISTS trades_tx_hash ON trades (tx_hash);
+CREATE TABLE IF NOT EXISTS daily_pnl (
+    day TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+'''
+EXPORT_COLUMNS = ['id', 'ts', 'type', 'amount', 'price', 'value', 'tx_hash', 'gas_fee']
+
+def to_epoch(timestamp):
+    return timestamp.timestamp() if isinstance(timestamp, datetime) else float(timestamp)
+
+class TradeLedger:
+    # Durable trade log in SQLite (WAL mode). Each row stores the running trade
+    # count and gains/losses up to and including itself, so the total for any
+    # time window is the difference of two rows found through the ts index.
+    # Writes are buffered and committed in batches, and at least every
+    # flush_interval seconds by a background thread.
+    def __init__(self, path, batch_size=100, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.closed = threading.Event()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute('SELECT cum_count, cum_value, ts FROM trades ORDER BY ts DESC, id DESC LIMIT 1').fetchone()
+        self.cum_count, self.cum_value, self.last_ts = row if row else (0, 0.0, 0.0)
+        logger.info(f"Opened trade ledger {path} with {self.cum_count} trades")
+        if flush_interval:
+            threading.Thread(target=self.flush_periodically, name='ledger-flush', daemon=True).start()
+
+    def record(self, transaction_type, amount, price, timestamp=None, tx_hash=None, gas_fee=None):
+        # Sells count as money in and buys as money out, as in the weekly report.
+        # A trade older than the newest one (a backfill) keeps its own timestamp.
+        ts = to_epoch(timestamp) if timestamp is not None else time.time()
+        with self.lock:
+            value = price * amount if transaction_type == 'sell' else -(price * amount)
+            self.cum_count += 1
+            self.cum_value += value
+            if ts < self.last_ts:
+                self.insert_earlier((ts, transaction_type, amount, price, value, tx_hash, gas_fee))
+                return
+            self.last_ts = ts
+            self.buffer.append((ts, transaction_type, amount, price, value, tx_hash, gas_fee, self.cum_count, self.cum_value))
+            if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            with self.conn:
+                self.write(self.buffer)
+            self.buffer = []
+            self.last_flush = time.monotonic()
+
+    def write(self, rows):
+        self.conn.executemany('INSERT INTO trades (ts, type, amount, price, value, tx_hash, gas_fee, cum_count, cum_value) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        daily = {}
+        for row in rows:
+            day = datetime.fromtimestamp(row[0]).strftime('%Y-%m-%d')
+            count, value = daily.get(day, (0, 0.0))
+            daily[day] = (count + 1, value + row[4])
+        self.conn.executemany('INSERT INTO daily_pnl (day, count, value) VALUES (?, ?, ?) ON CONFLICT(day) DO UPDATE SET count = count + excluded.count, value = value + excluded.value', [(day, c, v) for day, (c, v) in daily.items()])
+
+    def insert_earlier(self, row):
+        # The row's running totals are those of the trades before it, and every
+        # later trade's totals grow by it, so window sums stay correct
+        self.flush()
+        ts, value = row[0], row[4]
+        count, total = self.totals_at(ts)
+        with self.conn:
+            self.conn.execute('UPDATE trades SET cum_count = cum_count + 1, cum_value = cum_value + ? WHERE ts > ?', (value, ts))
+            self.write([row + (count + 1, total + value)])
+
+    def flush_periodically(self):
+        # Buffered trades reach the disk within flush_interval even when no more come in
+        while not self.closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush trade ledger: {e}")
+
+    def recorded(self, tx_hashes):
+        # The subset of tx_hashes that already have a trade row
+        with self.lock:
+            self.flush()
+            found = set()
+            tx_hashes = list(tx_hashes)
+            for i in range(0, len(tx_hashes), 500):
+                chunk = tx_hashes[i:i + 500]
+                found.update(row[0] for row in self.conn.execute(f"SELECT tx_hash FROM trades WHERE tx_hash IN ({', '.join('?' * len(chunk))})", chunk))
+            return found
+
+    def gas_fees(self, since=None):
+        # ETH paid in gas by trades after since
+        with self.lock:
+            self.flush()
+            row = self.conn.execute('SELECT SUM(gas_fee) FROM trades WHERE ts > ?', (to_epoch(since) if since is not None else -1,)).fetchone()
+            return row[0] or 0.0
+
+    def totals_at(self, ts):
+        # Running totals of the last trade at or before ts: one index seek
+        row = self.conn.execute('SELECT cum_count, cum_value FROM trades WHERE ts <= ? ORDER BY ts DESC, id DESC LIMIT 1', (ts,)).fetchone()
+        return row if row else (0, 0.0)
+
+    def summary(self, since=None, until=None):
+        # (number of trades, gains/losses) for since < ts <= until
+        with self.lock:
+            self.flush()
+            end_count, end_value = (self.cum_count, self.cum_value) if until is None else self.totals_at(to_epoch(until))
+            start_count, start_value = (0, 0.0) if since is None else self.totals_at(to_epoch(since))
+            return end_count - start_count, end_value - start_value
+
+    def daily(self, days=None):
+        with self.lock:
+            self.flush()
+            query = 'SELECT day, count, value FROM daily_pnl ORDER BY day DESC'
+            if days is not None:
+                return self.conn.execute(query + ' LIMIT ?', (days,)).fetchall()
+            return self.conn.execute(query).fetchall()
+
+    def export_csv(self, path, since=None, chunk_size=10000):
+        # Streams rows from a cursor, so memory use doesn't grow with the ledger
+        with self.lock:
+            self.flush()
+            cursor = self.conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM trades WHERE ts > ? ORDER BY ts, id", (to_epoch(since) if since is not None else -1,))
+            exported = 0
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(EXPORT_COLUMNS)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    exported += len(rows)
+            logger.info(f"Exported {exported} trades to {path}")
+            return exported
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            self.flush()
+            self.conn.close()
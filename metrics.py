@@ -0,0 +1,186 @@
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    # Cumulative buckets for Prometheus plus the most recent samples for exact
+    # p50/p99 in /perf
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1000):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class MetricsRegistry:
+    # Counters and latency histograms keyed by name and labels. Updates happen on
+    # the event loop and the I/O threads; single += under the GIL is good enough
+    # for monitoring numbers.
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.counters:
+            self.counters[key] = Counter()
+        return self.counters[key]
+
+    def gauge(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.gauges:
+            self.gauges[key] = Gauge()
+        return self.gauges[key]
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        return self.histograms[key]
+
+    @contextmanager
+    def span(self, stage, **labels):
+        # Times the block into span_seconds{stage=...}; failures also count in span_errors_total
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.counter('span_errors_total', stage=stage, **labels).inc()
+            raise
+        finally:
+            self.histogram('span_seconds', stage=stage, **labels).observe(time.perf_counter() - started)
+
+    def timed(self, stage, **labels):
+        # Decorator form of span for plain and async functions
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(stage, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        for kind, metrics in (('counter', self.counters), ('gauge', self.gauges), ('histogram', self.histograms)):
+            seen = set()
+            for (name, labels), metric in sorted(metrics.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self.help:
+                        lines.append(f"# HELP {name} {self.help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                if kind != 'histogram':
+                    lines.append(f"{name}{format_labels(labels)} {metric.value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), metric.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {metric.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        # {(name, labels): {'count', 'p50', 'p99'}} for every histogram
+        return {key: {'count': h.count, 'p50': h.percentile(0.5), 'p99': h.percentile(0.99)} for key, h in sorted(self.histograms.items())}
+
+registry = MetricsRegistry()
+registry.describe('span_seconds', 'Time spent in each hot-path stage')
+registry.describe('span_errors_total', 'Hot-path stages that raised')
+registry.describe('external_call_seconds', 'Latency of calls to external providers')
+registry.describe('external_call_errors_total', 'Failed calls to external providers')
+registry.describe('loop_iterations_total', 'Main loop iterations')
+registry.describe('startup_seconds', 'Seconds from process start to each startup milestone')
+registry.describe('client_init_seconds', 'Time taken to import and build each lazily created client')
+registry.describe('notifications_total', 'Notifications delivered, by channel')
+registry.describe('notification_errors_total', 'Notifications dropped after failing to send, by channel')
+registry.describe('risk_exits_total', 'Exits the risk engine dispatched, by rule')
+
+class MetricsServer:
+    # Minimal HTTP server for Prometheus scrapes of /metrics, run on the event
+    # loop so it needs no extra dependency or thread. Binds to localhost by default.
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.registry.render().encode()
+            else:
+                status, body = '404 Not Found', b'Not Found\n'
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
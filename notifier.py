@@ -0,0 +1,214 @@
+import time
+import asyncio
+import smtplib
+import logging
+import threading
+from collections import deque
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from metrics import registry
+
+logger = logging.getLogger()
+
+TELEGRAM_MAX_LENGTH = 4096  # Telegram rejects longer messages
+
+def retry_after(error):
+    # Seconds Telegram asked us to wait (telegram.error.RetryAfter), or None for other errors
+    delay = getattr(error, 'retry_after', None)
+    if delay is None:
+        return None
+    return delay.total_seconds() if hasattr(delay, 'total_seconds') else float(delay)
+
+class SMTPMailer:
+    # Keeps one logged-in SMTP connection open between messages instead of a
+    # connect, STARTTLS and login per email. A connection idle for longer than
+    # check_after is probed with NOOP first, and a dropped one is reopened once
+    # before the message is given up on. Used from I/O threads, so calls are serialized.
+    def __init__(self, host, port, sender, password, recipient, timeout=15, check_after=60):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.recipient = recipient
+        self.timeout = timeout
+        self.check_after = check_after
+        self.lock = threading.Lock()
+        self.server = None
+        self.last_used = 0.0
+        self.connects = 0
+
+    def connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.starttls()
+        server.login(self.sender, self.password)
+        self.server = server
+        self.connects += 1
+        logger.info(f"Connected to SMTP server {self.host}:{self.port}")
+
+    def close(self):
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+    def alive(self):
+        if self.server is None:
+            return False
+        if time.monotonic() - self.last_used < self.check_after:
+            return True
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, subject, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = self.recipient
+        msg['Subject'] = subject
+        msg.attach(MIMEText(message, 'plain'))
+        text = msg.as_string()
+        with self.lock:
+            for attempt in range(2):
+                if not self.alive():
+                    self.close()
+                    self.connect()
+                try:
+                    self.server.sendmail(self.sender, self.recipient, text)
+                    self.last_used = time.monotonic()
+                    return
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    self.close()
+                    if attempt:
+                        raise
+
+class Notifier:
+    # Outgoing Telegram and email notifications. notify() and email() only append
+    # to a queue, so trading code never waits on delivery; background workers
+    # send them. Telegram messages that arrive within batch_window of each other
+    # are joined into one message per chat, a chat gets at most one message per
+    # chat_interval, and flood-limit replies are waited out and retried. Emails
+    # go out one at a time over a persistent SMTPMailer on the I/O pool.
+    # notify() and email() must be called from the event loop thread.
+    def __init__(self, send_message, chat_id, mailer=None, io_executor=None, batch_window=1.0, chat_interval=1.0, max_retries=3):
+        self.send_message = send_message  # async (chat_id, text)
+        self.chat_id = chat_id
+        self.mailer = mailer
+        self.io_executor = io_executor
+        self.batch_window = batch_window
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.messages = deque()
+        self.emails = deque()
+        self.messages_ready = asyncio.Event()
+        self.emails_ready = asyncio.Event()
+        self.last_sent = {}
+        self.sending = 0
+        self.flushing = False
+        self.tasks = []
+
+    def notify(self, text, chat_id=None):
+        self.messages.append((self.chat_id if chat_id is None else chat_id, text))
+        self.messages_ready.set()
+
+    def email(self, subject, text):
+        if self.mailer is None:
+            logger.warning(f"No mailer configured, dropping email: {subject}")
+            return
+        self.emails.append((subject, text))
+        self.emails_ready.set()
+
+    def next_batch(self):
+        # Joins queued messages for the first chat in line, keeping their order
+        # and staying under Telegram's length limit
+        chat_id, text = self.messages.popleft()
+        if len(text) > TELEGRAM_MAX_LENGTH:
+            self.messages.appendleft((chat_id, text[TELEGRAM_MAX_LENGTH:]))
+            return chat_id, text[:TELEGRAM_MAX_LENGTH], 1
+        parts, length = [text], len(text)
+        while self.messages and self.messages[0][0] == chat_id and length + 2 + len(self.messages[0][1]) <= TELEGRAM_MAX_LENGTH:
+            length += 2 + len(self.messages[0][1])
+            parts.append(self.messages.popleft()[1])
+        return chat_id, '\n\n'.join(parts), len(parts)
+
+    async def deliver(self, chat_id, text, count):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.send_message(chat_id, text)
+                registry.counter('notifications_total', channel='telegram').inc(count)
+                logger.info(f"Sent Telegram message: {text}")
+                return
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None or attempt == self.max_retries:
+                    registry.counter('notification_errors_total', channel='telegram').inc(count)
+                    logger.error(f"Failed to send Telegram message: {e}")
+                    return
+                logger.warning(f"Telegram flood limit hit, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def run_telegram(self):
+        while True:
+            await self.messages_ready.wait()
+            if not self.flushing:
+                await asyncio.sleep(self.batch_window)  # Let a burst collect into one message
+            self.messages_ready.clear()
+            while self.messages:
+                self.sending += 1
+                try:
+                    chat_id, text, count = self.next_batch()
+                    wait = self.last_sent.get(chat_id, 0.0) + self.chat_interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    await self.deliver(chat_id, text, count)
+                    self.last_sent[chat_id] = time.monotonic()
+                finally:
+                    self.sending -= 1
+
+    async def run_email(self):
+        while True:
+            await self.emails_ready.wait()
+            self.emails_ready.clear()
+            while self.emails:
+                subject, text = self.emails.popleft()
+                self.sending += 1
+                try:
+                    await self.io_executor.run(self.mailer.send, subject, text)
+                    registry.counter('notifications_total', channel='email').inc()
+                    logger.info(f"Sent email to {self.mailer.recipient} with subject: {subject}")
+                except Exception as e:
+                    registry.counter('notification_errors_total', channel='email').inc()
+                    logger.error(f"Failed to send email: {e}")
+                finally:
+                    self.sending -= 1
+
+    def start(self):
+        if not self.tasks:
+            loop = asyncio.get_running_loop()
+            self.tasks = [loop.create_task(self.run_telegram()), loop.create_task(self.run_email())]
+        return self.tasks
+
+    async def drained(self):
+        while self.messages or self.emails or self.sending:
+            await asyncio.sleep(0.05)
+
+    async def flush(self, timeout=10):
+        # Sends whatever is queued without waiting for the batch window; used on shutdown
+        self.flushing = True
+        self.messages_ready.set()
+        try:
+            await asyncio.wait_for(self.drained(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{len(self.messages)} notifications and {len(self.emails)} emails not sent before shutdown")
+        finally:
+            self.flushing = False
+
+    async def close(self, timeout=10):
+        await self.flush(timeout)
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.mailer is not None:
+            await self.io_executor.run(self.mailer.close)
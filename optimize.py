@@ -0,0 +1,145 @@
+import os
+import time
+import random
+import argparse
+import itertools
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from backtest import Backtester, load_ohlcv, rolling_vwap, moving_average
+
+logger = logging.getLogger()
+
+SHARED_COLUMNS = ['time', 'high', 'low', 'close', 'volume', 'vwap']
+PARAM_GRID = {
+    'stop_loss_threshold': [0.95, 0.96, 0.965, 0.97, 0.975, 0.98, 0.985, 0.99],
+    'vwap_window': [0, 7, 14, 21, 30],  # 0 uses Kraken's per-bar VWAP
+    'ma_window': [0, 3, 7, 14, 30]  # 0 disables the moving-average filter; 7 is /market's 1-week MA
+}
+RANDOM_RANGES = {
+    'stop_loss_threshold': (0.90, 0.999),
+    'vwap_window': (0, 60),
+    'ma_window': (0, 60)
+}
+RESULT_COLUMNS = ['stop_loss_threshold', 'vwap_window', 'ma_window', 'num_transactions', 'gains_losses', 'gas_usd', 'net_pnl', 'max_drawdown']
+
+def grid_combinations(param_grid=PARAM_GRID):
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+
+def random_combinations(count, ranges=RANDOM_RANGES, seed=None):
+    rng = random.Random(seed)
+    combos = []
+    for _ in range(count):
+        low, high = ranges['stop_loss_threshold']
+        combos.append({
+            'stop_loss_threshold': round(rng.uniform(low, high), 4),
+            'vwap_window': rng.randint(*ranges['vwap_window']),
+            'ma_window': rng.randint(*ranges['ma_window'])
+        })
+    return combos
+
+class SharedArrays:
+    # Places the candle columns in named shared memory blocks once, so worker
+    # processes map the same pages instead of each receiving a pickled copy
+    def __init__(self, df):
+        self.blocks = []
+        self.spec = {}
+        for column in SHARED_COLUMNS:
+            if column not in df.columns:
+                continue
+            values = df[column].to_numpy(dtype='int64' if column == 'time' else float)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            self.blocks.append(block)
+            self.spec[column] = (block.name, values.shape, values.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+# Per-worker state, set up once by init_worker
+worker_blocks = []
+worker_arrays = {}
+worker_cache = {}
+worker_kwargs = {}
+
+def init_worker(spec, backtest_kwargs):
+    for column, (name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=name)
+        worker_blocks.append(block)
+        worker_arrays[column] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    worker_kwargs.update(backtest_kwargs)
+
+def cached_series(kind, window):
+    # Windows repeat across combinations, so each worker computes each one once
+    key = (kind, window)
+    if key not in worker_cache:
+        a = worker_arrays
+        if kind == 'vwap':
+            worker_cache[key] = rolling_vwap(a['high'], a['low'], a['close'], a['volume'], window)
+        else:
+            worker_cache[key] = moving_average(a['close'], window)
+    return worker_cache[key]
+
+def evaluate(combos):
+    results = []
+    close = worker_arrays['close']
+    for params in combos:
+        if params['vwap_window']:
+            vwap = cached_series('vwap', params['vwap_window'])
+        elif 'vwap' in worker_arrays:
+            vwap = worker_arrays['vwap']
+        else:
+            vwap = cached_series('vwap', 14)
+        ma = cached_series('ma', params['ma_window']) if params['ma_window'] else None
+        backtester = Backtester(stop_loss_threshold=params['stop_loss_threshold'], **worker_kwargs)
+        result = backtester.run_arrays(worker_arrays['time'], close, vwap, ma)
+        results.append({**params, **{k: result[k] for k in RESULT_COLUMNS if k in result}})
+    return results
+
+def rank_results(results):
+    df = pd.DataFrame(results, columns=RESULT_COLUMNS)
+    return df.sort_values(['net_pnl', 'max_drawdown'], ascending=[False, True]).reset_index(drop=True)
+
+def optimize(df, combos, workers=None, chunk_size=32, **backtest_kwargs):
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    shared = SharedArrays(df)
+    try:
+        chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(shared.spec, backtest_kwargs)) as pool:
+            for chunk_results in pool.map(evaluate, chunks):
+                results.extend(chunk_results)
+    finally:
+        shared.close()
+    logger.info(f"Evaluated {len(combos)} parameter sets over {len(df)} bars on {workers} workers in {time.perf_counter() - started:.1f}s")
+    return rank_results(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Search stop-loss and indicator windows over stored OHLCV history")
+    parser.add_argument('path', help="CSV or Parquet file with OHLCV bars")
+    parser.add_argument('--random', type=int, default=0, help="Evaluate this many random parameter sets as well as the grid")
+    parser.add_argument('--no-grid', action='store_true', help="Skip the grid and only run the random search")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--exit-below-vwap', action='store_true')
+    parser.add_argument('--output', default='optimize_results.csv')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    combos = [] if args.no_grid else grid_combinations()
+    combos += random_combinations(args.random, seed=args.seed)
+    ranked = optimize(load_ohlcv(args.path), combos, workers=args.workers, exit_below_vwap=args.exit_below_vwap)
+    ranked.to_csv(args.output, index=False)
+    logger.info(f"Wrote {len(ranked)} results to {args.output}")
+    print(ranked.head(args.top).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
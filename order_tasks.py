@@ -0,0 +1,54 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger()
+
+class OrderTask:
+    def __init__(self, kind, chat_id):
+        self.kind = kind
+        self.chat_id = chat_id
+        self.started_at = time.monotonic()
+        self.task = None
+
+class OrderTasks:
+    # Runs orders started from chat as background tasks so the handler returns at
+    # once and a slow order (a balance retry, a stuck confirmation) never holds up
+    # other updates. Only one order of each kind runs at a time; report(chat_id,
+    # text) tells the user how it is getting on and how it ended.
+    def __init__(self, report):
+        self.report = report
+        self.orders = {}
+
+    def running(self, kind):
+        order = self.orders.get(kind)
+        return order is not None and not order.task.done()
+
+    def start(self, kind, chat_id, run):
+        # run(progress) is a coroutine function returning the message to send when
+        # it finishes; on the way it can await progress(text) to send an update
+        if self.running(kind):
+            return None
+        order = OrderTask(kind, chat_id)
+        order.task = asyncio.get_running_loop().create_task(self.execute(order, run))
+        self.orders[kind] = order
+        return order
+
+    async def execute(self, order, run):
+        try:
+            message = await run(lambda text: self.send(order, text))
+        except Exception as e:
+            logger.error(f"{order.kind.capitalize()} order failed: {e}")
+            message = f"{order.kind.capitalize()} order failed: {e}"
+        if message:
+            await self.send(order, message)
+
+    async def send(self, order, text):
+        try:
+            await self.report(order.chat_id, text)
+        except Exception as e:
+            logger.error(f"Failed to report {order.kind} order: {e}")
+
+    def summary(self):
+        now = time.monotonic()
+        return [(kind, now - order.started_at) for kind, order in self.orders.items() if not order.task.done()]
@@ -0,0 +1,106 @@
+import json
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger()
+
+KRAKEN_WS_URL = 'wss://ws.kraken.com'
+
+class KrakenWebSocketTransport:
+    # Streams Kraken ticker updates. pairs maps websocket pair names ('ETH/USD')
+    # to the REST symbols the rest of the bot uses ('XETHZUSD').
+    reconnect = True
+
+    def __init__(self, pairs, url=KRAKEN_WS_URL):
+        self.pairs = pairs
+        self.url = url
+
+    async def stream(self):
+        import websockets
+
+        async with websockets.connect(self.url, ping_interval=20) as ws:
+            await ws.send(json.dumps({
+                'event': 'subscribe',
+                'pair': list(self.pairs),
+                'subscription': {'name': 'ticker'}
+            }))
+            async for raw in ws:
+                message = json.loads(raw)
+                # Ticker updates are [channelID, data, 'ticker', pair]; everything else is a dict event
+                if isinstance(message, list) and len(message) >= 4 and message[2] == 'ticker':
+                    symbol = self.pairs.get(message[3])
+                    if symbol is not None:
+                        yield symbol, float(message[1]['c'][0])
+                elif isinstance(message, dict) and message.get('event') == 'subscriptionStatus' and message.get('status') == 'error':
+                    raise ConnectionError(f"Kraken subscription failed: {message.get('errorMessage')}")
+
+class ReplayTransport:
+    # Replays recorded (symbol, price) ticks, optionally spaced out by delay seconds.
+    reconnect = False
+
+    def __init__(self, ticks, delay=0):
+        self.ticks = ticks
+        self.delay = delay
+
+    async def stream(self):
+        for symbol, price in self.ticks:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield symbol, float(price)
+
+class PriceFeed:
+    def __init__(self, transport, max_age=10.0, reconnect_delay=1.0, max_reconnect_delay=60.0):
+        self.transport = transport
+        self.max_age = max_age
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.prices = {}
+        self.task = None
+
+    def update(self, symbol, price):
+        self.prices[symbol] = (price, time.monotonic())
+
+    def get_price(self, symbol, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        entry = self.prices.get(symbol)
+        if entry is None or time.monotonic() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def get_age(self, symbol):
+        entry = self.prices.get(symbol)
+        if entry is None:
+            return None
+        return time.monotonic() - entry[1]
+
+    async def run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async for symbol, price in self.transport.stream():
+                    self.update(symbol, price)
+                    delay = self.reconnect_delay
+                if not self.transport.reconnect:
+                    return
+                logger.warning("Price feed stream ended, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Price feed error: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,126 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger()
+
+def kraken_ticker_source(kraken_client, timeout=None):
+    def fetch(symbol):
+        response = kraken_client.query_public('Ticker', {'pair': symbol}, timeout=timeout)
+        if 'result' in response and symbol in response['result']:
+            return float(response['result'][symbol]['c'][0])
+        raise ValueError(f"Invalid response from Kraken API: {response}")
+    return fetch
+
+def coingecko_source(coingecko_client, coin_ids, api_key=None):
+    # CoinGecko has no notion of Kraken pair names, so coin_ids maps each symbol
+    # to its coin id; the quote service leaves this source out for other symbols
+    def fetch(symbol):
+        coin_id = coin_ids[symbol]
+        response = coingecko_client.get_price(ids=coin_id, vs_currencies='usd', x_cg_pro_api_key=api_key)
+        return response[coin_id]['usd']
+    fetch.symbols = coin_ids
+    return fetch
+
+class SourceStats:
+    def __init__(self, window=500):
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.latencies = deque(maxlen=window)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'wins': self.wins,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99)
+        }
+
+class QuoteService:
+    # Serves prices from a short-lived cache. Concurrent callers for the same symbol
+    # share one in-flight fetch, and a fetch asks every source at once, taking the
+    # first valid answer before the deadline. Slower sources are left to finish in
+    # the background so their latency and errors still count in the stats.
+    # sources are (name, fetch) pairs, or (name, fetch, executor) to route a
+    # source through its own executor instead of io_executor. A fetch with a
+    # symbols attribute is only asked for the symbols in it.
+    def __init__(self, io_executor, sources, ttl=2.0, deadline=5.0):
+        self.io_executor = io_executor
+        self.sources = [(s[0], s[1], s[2] if len(s) > 2 else io_executor) for s in sources]
+        self.ttl = ttl
+        self.deadline = deadline
+        self.quotes = {}
+        self.inflight = {}
+        self.background = set()
+        self.stats = {name: SourceStats() for name, _, _ in self.sources}
+
+    def get_cached(self, symbol, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        entry = self.quotes.get(symbol)
+        if entry is None or time.monotonic() - entry[2] > max_age:
+            return None
+        return entry[0]
+
+    async def get(self, symbol):
+        price = self.get_cached(symbol)
+        if price is not None:
+            return price
+        task = self.inflight.get(symbol)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self.race(symbol))
+            self.inflight[symbol] = task
+            task.add_done_callback(lambda _: self.inflight.pop(symbol, None))
+        # Shielded so one caller giving up doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def fetch(self, name, fetch, executor, symbol):
+        stats = self.stats[name]
+        stats.calls += 1
+        started = time.monotonic()
+        try:
+            price = await executor.run(fetch, symbol, timeout=self.deadline)
+            if price is None or not math.isfinite(float(price)) or float(price) <= 0:
+                raise ValueError(f"invalid price {price!r}")
+            return name, float(price)
+        except Exception as e:
+            stats.errors += 1
+            logger.warning(f"{name} quote for {symbol} failed: {e}")
+            return name, None
+        finally:
+            stats.latencies.append(time.monotonic() - started)
+
+    async def race(self, symbol):
+        loop = asyncio.get_running_loop()
+        pending = {loop.create_task(self.fetch(name, fetch, executor, symbol)) for name, fetch, executor in self.sources
+                   if symbol in getattr(fetch, 'symbols', (symbol,))}
+        deadline = loop.time() + self.deadline
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    name, price = task.result()
+                    if price is not None:
+                        self.stats[name].wins += 1
+                        self.quotes[symbol] = (price, name, time.monotonic())
+                        return price
+            logger.error(f"No valid quote for {symbol} within {self.deadline}s")
+            return None
+        finally:
+            for task in pending:
+                self.background.add(task)
+                task.add_done_callback(self.background.discard)
+
+    def stats_summary(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
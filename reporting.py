@@ -0,0 +1,8 @@
+def gains_losses(transactions):
+    # Sells count as money in and buys as money out, at the logged price
+    return sum((t['price'] * t['amount']) if t['type'] == 'sell' else -(t['price'] * t['amount']) for t in transactions)
+
+def summarize_transactions(transactions, since=None):
+    if since is not None:
+        transactions = [t for t in transactions if t['timestamp'] > since]
+    return len(transactions), gains_losses(transactions)
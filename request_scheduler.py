@@ -0,0 +1,201 @@
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from metrics import registry
+
+logger = logging.getLogger()
+
+PRIORITY_STOP_LOSS = 0  # Price checks that can trigger a stop-loss sell
+PRIORITY_TRADE = 1  # Building and sending orders
+PRIORITY_BACKGROUND = 5  # Candle refreshes, receipts, fee history
+PRIORITY_QUERY = 9  # Chat commands such as /market and /status
+
+request_priority = contextvars.ContextVar('request_priority', default=PRIORITY_BACKGROUND)
+
+@contextmanager
+def priority(level):
+    # Requests made inside the block, including from tasks it creates, use level
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+class RequestDropped(Exception):
+    pass
+
+def is_rate_limit_error(error):
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'too many requests' in message
+
+def kraken_rate_limited(result):
+    # krakenex reports throttling in the response body rather than raising
+    return isinstance(result, dict) and any(is_rate_limit_error(e) for e in result.get('error') or [])
+
+class ProviderStats:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.delayed = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+
+    def summary(self):
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+            'delayed': self.delayed,
+            'dropped': self.dropped,
+            'avg_wait': self.wait_total / self.completed if self.completed else 0.0
+        }
+
+class ProviderQueue:
+    # Token bucket for one provider. Waiting requests are served lowest priority
+    # value first, and round-robin across owners (pairs) within a priority. A
+    # rate-limit response halves the rate and pauses dispatch with exponential
+    # backoff; each success wins back part of the configured rate.
+    def __init__(self, name, io_executor, rate, burst=1, max_queue=1000, rate_limited=None, delay_threshold=0.1, max_backoff=60.0):
+        self.name = name
+        self.io_executor = io_executor
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.rate_limited = rate_limited
+        self.delay_threshold = delay_threshold
+        self.max_backoff = max_backoff
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.backoff = 0.0
+        self.paused_until = 0.0
+        self.queues = {}
+        self.size = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.stats = ProviderStats()
+
+    def enqueue(self, item, level, owner):
+        if self.size >= self.max_queue:
+            self.stats.dropped += 1
+            raise RequestDropped(f"{self.name} queue is full ({self.max_queue} requests)")
+        self.queues.setdefault(level, OrderedDict()).setdefault(owner, deque()).append(item)
+        self.size += 1
+        self.wakeup.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.dispatch())
+
+    def pop(self):
+        level = min(self.queues)
+        owners = self.queues[level]
+        owner, queue = owners.popitem(last=False)
+        item = queue.popleft()
+        if queue:
+            owners[owner] = queue
+        if not owners:
+            del self.queues[level]
+        self.size -= 1
+        return item
+
+    async def take_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.size:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            await self.take_token()
+            future, func, args, kwargs, enqueued, deadline = self.pop()
+            now = time.monotonic()
+            if future.done():
+                self.tokens += 1
+                continue
+            if deadline is not None and now > deadline:
+                self.tokens += 1
+                self.stats.dropped += 1
+                future.set_exception(RequestDropped(f"{self.name} request waited more than {deadline - enqueued:.1f}s"))
+                continue
+            wait = now - enqueued
+            self.stats.wait_total += wait
+            if wait > self.delay_threshold:
+                self.stats.delayed += 1
+            loop.create_task(self.call(future, func, args, kwargs))
+
+    def on_rate_limited(self):
+        self.stats.rate_limited += 1
+        self.rate = max(self.max_rate / 16, self.rate / 2)
+        self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else 1.0)
+        self.paused_until = time.monotonic() + self.backoff
+        self.tokens = 0
+        logger.warning(f"{self.name} rate limited, backing off {self.backoff:.0f}s at {self.rate:.2f} req/s")
+
+    def on_success(self):
+        self.backoff = 0.0
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    async def call(self, future, func, args, kwargs):
+        started = time.monotonic()
+        try:
+            result = await self.io_executor.run(func, *args, **kwargs)
+        except Exception as e:
+            self.stats.errors += 1
+            registry.counter('external_call_errors_total', provider=self.name).inc()
+            if is_rate_limit_error(e):
+                self.on_rate_limited()
+            if not future.done():
+                future.set_exception(e)
+            return
+        finally:
+            registry.histogram('external_call_seconds', provider=self.name).observe(time.monotonic() - started)
+        self.stats.completed += 1
+        if self.rate_limited is not None and self.rate_limited(result):
+            self.on_rate_limited()
+        else:
+            self.on_success()
+        if not future.done():
+            future.set_result(result)
+
+    async def run(self, func, *args, owner=None, max_wait=None, **kwargs):
+        self.stats.submitted += 1
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        deadline = enqueued + max_wait if max_wait is not None else None
+        self.enqueue((future, func, args, kwargs, enqueued, deadline), request_priority.get(), owner)
+        return await future
+
+class RequestScheduler:
+    # One ProviderQueue per upstream API. provider(name) returns an object with
+    # the same run() signature as IOExecutor, so clients can be pointed at a
+    # provider without knowing about the scheduler.
+    def __init__(self, io_executor):
+        self.io_executor = io_executor
+        self.providers = {}
+
+    def add_provider(self, name, rate, burst=1, **kwargs):
+        self.providers[name] = ProviderQueue(name, self.io_executor, rate, burst, **kwargs)
+        return self.providers[name]
+
+    def provider(self, name):
+        return self.providers[name]
+
+    def stats(self):
+        return {name: provider.stats.summary() for name, provider in self.providers.items()}
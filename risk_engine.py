@@ -0,0 +1,238 @@
+import time
+import logging
+import numpy as np
+from indicators import rolling_sum, rolling_mean_std
+
+logger = logging.getLogger()
+
+STOP_LOSS, TRAILING_STOP, VOLATILITY_STOP, TAKE_PROFIT, DAILY_LOSS = 'stop_loss', 'trailing_stop', 'volatility_stop', 'take_profit', 'daily_loss'
+STOP_REASONS = (STOP_LOSS, TRAILING_STOP, VOLATILITY_STOP)  # Order of the rows in the stop-level stack
+REASON_LABELS = {STOP_LOSS: 'Stop loss', TRAILING_STOP: 'Trailing stop', VOLATILITY_STOP: 'Volatility stop', TAKE_PROFIT: 'Take profit', DAILY_LOSS: 'Max daily loss'}
+
+def average_true_range(high, low, close, window=14):
+    previous = np.concatenate((close[:1], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    return rolling_sum(true_range, window) / window
+
+def volatility_distance(df, source='atr', window=14, bollinger_std=2):
+    # How far below its high a position may fall on this timeframe's volatility:
+    # the latest ATR, or the gap between the Bollinger middle and lower bands
+    if df is None or len(df) <= window:
+        return np.nan
+    close = df['close'].to_numpy(dtype=float)
+    if source == 'bollinger':
+        _, std = rolling_mean_std(close, window)
+        return float(bollinger_std * std[-1])
+    return float(average_true_range(df['high'].to_numpy(dtype=float), df['low'].to_numpy(dtype=float), close, window)[-1])
+
+class RiskAction:
+    # One exit the engine wants: sell fraction of the original position
+    def __init__(self, index, name, reason, fraction, price, level, rungs=None):
+        self.index = index
+        self.name = name
+        self.reason = reason
+        self.fraction = fraction
+        self.price = price
+        self.level = level
+        self.rungs = rungs
+
+class RiskEngine:
+    # Every position is a row of NumPy arrays, and evaluate() checks all rules
+    # for all rows in one vectorized pass per price tick: the fixed stop loss,
+    # a trailing stop off the high since entry, a volatility stop some ATRs (or
+    # Bollinger widths) below that high, a take-profit ladder, and a portfolio
+    # max daily loss. The highest of the stop levels applies. Rows that produce
+    # an exit are disarmed until the order is confirmed (record_fill) or fails
+    # (cancel), so a slow sell is not sent twice. After each pass, raised holds
+    # the rows whose high moved while a trailing or volatility stop follows it.
+    def __init__(self, max_daily_loss=None, volatility_source='atr', volatility_window=14, capacity=16, ladder_size=4):
+        self.max_daily_loss = max_daily_loss
+        self.volatility_source = volatility_source
+        self.volatility_window = volatility_window
+        self.ladder_size = ladder_size
+        self.names = []
+        self.rows = {}
+        self.symbols = {}
+        self.feeds = {}
+        self.volatility = np.full(4, np.nan)
+        self.count = 0
+        self.day = None
+        self.realized_today = 0.0
+        self.closed_value_today = 0.0
+        self.raised = np.zeros(0, dtype=np.int64)
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        fresh = {
+            'symbol_id': np.zeros(capacity, dtype=np.int64),
+            'feed_id': np.zeros(capacity, dtype=np.int64),
+            'entry': np.full(capacity, np.nan),
+            'entry_amount': np.zeros(capacity),
+            'amount': np.zeros(capacity),
+            'high': np.full(capacity, np.nan),
+            'day_open': np.full(capacity, np.nan),
+            'entry_day': np.zeros(capacity, dtype=np.int64),
+            'stop_fraction': np.full(capacity, np.nan),
+            'trail': np.full(capacity, np.nan),
+            'vol_multiplier': np.full(capacity, np.nan),
+            'active': np.zeros(capacity, dtype=bool),
+            'tp_level': np.full((capacity, self.ladder_size), np.nan),
+            'tp_fraction': np.zeros((capacity, self.ladder_size)),
+            'tp_done': np.zeros((capacity, self.ladder_size), dtype=bool)
+        }
+        for column, array in fresh.items():
+            old = getattr(self, column, None)
+            if old is not None:
+                array[:self.count] = old[:self.count]
+            setattr(self, column, array)
+
+    def intern(self, table, key):
+        if key not in table:
+            table[key] = len(table)
+        return table[key]
+
+    def add(self, name, symbol, interval, stop_fraction=None, trailing_stop=None, volatility_multiplier=None, take_profit=(), amount=1.0):
+        # take_profit is a list of (price as a multiple of entry, fraction of the position to sell)
+        if len(take_profit) > self.ladder_size:
+            raise ValueError(f"At most {self.ladder_size} take-profit levels per position")
+        if self.count == len(self.entry):
+            self.allocate(2 * len(self.entry))
+        i = self.count
+        self.count += 1
+        self.names.append(name)
+        self.rows[name] = i
+        self.symbol_id[i] = self.intern(self.symbols, symbol)
+        self.feed_id[i] = self.intern(self.feeds, (symbol, interval))
+        if len(self.feeds) > len(self.volatility):
+            self.volatility = np.concatenate((self.volatility, np.full(len(self.volatility), np.nan)))
+        self.stop_fraction[i] = np.nan if stop_fraction is None else stop_fraction
+        self.trail[i] = np.nan if trailing_stop is None else trailing_stop
+        self.vol_multiplier[i] = np.nan if volatility_multiplier is None else volatility_multiplier
+        for k, (level, fraction) in enumerate(take_profit):
+            self.tp_level[i, k] = level
+            self.tp_fraction[i, k] = fraction
+        self.entry_amount[i] = amount
+        return i
+
+    def set_entry(self, i, price, amount=None, now=None):
+        # A new position (or none, for price None) replaces whatever the row held
+        amount = self.entry_amount[i] if amount is None else amount
+        self.entry[i] = np.nan if price is None else price
+        self.high[i] = self.entry[i]
+        self.day_open[i] = self.entry[i]
+        self.entry_day[i] = int((time.time() if now is None else now) // 86400)
+        self.entry_amount[i] = amount
+        self.amount[i] = 0.0 if price is None else amount
+        self.tp_done[i] = False
+        self.active[i] = price is not None
+
+    def update_volatility(self, symbol, interval, df):
+        # Called with each new candle frame of a feed the positions trade on
+        feed = self.feeds.get((symbol, interval))
+        if feed is not None:
+            self.volatility[feed] = volatility_distance(df, self.volatility_source, self.volatility_window)
+
+    def levels(self, rows):
+        # Fixed, trailing and volatility stop levels for a slice of rows (NaN where a rule is off)
+        return np.vstack((self.entry[rows] * self.stop_fraction[rows], self.high[rows] * (1 - self.trail[rows]), self.high[rows] - self.vol_multiplier[rows] * self.volatility[self.feed_id[rows]]))
+
+    def stop_level(self, i):
+        # The price row i is currently stopped out below, or None
+        if not self.active[i]:
+            return None
+        level = np.fmax.reduce(self.levels(slice(i, i + 1))[:, 0])
+        return None if np.isnan(level) else float(level)
+
+    def position_state(self, i):
+        return {'high': None if np.isnan(self.high[i]) else float(self.high[i]), 'open': bool(self.active[i]), 'take_profit_done': self.tp_done[i].tolist(),
+                'entry_day': int(self.entry_day[i])}
+
+    def restore_position(self, i, state):
+        if state.get('high') is not None and not np.isnan(self.entry[i]):
+            self.high[i] = max(self.entry[i], state['high'])
+        if 'take_profit_done' in state:
+            done = state['take_profit_done'][:self.ladder_size]
+            self.tp_done[i, :len(done)] = done
+            self.amount[i] = self.entry_amount[i] * (1 - self.tp_fraction[i][self.tp_done[i]].sum())
+        if 'entry_day' in state:
+            self.entry_day[i] = state['entry_day']
+        else:
+            self.entry_day[i] = 0  # Unknown, so the day's loss counts from the first price seen
+        if state.get('open') is False:
+            self.active[i] = False
+
+    def roll_day(self, now, p):
+        # Positions opened before today count their daily loss from the first price of the (UTC) day
+        day = int(now // 86400)
+        if day != self.day:
+            self.day = day
+            self.realized_today = 0.0
+            self.closed_value_today = 0.0
+            n = self.count
+            self.day_open[:n] = np.where((self.entry_day[:n] < day) & ~np.isnan(p), p, self.day_open[:n])
+
+    def evaluate(self, prices, now=None):
+        # prices maps symbol to the latest price (None or missing when unknown)
+        n = self.count
+        if not n:
+            self.raised = np.zeros(0, dtype=np.int64)
+            return []
+        by_symbol = np.full(len(self.symbols), np.nan)
+        for symbol, price in prices.items():
+            if price is not None and symbol in self.symbols:
+                by_symbol[self.symbols[symbol]] = price
+        p = by_symbol[self.symbol_id[:n]]
+        self.roll_day(time.time() if now is None else now, p)
+        live = self.active[:n] & ~np.isnan(p)
+        self.day_open[:n] = np.where(live & np.isnan(self.day_open[:n]), p, self.day_open[:n])
+        high = self.high[:n]
+        self.raised = np.flatnonzero(live & (p > high) & ~(np.isnan(self.trail[:n]) & np.isnan(self.vol_multiplier[:n])))
+        np.fmax(high, np.where(live, p, np.nan), out=high)
+
+        entry = self.entry[:n]
+        levels = self.levels(slice(0, n))
+        stop = np.fmax.reduce(levels, axis=0)
+        stopped = live & (p < stop)
+
+        with np.errstate(invalid='ignore'):
+            hit = live[:, None] & ~stopped[:, None] & ~self.tp_done[:n] & (p[:, None] >= entry[:, None] * self.tp_level[:n])
+        take = (self.tp_fraction[:n] * hit).sum(axis=1)
+
+        exit_all = np.zeros(n, dtype=bool)
+        if self.max_daily_loss is not None:
+            amount = self.amount[:n]
+            open_value = np.sum((self.day_open[:n] * amount)[live]) + self.closed_value_today
+            pnl = np.sum(((p - self.day_open[:n]) * amount)[live]) + self.realized_today
+            if open_value > 0 and pnl < -self.max_daily_loss * open_value:
+                exit_all = live & ~stopped
+
+        actions = []
+        reasons = np.argmax(np.where(np.isnan(levels), -np.inf, levels), axis=0)
+        for i in np.flatnonzero(stopped | exit_all | (take > 0)):
+            remaining = self.amount[i] / self.entry_amount[i] if self.entry_amount[i] else 0.0
+            if stopped[i] or exit_all[i]:
+                reason = STOP_REASONS[reasons[i]] if stopped[i] else DAILY_LOSS
+                actions.append(RiskAction(i, self.names[i], reason, remaining, p[i], stop[i]))
+                self.active[i] = False
+            else:
+                rungs = np.flatnonzero(hit[i])
+                actions.append(RiskAction(i, self.names[i], TAKE_PROFIT, min(take[i], remaining), p[i], entry[i] * self.tp_level[i, rungs[0]], rungs))
+                self.tp_done[i, rungs] = True
+        return actions
+
+    def cancel(self, action):
+        # The exit was not sent; arm the row again
+        if action.rungs is not None:
+            self.tp_done[action.index, action.rungs] = False
+        else:
+            self.active[action.index] = True
+
+    def record_fill(self, action, price):
+        i = action.index
+        units = min(action.fraction * self.entry_amount[i], self.amount[i])
+        self.realized_today += (price - self.day_open[i]) * units
+        self.closed_value_today += self.day_open[i] * units
+        self.amount[i] -= units
+        if self.amount[i] <= 1e-12 * max(self.entry_amount[i], 1.0):
+            self.amount[i] = 0.0
+            self.active[i] = False
@@ -0,0 +1,782 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import importlib
+import threading
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from types import SimpleNamespace
+from eth_abi import encode, decode
+from eth_utils import keccak, to_checksum_address
+from chain_reader import AGGREGATE3, GET_BLOCK_NUMBER, GET_ETH_BALANCE, BALANCE_OF, GET_RESERVES, GET_PAIR, TOKEN0
+from swap_quoter import WETH_ADDRESS
+from swap_indexer import SWAP_TOPIC, TRANSFER_TOPIC, address_topic
+from benchmark import timing_stats, git_revision
+
+logger = logging.getLogger()
+
+real_monotonic = time.monotonic
+real_time = time.time
+
+SIM_SYMBOL = 'XETHZUSD'
+SIM_CHAT_ID = '1'
+SIM_WALLET = '0x' + '11' * 20
+SIM_TOKEN = '0x' + '22' * 20
+SIM_PAIR = '0x' + '33' * 20
+SIM_ROUTER = '0x' + '44' * 20
+SIM_PRIVATE_KEY = '0x' + '42' * 32  # Throwaway key, only ever used against the fake chain
+SIM_EPOCH = 1_700_006_400  # Tape time 0, a UTC midnight
+ZERO_ADDRESS = '0x' + '00' * 20
+WEI = {'wei': 1, 'gwei': 10 ** 9, 'ether': 10 ** 18}
+READ_COMMANDS = ['status', 'balance', 'market', 'perf', 'hello']
+TRADE_COMMANDS = ['buy', 'sell']
+
+class SimClock:
+    # Virtual time for a simulation run: real time plus every idle stretch the
+    # event loop skipped. time() is wall-clock time on the tape's calendar.
+    def __init__(self, epoch=SIM_EPOCH):
+        self.offset = 0.0
+        self.base = real_monotonic()
+        self.epoch = epoch
+
+    def monotonic(self):
+        return real_monotonic() + self.offset
+
+    def time(self):
+        return self.epoch + self.monotonic() - self.base
+
+    def advance(self, seconds):
+        self.offset += seconds
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    # An event loop that, instead of sleeping until the next timer, jumps the
+    # clock forward to it. While any run_in_executor job is running it waits in
+    # real time, so I/O timeouts can't fire just because the clock jumped.
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.busy = 0
+        select = self._selector.select
+
+        def select_or_skip(timeout=None):
+            if self.busy or timeout is None or timeout <= 0:
+                return select(timeout)
+            events = select(0)
+            if not events:
+                self.clock.advance(timeout)
+            return events
+        self._selector.select = select_or_skip
+
+    def time(self):
+        return self.clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.busy += 1
+        future.add_done_callback(self.executor_done)
+        return future
+
+    def executor_done(self, future):
+        self.busy -= 1
+
+def synthetic_tape(duration=7200, start_price=2000.0, tick=1.0, volatility=0.0004, crashes=3, wicks=3, commands_per_minute=2.0, bursts=3, trade_commands=False, warmup=2 * 86400, seed=7):
+    # A seeded random walk with a history before t=0 for the candle stores,
+    # crashes deep enough to trip the stop loss, one-tick wicks that test how
+    # fast a breach is seen, and bursts of chat commands
+    rng = random.Random(seed)
+    events, price = [], start_price
+    for t in range(-warmup, 0, 60):
+        price *= 1 + rng.gauss(0, volatility * 8)
+        events.append({'t': float(t), 'price': round(price, 2)})
+    crash_starts = sorted(rng.uniform(0.1, 0.9) * duration for _ in range(crashes))
+    wick_times = {int(rng.uniform(0.05, 0.95) * duration / tick) for _ in range(wicks)}
+    drift = 0.0
+    for i in range(int(duration / tick)):
+        t = i * tick
+        for start in crash_starts:
+            if start <= t < start + 90:
+                drift = -0.08 / (90 / tick)  # About 8% down over a minute and a half
+                break
+        else:
+            drift *= 0.5
+        price *= 1 + drift + rng.gauss(0, volatility)
+        shown = price * 0.95 if i in wick_times else price
+        events.append({'t': t, 'price': round(shown, 2)})
+    commands = READ_COMMANDS + (TRADE_COMMANDS if trade_commands else [])
+    t = rng.expovariate(commands_per_minute / 60) if commands_per_minute else duration
+    while t < duration:
+        events.append({'t': round(t, 3), 'command': rng.choice(commands), 'args': []})
+        t += rng.expovariate(commands_per_minute / 60)
+    for _ in range(bursts):
+        at = rng.uniform(0, duration)
+        for j in range(rng.randint(10, 30)):
+            events.append({'t': round(at + j * 0.05, 3), 'command': rng.choice(READ_COMMANDS), 'args': []})
+    events.sort(key=lambda e: e['t'])
+    return events
+
+def tape_from_candles(path, warmup_bars=2880):
+    # Each bar becomes open, high, low and close ticks spread across it; the first
+    # warmup_bars are history from before the simulation starts
+    from backtest import load_ohlcv
+
+    df = load_ohlcv(path)
+    times = df['time'].to_numpy()
+    spacing = float(times[1] - times[0]) if len(times) > 1 else 60.0
+    start = times[min(warmup_bars, len(times) - 1)]
+    events = []
+    for t, o, h, l, c in zip(times, df['open'], df['high'], df['low'], df['close']):
+        for k, price in enumerate((o, h, l, c) if c >= o else (o, l, h, c)):
+            events.append({'t': float(t - start) + k * spacing / 4, 'price': float(price)})
+    return events
+
+def load_tape(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_tape(events, path):
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+class SimMarket:
+    # The price the fakes quote and the Kraken bars built from every tick so far
+    def __init__(self, clock, symbol):
+        self.clock = clock
+        self.symbol = symbol
+        self.lock = threading.Lock()
+        self.price = None
+        self.ticks = []
+        self.bars = {}
+
+    def add(self, bars, interval, ts, price):
+        bucket = int(ts) // (interval * 60) * interval * 60
+        bar = bars.get(bucket)
+        if bar is None:
+            bars[bucket] = [price, price, price, price, price, 1]
+        else:
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+            bar[4] += price
+            bar[5] += 1
+
+    def update(self, price, ts=None):
+        ts = self.clock.time() if ts is None else ts
+        with self.lock:
+            self.price = price
+            self.ticks.append((ts, price))
+            for interval, bars in self.bars.items():
+                self.add(bars, interval, ts, price)
+
+    def ohlc(self, interval, since=None, limit=720):
+        with self.lock:
+            if interval not in self.bars:
+                bars = self.bars[interval] = {}
+                for ts, price in self.ticks:
+                    self.add(bars, interval, ts, price)
+            rows = [[bucket, f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{total / n:.2f}", f"{n:.8f}", n]
+                    for bucket, (o, h, l, c, total, n) in self.bars[interval].items() if since is None or bucket >= since][-limit:]
+        return rows, (rows[-2][0] if len(rows) > 1 else since or 0)
+
+class FakeKraken:
+    # Answers krakenex query_public calls from the simulated market
+    def __init__(self, market):
+        self.market = market
+        self.calls = 0
+
+    def query_public(self, method, params=None, timeout=None):
+        self.calls += 1
+        params = params or {}
+        symbol = params.get('pair', self.market.symbol)
+        if method == 'Ticker':
+            return {'error': [], 'result': {symbol: {'c': [f"{self.market.price:.2f}", '1.0']}}}
+        if method == 'OHLC':
+            rows, last = self.market.ohlc(int(params.get('interval', 1)), params.get('since'))
+            return {'error': [], 'result': {symbol: rows, 'last': last}}
+        return {'error': [f"EGeneral:Unknown method {method}"]}
+
+class FakeCoinGecko:
+    def __init__(self, market):
+        self.market = market
+
+    def get_price(self, ids, vs_currencies, **kwargs):
+        return {ids: {vs_currencies: self.market.price}}
+
+class FakeChain:
+    # One wallet, one Uniswap V2 pair priced off the market, and transactions
+    # that are mined block_time seconds after they are sent
+    def __init__(self, clock, market, wallet=SIM_WALLET, token=SIM_TOKEN, pair=SIM_PAIR, weth=WETH_ADDRESS, block_time=12, eth_balance=10 * 10 ** 18):
+        self.clock = clock
+        self.market = market
+        self.wallet = to_checksum_address(wallet)
+        self.token = to_checksum_address(token)
+        self.pair = to_checksum_address(pair)
+        self.weth = to_checksum_address(weth)
+        self.block_time = block_time
+        self.eth_balance = eth_balance
+        self.token_balance = 10 ** 21
+        self.lock = threading.Lock()
+        self.start = clock.monotonic()
+        self.nonce = 0
+        self.transactions = {}
+        self.sent = []
+        self.rpc_calls = 0
+
+    def block(self):
+        return self.block_at(self.clock.monotonic())
+
+    def block_at(self, t):
+        return 19_000_000 + int((t - self.start) // self.block_time)
+
+    def block_timestamp(self, block):
+        return int(self.clock.epoch + self.start - self.clock.base + (block - 19_000_000) * self.block_time)
+
+    def token0(self):
+        return min(self.weth, self.token, key=lambda a: int(a, 16))
+
+    def reserves(self):
+        reserve_weth = 10_000 * 10 ** 18
+        reserve_token = int(reserve_weth * (self.market.price or 1.0))
+        return (reserve_weth, reserve_token) if self.token0() == self.weth else (reserve_token, reserve_weth)
+
+    def call(self, target, calldata):
+        selector, args = calldata[:4], calldata[4:]
+        if selector == GET_BLOCK_NUMBER:
+            return True, encode(['uint256'], [self.block()])
+        if selector == GET_ETH_BALANCE:
+            return True, encode(['uint256'], [self.eth_balance])
+        if selector == BALANCE_OF:
+            return True, encode(['uint256'], [self.token_balance])
+        if selector == GET_RESERVES and to_checksum_address(target) == self.pair:
+            return True, encode(['uint112', 'uint112', 'uint32'], [*self.reserves(), 0])
+        if selector == GET_PAIR:
+            tokens = {to_checksum_address(a) for a in decode(['address', 'address'], args)}
+            return True, encode(['address'], [self.pair if tokens == {self.weth, self.token} else ZERO_ADDRESS])
+        if selector == TOKEN0 and to_checksum_address(target) == self.pair:
+            return True, encode(['address'], [self.token0()])
+        return False, b''
+
+    def rpc(self, method, params):
+        self.rpc_calls += 1
+        if method == 'eth_call':
+            data = bytes.fromhex(params[0]['data'][2:])
+            if data[:4] != AGGREGATE3:
+                return '0x'
+            (calls,) = decode(['(address,bool,bytes)[]'], data[4:])
+            return '0x' + encode(['(bool,bytes)[]'], [[self.call(target, calldata) for target, _, calldata in calls]]).hex()
+        if method == 'eth_getTransactionCount':
+            return hex(self.nonce)
+        if method == 'eth_blockNumber':
+            return hex(self.block())
+        if method == 'eth_getLogs':
+            return self.get_logs(params[0])
+        if method == 'eth_getTransactionReceipt':
+            return self.raw_receipt(bytes.fromhex(params[0][2:]))
+        if method == 'eth_getBlockByNumber':
+            return {'number': params[0], 'timestamp': hex(self.block_timestamp(int(params[0], 16)))}
+        raise ValueError(f"Unsupported method {method}")
+
+    def send(self, raw):
+        transaction = json.loads(raw)
+        tx_hash = keccak(raw)
+        with self.lock:
+            self.transactions[tx_hash] = (transaction, self.clock.monotonic(), self.market.price)
+            self.nonce = max(self.nonce, transaction['nonce'] + 1)
+            self.sent.append((self.clock.monotonic(), 'sell' if transaction.get('data') == 'swapExactTokensForETH' else 'buy'))
+        return tx_hash
+
+    def receipt(self, tx_hash):
+        with self.lock:
+            entry = self.transactions.get(bytes(tx_hash))
+        if entry is None or self.clock.monotonic() - entry[1] < self.block_time:
+            return None
+        return {'transactionHash': bytes(tx_hash), 'blockNumber': self.block_at(entry[1] + self.block_time), 'status': 1, 'gasUsed': 120000, 'effectiveGasPrice': 21 * 10 ** 9}
+
+    def swap_logs(self, tx_hash, transaction, price, block):
+        # What the pair and token would log for the swap, priced when it was sent
+        weth_first = self.token0() == self.weth
+        base = {'blockNumber': hex(block), 'transactionHash': '0x' + tx_hash.hex()}
+        if transaction.get('data') == 'swapExactTokensForETH':
+            amount_in = transaction['amountIn']
+            amount_out = int(amount_in / price * 0.997)
+            amounts = (0, amount_in, amount_out, 0) if weth_first else (amount_in, 0, 0, amount_out)
+            return [dict(base, address=self.token, topics=[TRANSFER_TOPIC, address_topic(self.wallet), address_topic(self.pair)], data='0x' + encode(['uint256'], [amount_in]).hex()),
+                    dict(base, address=self.pair, topics=[SWAP_TOPIC, address_topic(SIM_ROUTER), address_topic(SIM_ROUTER)], data='0x' + encode(['uint256'] * 4, amounts).hex())]
+        amount_in = transaction.get('value', 0)
+        amount_out = int(amount_in * price * 0.997)
+        amounts = (amount_in, 0, 0, amount_out) if weth_first else (0, amount_in, amount_out, 0)
+        return [dict(base, address=self.pair, topics=[SWAP_TOPIC, address_topic(SIM_ROUTER), address_topic(self.wallet)], data='0x' + encode(['uint256'] * 4, amounts).hex())]
+
+    def mined_logs(self, start, end):
+        with self.lock:
+            entries = list(self.transactions.items())
+        logs = []
+        for tx_hash, (transaction, sent, price) in entries:
+            block = self.block_at(sent + self.block_time)
+            if start <= block <= min(end, self.block()):
+                logs += self.swap_logs(tx_hash, transaction, price, block)
+        return logs
+
+    def get_logs(self, log_filter):
+        addresses = log_filter.get('address')
+        addresses = None if addresses is None else {to_checksum_address(a) for a in ([addresses] if isinstance(addresses, str) else addresses)}
+        matches = []
+        for log in self.mined_logs(int(log_filter['fromBlock'], 16), int(log_filter['toBlock'], 16)):
+            if addresses is not None and log['address'] not in addresses:
+                continue
+            if all(want is None or log['topics'][i] in (want if isinstance(want, list) else [want]) for i, want in enumerate(log_filter.get('topics', []))):
+                matches.append(log)
+        return matches
+
+    def raw_receipt(self, tx_hash):
+        receipt = self.receipt(tx_hash)
+        if receipt is None:
+            return None
+        transaction, _, price = self.transactions[tx_hash]
+        return {'transactionHash': '0x' + tx_hash.hex(), 'from': transaction['from'].lower(), 'blockNumber': hex(receipt['blockNumber']), 'status': '0x1', 'gasUsed': hex(receipt['gasUsed']),
+                'effectiveGasPrice': hex(receipt['effectiveGasPrice']), 'logs': self.swap_logs(tx_hash, transaction, price, receipt['blockNumber'])}
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeRPCSession:
+    # Stands in for the chain reader's requests.Session
+    def __init__(self, chain):
+        self.chain = chain
+
+    def post(self, url, json=None, timeout=None):
+        batch = json if isinstance(json, list) else [json]
+        out = [{'jsonrpc': '2.0', 'id': r['id'], 'result': self.chain.rpc(r['method'], r['params'])} for r in batch]
+        return FakeResponse(out if isinstance(json, list) else out[0])
+
+class FakeSwap:
+    def __init__(self, router, function, amount_in=None):
+        self.router = router
+        self.function = function
+        self.amount_in = amount_in
+
+    def estimate_gas(self, params):
+        return 150000
+
+    def build_transaction(self, params):
+        transaction = dict(params, to=self.router, data=self.function, chainId=1)
+        if self.amount_in is not None:
+            transaction['amountIn'] = self.amount_in
+        return transaction
+
+class FakeRouter:
+    def __init__(self, address):
+        self.address = address
+        self.functions = self
+
+    def swapExactETHForTokens(self, amount_out_min, path, to, deadline):
+        return FakeSwap(self.address, 'swapExactETHForTokens')
+
+    def swapExactTokensForETH(self, amount_in, amount_out_min, path, to, deadline):
+        return FakeSwap(self.address, 'swapExactTokensForETH', amount_in)
+
+class FakeAccount:
+    @staticmethod
+    def sign_transaction(transaction, private_key):
+        raw = json.dumps(transaction, sort_keys=True, default=str).encode()
+        return SimpleNamespace(raw_transaction=raw, hash=keccak(raw))
+
+class FakeEth:
+    def __init__(self, chain):
+        self.chain = chain
+        self.account = FakeAccount()
+
+    def get_balance(self, address):
+        return self.chain.eth_balance
+
+    def get_transaction_count(self, address, block='latest'):
+        return self.chain.nonce
+
+    def fee_history(self, count, newest, percentiles):
+        return {'oldestBlock': self.chain.block() - count + 1, 'baseFeePerGas': [20 * 10 ** 9] * (count + 1), 'reward': [[10 ** 9]] * count}
+
+    def send_raw_transaction(self, raw):
+        return self.chain.send(raw)
+
+    def get_transaction_receipt(self, tx_hash):
+        receipt = self.chain.receipt(tx_hash)
+        if receipt is None:
+            raise ValueError(f"Transaction {tx_hash.hex()} not found")
+        return receipt
+
+    def contract(self, address, abi):
+        return FakeRouter(address)
+
+class FakeWeb3:
+    # The part of web3.Web3 the bot uses, including Decimal from from_wei
+    def __init__(self, chain):
+        self.eth = FakeEth(chain)
+
+    def is_connected(self):
+        return True
+
+    @staticmethod
+    def to_wei(value, unit):
+        return int(Decimal(str(value)) * WEI[unit])
+
+    @staticmethod
+    def from_wei(value, unit):
+        return Decimal(value) / WEI[unit]
+
+    @staticmethod
+    def to_checksum_address(address):
+        return to_checksum_address(address)
+
+    @staticmethod
+    def to_hex(value):
+        return '0x' + bytes(value).hex()
+
+class SimRetryAfter(Exception):
+    # Shaped like telegram.error.RetryAfter
+    def __init__(self, retry_after):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+class FakeTelegramBot:
+    # Records sent messages and enforces a per-chat token bucket like Telegram's flood limit
+    def __init__(self, clock, rate=1.0, burst=10):
+        self.clock = clock
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.messages = []
+        self.flood_limited = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        now = self.clock.monotonic()
+        tokens, stamp = self.buckets.get(chat_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        if tokens < 1:
+            self.flood_limited += 1
+            self.buckets[chat_id] = (tokens, now)
+            raise SimRetryAfter(math.ceil((1 - tokens) / self.rate))
+        self.buckets[chat_id] = (tokens - 1, now)
+        self.messages.append((now, chat_id, text))
+        return SimpleNamespace(message_id=len(self.messages), chat_id=chat_id, text=text)
+
+class TapeTransport:
+    # Price feed transport the simulator pushes tape prices into
+    reconnect = False
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def stream(self):
+        while True:
+            yield await self.queue.get()
+
+def configure_environment(data_dir, symbol=SIM_SYMBOL):
+    # Everything the bot reads at import points at the fakes or the scratch
+    # directory, so a real .env can't leak keys or endpoints into a simulation
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': 'simulation',
+        'CHAT_ID': SIM_CHAT_ID,
+        'SYMBOL': symbol,
+        'WEB3_INFURA_URL': 'http://simulation.invalid',
+        'WEB3_ALCHEMY_URL': 'http://simulation.invalid',
+        'TRUST_WALLET_ADDRESS': SIM_WALLET,
+        'PRIVATE_KEY': SIM_PRIVATE_KEY,
+        'UNISWAP_ROUTER_ADDRESS': SIM_ROUTER,
+        'ETH_TOKEN_ADDRESS': SIM_TOKEN,
+        'KRAKEN_API_KEY': '',
+        'KRAKEN_API_SECRET': '',
+        'COINGECKO_API_KEY': '',
+        'EMAIL_ADDRESS': '',
+        'EMAIL_PASSWORD': '',
+        'RECEIPENT_ADDRESS': '',
+        'CANDLE_STORE_DIR': data_dir,
+        'LEDGER_PATH': os.path.join(data_dir, 'trades.db'),
+        'STATE_PATH': os.path.join(data_dir, 'state.json'),
+        'STRATEGIES_FILE': '',
+        'METRICS_PORT': '0',
+        'FAST_START': '1'
+    })
+
+class Simulation:
+    # Runs ETH_Bot.main() against the fakes on a virtual clock while a tape of
+    # prices and chat commands plays, then scores it: throughput, how long each
+    # tick took to reach a stop-loss decision, and stop-loss breaches that never
+    # produced a sell within grace seconds.
+    def __init__(self, tape, data_dir, symbol=SIM_SYMBOL, grace=5.0, opening_price=None):
+        self.history = [e for e in tape if e['t'] < 0 and 'price' in e]
+        self.events = [e for e in tape if e['t'] >= 0]
+        self.data_dir = data_dir
+        self.symbol = symbol
+        self.grace = grace
+        self.opening_price = opening_price
+        self.clock = SimClock()
+        self.market = SimMarket(self.clock, symbol)
+        self.kraken = FakeKraken(self.market)
+        self.chain = FakeChain(self.clock, self.market)
+        self.telegram = FakeTelegramBot(self.clock)
+        self.transport = TapeTransport()
+        self.ticks = []
+        self.checks = []
+        self.check_seconds = []
+        self.commands = {}
+        self.command_tasks = set()
+
+    def install(self):
+        configure_environment(self.data_dir, self.symbol)
+        bot = importlib.import_module('ETH_Bot')
+        bot.kraken_client.query_public = self.kraken.query_public
+        bot.web3.override(FakeWeb3(self.chain))
+        bot.uniswap_router.override(FakeRouter(SIM_ROUTER))
+        bot.coingecko_client.override(FakeCoinGecko(self.market))
+        bot.bot.override(self.telegram)
+        bot.chain_reader.session = FakeRPCSession(self.chain)
+        bot.price_feed.transport = self.transport
+        bot.start_telegram = self.start_telegram
+        self.check_stop_loss = bot.strategy_runner.on_price
+        bot.strategy_runner.on_price = self.timed_check
+        self.bot = bot
+        return bot
+
+    async def start_telegram(self):
+        # Commands come from the tape instead of Telegram polling
+        return None
+
+    async def timed_check(self, strategy, price, action=None):
+        self.checks.append((self.clock.monotonic(), price))
+        started = time.perf_counter()
+        try:
+            await self.check_stop_loss(strategy, price, action)
+        finally:
+            self.check_seconds.append(time.perf_counter() - started)
+
+    async def run_command(self, name, args):
+        stats = self.commands.setdefault(name, {'count': 0, 'errors': 0, 'seconds': []})
+        handler = getattr(self.bot, f"{name}_command", None)
+        stats['count'] += 1
+        if handler is None:
+            stats['errors'] += 1
+            return
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=SIM_CHAT_ID), message=SimpleNamespace(text=' '.join([f"/{name}"] + list(args))))
+        context = SimpleNamespace(bot=self.telegram, args=list(args))
+        started = time.perf_counter()
+        try:
+            await handler(update, context)
+        except Exception as e:
+            stats['errors'] += 1
+            logger.info(f"/{name} failed in simulation: {e}")
+        stats['seconds'].append(time.perf_counter() - started)
+
+    async def play(self):
+        strategy = self.bot.default_strategy
+        start = self.clock.monotonic()
+        for event in self.events:
+            delay = start + event['t'] - self.clock.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if 'price' in event:
+                self.market.update(event['price'])
+                self.transport.queue.put_nowait((self.symbol, float(event['price'])))
+                # Whichever of the fixed, trailing and volatility stops is highest right now
+                threshold = strategy.risk_engine.stop_level(strategy.risk_index)
+                self.ticks.append((self.clock.monotonic(), event['price'], threshold))
+            elif 'command' in event:
+                task = asyncio.get_running_loop().create_task(self.run_command(event['command'], event.get('args', [])))
+                self.command_tasks.add(task)
+                task.add_done_callback(self.command_tasks.discard)
+        await asyncio.sleep(self.grace)
+        if self.command_tasks:
+            await asyncio.gather(*self.command_tasks, return_exceptions=True)
+
+    async def session(self):
+        for event in self.history:
+            self.market.update(event['price'], self.clock.epoch + event['t'])
+        first = next((e['price'] for e in self.events if 'price' in e), None)
+        if first is not None:
+            self.market.update(first)
+        self.bot.default_strategy.opening_price = self.opening_price or first
+        main_task = asyncio.get_running_loop().create_task(self.bot.main())
+        while self.bot.strategy_runner.ticks == 0 and not main_task.done():
+            await asyncio.sleep(0.01)
+        await self.play()
+        main_task.cancel()
+        try:
+            await main_task
+        except asyncio.CancelledError:
+            pass
+
+    def run(self):
+        if not hasattr(self, 'bot'):
+            self.install()
+        loop = VirtualTimeLoop(self.clock)
+        time.monotonic, time.time = self.clock.monotonic, self.clock.time
+        started = time.perf_counter()
+        virtual_start = self.clock.monotonic()
+        try:
+            loop.run_until_complete(self.session())
+            # Background tasks main() started (price feed, snapshot refresh, ...) end with the run
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            time.monotonic, time.time = real_monotonic, real_time
+            loop.close()
+        return self.report(time.perf_counter() - started, self.clock.monotonic() - virtual_start)
+
+    def decision_latencies(self):
+        # For every tick, the virtual time until a stop-loss check ran with it;
+        # a tick replaced by the next one before any check ran counts as skipped
+        check_times = [t for t, _ in self.checks]
+        latencies, skipped = [], 0
+        for i, (t, _, _) in enumerate(self.ticks):
+            j = bisect_left(check_times, t)
+            next_tick = self.ticks[i + 1][0] if i + 1 < len(self.ticks) else math.inf
+            if j < len(check_times) and check_times[j] < next_tick:
+                latencies.append(check_times[j] - t)
+            else:
+                skipped += 1
+        return latencies, skipped
+
+    def stop_loss_episodes(self):
+        # Runs of ticks below the stop-loss level; each should end in a sell
+        check_times = [t for t, _ in self.checks]
+        sells = [t for t, kind in self.chain.sent if kind == 'sell']
+        episodes, current = [], None
+        for i, (t, price, threshold) in enumerate(self.ticks):
+            breached = threshold is not None and price < threshold
+            if breached and current is None:
+                current = {'start': t, 'threshold': threshold}
+            if current is not None and (not breached or i == len(self.ticks) - 1):
+                current['end'] = t
+                episodes.append(current)
+                current = None
+        for episode in episodes:
+            window_end = episode['end'] + self.grace
+            checks = self.checks[bisect_left(check_times, episode['start']):bisect_right(check_times, window_end)]
+            episode['seen'] = any(price < episode['threshold'] for _, price in checks)
+            sold = sells[bisect_left(sells, episode['start']):bisect_right(sells, window_end)]
+            episode['sold_after'] = sold[0] - episode['start'] if sold else None
+        return episodes
+
+    def report(self, real_seconds, virtual_seconds):
+        latencies, skipped = self.decision_latencies()
+        episodes = self.stop_loss_episodes()
+        missed = [e for e in episodes if e['sold_after'] is None]
+        command_count = sum(s['count'] for s in self.commands.values())
+        return {
+            'meta': {
+                'revision': git_revision(),
+                'events': len(self.events),
+                'virtual_seconds': virtual_seconds,
+                'real_seconds': real_seconds,
+                'speedup': virtual_seconds / real_seconds if real_seconds else None,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            },
+            'throughput': {
+                'price_ticks': len(self.ticks),
+                'ticks_per_second': len(self.ticks) / real_seconds if real_seconds else None,
+                'loop_iterations': self.bot.strategy_runner.ticks,
+                'stop_loss_checks': len(self.checks),
+                'commands': command_count,
+                'commands_per_second': command_count / real_seconds if real_seconds else None
+            },
+            'decision_latency': timing_stats(latencies) if latencies else None,
+            'skipped_ticks': skipped,
+            'check_seconds': timing_stats(self.check_seconds) if self.check_seconds else None,
+            'stop_loss': {
+                'episodes': len(episodes),
+                'sold': len(episodes) - len(missed),
+                'missed': len(missed),
+                'missed_unseen': sum(1 for e in missed if not e['seen']),
+                'missed_declined': sum(1 for e in missed if e['seen']),
+                'reaction': timing_stats([e['sold_after'] for e in episodes if e['sold_after'] is not None]) if len(missed) < len(episodes) else None,
+                'sell_transactions': sum(1 for _, kind in self.chain.sent if kind == 'sell'),
+                'buy_transactions': sum(1 for _, kind in self.chain.sent if kind == 'buy'),
+                'fills_recorded': self.bot.swap_indexer.fills_recorded,
+                'blocks_indexed': self.bot.swap_indexer.blocks_indexed
+            },
+            'commands': {name: {'count': s['count'], 'errors': s['errors'], **(timing_stats(s['seconds']) if s['seconds'] else {})} for name, s in sorted(self.commands.items())},
+            'external': {
+                'kraken_calls': self.kraken.calls,
+                'rpc_calls': self.chain.rpc_calls,
+                'telegram_messages': len(self.telegram.messages),
+                'telegram_flood_limited': self.telegram.flood_limited
+            }
+        }
+
+def format_stats(stats, scale=1000, unit='ms'):
+    if not stats:
+        return 'n/a'
+    return f"p50 {stats['p50'] * scale:.1f} {unit} / p99 {stats['p99'] * scale:.1f} {unit} / max {stats['max'] * scale:.1f} {unit}"
+
+def format_report(report):
+    meta, throughput, stop_loss = report['meta'], report['throughput'], report['stop_loss']
+    lines = [
+        f"Simulation at {meta['revision']}: {meta['virtual_seconds']:.0f}s of tape in {meta['real_seconds']:.1f}s ({meta['speedup']:.0f}x real time)",
+        f"Throughput: {throughput['ticks_per_second']:.0f} ticks/s, {throughput['loop_iterations']} loop iterations, {throughput['stop_loss_checks']} stop-loss checks, {throughput['commands']} commands",
+        f"Tick to decision (virtual): {format_stats(report['decision_latency'])}, {report['skipped_ticks']} ticks never checked",
+        f"Stop-loss check (real): {format_stats(report['check_seconds'])}",
+        f"Stop-loss breaches: {stop_loss['episodes']}, sold {stop_loss['sold']}, missed {stop_loss['missed']} ({stop_loss['missed_unseen']} never seen, {stop_loss['missed_declined']} seen but not sold)",
+        f"Breach to sell (virtual): {format_stats(stop_loss['reaction'], 1, 's')}, {stop_loss['sell_transactions']} sells and {stop_loss['buy_transactions']} buys sent, {stop_loss['fills_recorded']} fills indexed from {stop_loss['blocks_indexed']} blocks"
+    ]
+    for name, stats in report['commands'].items():
+        lines.append(f"/{name:<8} {stats['count']:>5} runs, {stats['errors']} errors, {format_stats(stats if 'p50' in stats else None)}")
+    external = report['external']
+    lines.append(f"External: {external['kraken_calls']} Kraken calls, {external['rpc_calls']} RPC calls, {external['telegram_messages']} Telegram messages, {external['telegram_flood_limited']} flood-limited")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ETH Bot against in-process fakes on a virtual clock, driven by a price and command tape")
+    parser.add_argument('--tape', help="JSON lines tape of {'t', 'price'} and {'t', 'command', 'args'} events; a synthetic tape is used if omitted")
+    parser.add_argument('--candles', help="Build the tape from a CSV or Parquet OHLCV file instead")
+    parser.add_argument('--save-tape', help="Write the tape that was played to this file")
+    parser.add_argument('--duration', type=int, default=7200, help="Seconds of synthetic tape")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--crashes', type=int, default=3, help="Stop-loss crashes in the synthetic tape")
+    parser.add_argument('--commands-per-minute', type=float, default=2.0)
+    parser.add_argument('--trade-commands', action='store_true', help="Include /buy and /sell in the synthetic command mix")
+    parser.add_argument('--opening-price', type=float, help="Opening price the stop loss is measured from; defaults to the first tape price")
+    parser.add_argument('--grace', type=float, default=5.0, help="Seconds after a breach ends that a sell still counts")
+    parser.add_argument('--output', default='simulation_results.json')
+    parser.add_argument('--fail-on-miss', action='store_true', help="Exit with status 1 if any stop-loss breach was missed")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    if args.candles:
+        tape = tape_from_candles(args.candles)
+    elif args.tape:
+        tape = load_tape(args.tape)
+    else:
+        tape = synthetic_tape(args.duration, crashes=args.crashes, commands_per_minute=args.commands_per_minute, trade_commands=args.trade_commands, seed=args.seed)
+    if args.save_tape:
+        save_tape(tape, args.save_tape)
+
+    with tempfile.TemporaryDirectory(prefix='ethbot-sim-') as data_dir:
+        simulation = Simulation(tape, data_dir, grace=args.grace, opening_price=args.opening_price)
+        simulation.install()
+        logging.getLogger().setLevel(args.log_level)
+        report = simulation.run()
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    print(f"Results written to {args.output}")
+    if args.fail_on_miss and report['stop_loss']['missed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
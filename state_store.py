@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger()
+
+class StateStore:
+    # Bot state that must survive a restart (each strategy's opening price and
+    # stop-loss flag, transactions still waiting for a receipt) kept as a JSON
+    # snapshot plus a write-ahead journal. Every change is appended to the journal
+    # and fsync'd before record() returns (record_many() writes several keys with
+    # one fsync); load() reads the snapshot and replays
+    # the journal on top, ignoring a last line torn by a crash. Once the journal
+    # holds compact_every entries it is folded into a new snapshot.
+    def __init__(self, path, compact_every=1000):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.state = {}
+        self.entries = 0
+        self.journal = None
+        self.loaded = False
+
+    def load(self):
+        started = time.perf_counter()
+        self.state = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load state snapshot {self.path}: {e}")
+        self.entries = 0
+        if os.path.exists(self.journal_path):
+            good = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        section, key, value = json.loads(line)
+                    except ValueError:
+                        break
+                    self.apply(section, key, value)
+                    self.entries += 1
+                    good += len(line)
+            if good < os.path.getsize(self.journal_path):
+                # Cut the torn entry off so new entries start on a fresh line
+                logger.warning(f"Dropping torn entry at the end of {self.journal_path}")
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good)
+        self.loaded = True
+        logger.info(f"Restored state from {self.path} and {self.entries} journal entries in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return self.state
+
+    def apply(self, section, key, value):
+        if value is None:
+            self.state.get(section, {}).pop(key, None)
+        else:
+            self.state.setdefault(section, {})[key] = value
+
+    def get(self, section):
+        return dict(self.state.get(section, {}))
+
+    def record(self, section, key, value):
+        # value None removes the key
+        self.record_many(section, {key: value})
+
+    def record_many(self, section, values):
+        # values maps keys to values (None removes the key), all made durable by one fsync
+        with self.lock:
+            if self.journal is None:
+                os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+                self.journal = open(self.journal_path, 'a')
+            self.journal.write(''.join(json.dumps([section, key, value]) + '\n' for key, value in values.items()))
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            for key, value in values.items():
+                self.apply(section, key, value)
+            self.entries += len(values)
+            if self.entries >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        # Snapshot first, then truncate the journal: a crash in between only
+        # replays entries the snapshot already contains
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = open(self.journal_path, 'w')
+            self.entries = 0
+
+    def close(self):
+        with self.lock:
+            if self.loaded:
+                # Never written over a snapshot that was not read first
+                self.compact()
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
@@ -0,0 +1,191 @@
+import json
+import time
+import asyncio
+import logging
+from request_scheduler import priority, PRIORITY_STOP_LOSS
+from metrics import registry
+
+logger = logging.getLogger()
+
+class StrategyInstance:
+    # One (pair, wallet, parameters) combination and its trading state
+    def __init__(self, name, symbol, wallet_address, token_address, pipeline=None, stop_loss_threshold=0.975, interval=1440, ws_symbol=None,
+                 trailing_stop=None, take_profit=(), volatility_multiplier=None):
+        self.name = name
+        self.symbol = symbol
+        self.wallet_address = wallet_address
+        self.token_address = token_address
+        self.pipeline = pipeline
+        self.stop_loss_threshold = stop_loss_threshold
+        self.interval = interval
+        self.ws_symbol = ws_symbol
+        self.trailing_stop = trailing_stop
+        self.take_profit = [tuple(rung) for rung in take_profit]
+        self.volatility_multiplier = volatility_multiplier
+        self.risk_engine = None
+        self.risk_index = None
+        self._opening_price = None
+        self.stop_loss_triggered = False
+        self.last_price = None
+        self.task = None
+
+    @property
+    def opening_price(self):
+        return self._opening_price
+
+    @opening_price.setter
+    def opening_price(self, price):
+        # A new entry resets the position's row in the risk engine
+        self._opening_price = price
+        if self.risk_engine is not None:
+            self.risk_engine.set_entry(self.risk_index, price)
+
+    def state(self):
+        # What a restart needs to keep the stop loss armed
+        state = {'opening_price': self.opening_price, 'stop_loss_triggered': self.stop_loss_triggered}
+        if self.risk_engine is not None:
+            state['risk'] = self.risk_engine.position_state(self.risk_index)
+        return state
+
+    def restore(self, state):
+        self.opening_price = state.get('opening_price')
+        self.stop_loss_triggered = state.get('stop_loss_triggered', False)
+        if self.risk_engine is not None:
+            # State from before the risk engine only says whether the stop fired
+            self.risk_engine.restore_position(self.risk_index, state.get('risk', {'open': not self.stop_loss_triggered}))
+
+def load_strategy_configs(path):
+    # A JSON list of objects with name, symbol, wallet, token_address and optionally
+    # ws_symbol, private_key_env, stop_loss_threshold, interval, trailing_stop,
+    # take_profit (a list of [multiple of opening price, fraction to sell]),
+    # volatility_multiplier and coingecko_id (CoinGecko's id for the symbol's coin)
+    with open(path) as f:
+        configs = json.load(f)
+    if not isinstance(configs, list):
+        raise ValueError(f"{path} must contain a list of strategies")
+    return configs
+
+class MarketData:
+    # Shared market data for every strategy instance: one candle store per
+    # (pair, interval) and one price lookup per pair per tick, however many
+    # instances trade that pair. Candle refreshes go through the Kraken provider
+    # queue with the pair as owner, so pairs take turns under the rate limit.
+    def __init__(self, kraken, candle_store_factory, price_fn):
+        self.kraken = kraken
+        self.candle_store_factory = candle_store_factory
+        self.price_fn = price_fn
+
+    async def candles(self, symbol, interval):
+        store = self.candle_store_factory(symbol, interval)
+        if not store.due():
+            return store.df
+        # Only bars that really need a Kraken round-trip take a scheduler slot
+        try:
+            return await self.kraken.run(store.get, owner=symbol)
+        except Exception as e:
+            logger.error(f"Failed to refresh {symbol} candles at {interval}m: {e}")
+            raise
+
+    async def price(self, symbol):
+        try:
+            # These prices feed stop-loss decisions, so they go ahead of everything else
+            with priority(PRIORITY_STOP_LOSS):
+                return await self.price_fn(symbol)
+        except Exception as e:
+            logger.error(f"Failed to get price for {symbol}: {e}")
+            return None
+
+class StrategyRunner:
+    # Drives every instance from one event loop. Each tick refreshes the data each
+    # distinct pair needs once, then hands every instance its price. An instance
+    # whose previous check is still running (an order in flight) is skipped, so
+    # a slow sell never holds up the other pairs. With a risk engine, every
+    # position's exit rules are evaluated in one pass on the tick's prices before
+    # any candle refresh, and instances with an exit are dispatched first.
+    # Instances whose trailing high moved are passed to on_state together at most
+    # every state_interval seconds, so the highs survive a crash.
+    def __init__(self, market, instances, on_price, risk_engine=None, on_state=None, state_interval=5.0):
+        self.market = market
+        self.instances = []
+        self.on_price = on_price  # async (instance, price, action)
+        self.risk_engine = risk_engine
+        self.on_state = on_state  # async (instances), to journal their state in one write
+        self.state_interval = state_interval
+        self.rows = {}
+        self.moved = set()
+        self.state_saved_at = 0.0
+        self.frames = {}
+        self.ticks = 0
+        for instance in instances:
+            self.add(instance)
+
+    def add(self, instance):
+        if self.risk_engine is not None and instance.risk_engine is None:
+            instance.risk_index = self.risk_engine.add(instance.name, instance.symbol, instance.interval, stop_fraction=instance.stop_loss_threshold,
+                                                       trailing_stop=instance.trailing_stop, volatility_multiplier=instance.volatility_multiplier,
+                                                       take_profit=instance.take_profit)
+            instance.risk_engine = self.risk_engine
+            instance.opening_price = instance.opening_price  # Arms the row for a position opened before add()
+            self.rows[instance.risk_index] = instance
+        self.instances.append(instance)
+
+    async def run_once(self):
+        self.ticks += 1
+        loop = asyncio.get_running_loop()
+        symbols = sorted({i.symbol for i in self.instances})
+        prices = dict(zip(symbols, await asyncio.gather(*(self.market.price(s) for s in symbols))))
+        actions = {}
+        if self.risk_engine is not None:
+            with registry.span('risk_evaluate'):
+                actions = {action.name: action for action in self.risk_engine.evaluate(prices)}
+            for instance in self.instances:
+                if instance.name in actions:
+                    self.dispatch(loop, instance, prices[instance.symbol], actions[instance.name])
+            await self.save_moved()
+
+        feeds = sorted({(i.symbol, i.interval) for i in self.instances})
+        candles = await asyncio.gather(*(self.market.candles(s, n) for s, n in feeds), return_exceptions=True)
+        ready = {feed for feed, df in zip(feeds, candles) if df is not None and not isinstance(df, Exception)}
+        if self.risk_engine is not None:
+            for feed, df in zip(feeds, candles):
+                if feed in ready and df is not self.frames.get(feed):
+                    self.frames[feed] = df
+                    try:
+                        self.risk_engine.update_volatility(*feed, df)
+                    except Exception as e:
+                        logger.error(f"Failed to update volatility for {feed[0]} {feed[1]}: {e}")
+
+        for instance in self.instances:
+            price = prices.get(instance.symbol)
+            if instance.name in actions or (instance.symbol, instance.interval) not in ready or price is None:
+                continue
+            self.dispatch(loop, instance, price)
+
+    async def save_moved(self):
+        self.moved.update(self.rows[i] for i in self.risk_engine.raised.tolist())
+        if self.on_state is None or not self.moved or time.monotonic() - self.state_saved_at < self.state_interval:
+            return
+        self.state_saved_at = time.monotonic()
+        moved = list(self.moved)
+        self.moved.clear()
+        await self.on_state(moved)
+
+    def dispatch(self, loop, instance, price, action=None):
+        instance.last_price = price
+        if instance.task is not None and not instance.task.done():
+            if action is not None:
+                # Decided again on a later tick, once the order in flight is done
+                self.risk_engine.cancel(action)
+            return
+        if action is not None:
+            registry.counter('risk_exits_total', reason=action.reason).inc()
+        instance.task = loop.create_task(self.check(instance, price, action))
+
+    async def check(self, instance, price, action=None):
+        try:
+            with priority(PRIORITY_STOP_LOSS):
+                await self.on_price(instance, price, action)
+        except Exception as e:
+            if action is not None:
+                self.risk_engine.cancel(action)
+            logger.error(f"Strategy {instance.name} failed: {e}")
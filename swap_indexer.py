@@ -0,0 +1,216 @@
+import time
+import logging
+import threading
+from eth_utils import keccak, to_checksum_address
+
+logger = logging.getLogger()
+
+SWAP_TOPIC = '0x' + keccak(text='Swap(address,uint256,uint256,uint256,uint256,address)').hex()  # Uniswap V2 pair
+TRANSFER_TOPIC = '0x' + keccak(text='Transfer(address,address,uint256)').hex()  # ERC-20
+
+def address_topic(address):
+    return '0x' + '00' * 12 + to_checksum_address(address)[2:].lower()
+
+def decode_swap(data):
+    # (amount0In, amount1In, amount0Out, amount1Out) from a Swap log's data
+    raw = bytes.fromhex(data[2:])
+    return tuple(int.from_bytes(raw[i:i + 32], 'big') for i in range(0, 128, 32))
+
+class Fill:
+    # What one of our swaps actually did on chain; amounts in wei and token base units
+    def __init__(self, tx_hash, block, kind, eth_amount, token_amount, gas_fee, timestamp=None):
+        self.tx_hash = tx_hash
+        self.block = block
+        self.kind = kind
+        self.eth_amount = eth_amount
+        self.token_amount = token_amount
+        self.gas_fee = gas_fee
+        self.timestamp = timestamp
+
+def fill_from_receipt(receipt, kind):
+    # A swap's hops emit one Swap each, in order: the first one's input and the
+    # last one's output are what the wallet paid and got, whatever the route
+    if int(receipt['status'], 16) != 1:
+        return None
+    swaps = [decode_swap(log['data']) for log in receipt['logs'] if log['topics'] and log['topics'][0] == SWAP_TOPIC]
+    if not swaps:
+        return None
+    amount0_in, amount1_in, _, _ = swaps[0]
+    _, _, amount0_out, amount1_out = swaps[-1]
+    amount_in, amount_out = amount0_in or amount1_in, amount0_out or amount1_out
+    eth_amount, token_amount = (amount_in, amount_out) if kind == 'buy' else (amount_out, amount_in)
+    gas_fee = int(receipt['gasUsed'], 16) * int(receipt.get('effectiveGasPrice', '0x0'), 16)
+    return Fill(receipt['transactionHash'], int(receipt['blockNumber'], 16), kind, eth_amount, token_amount, gas_fee)
+
+class SwapIndexer:
+    # Finds our wallets' swaps in the chain's logs and records their exact fills
+    # in the trade ledger. Each step asks the node for ranges_per_request ranges
+    # of batch_blocks blocks in one JSON-RPC batch of eth_getLogs calls: token
+    # Transfers out of a wallet (sells) and Swaps paying a wallet (buys). The
+    # matching receipts and block timestamps come in a second batch. The last
+    # indexed block is journaled in the state store after the fills are
+    # written, whenever fills were written and otherwise every
+    # checkpoint_interval seconds, so a restart resumes close to where it
+    # stopped and never records a fill twice. Fills that price_fn can't price
+    # yet are journaled with the checkpoint and retried every step. Ranges the
+    # node refuses as too large are halved and retried. Only one step runs at
+    # a time, even if a caller gave up waiting on the previous one.
+    def __init__(self, chain_reader, ledger, state_store=None, price_fn=None, batch_blocks=2000, ranges_per_request=5, confirmations=2, start_block=None,
+                 checkpoint_interval=60):
+        self.chain_reader = chain_reader
+        self.ledger = ledger
+        self.state_store = state_store
+        self.price_fn = price_fn  # (unix timestamp) -> USD per ETH for the ledger
+        self.batch_blocks = batch_blocks
+        self.ranges_per_request = ranges_per_request
+        self.confirmations = confirmations  # Blocks left alone in case of a reorg
+        self.start_block = start_block
+        self.checkpoint_interval = checkpoint_interval
+        self.lock = threading.Lock()
+        self.deferred = {}  # {tx hash: Fill} waiting for a price
+        self.journaled_at = None
+        self.wallets = []
+        self.tokens = []
+        self.last_block = None
+        self.head = None
+        self.blocks_indexed = 0
+        self.fills_recorded = 0
+
+    def watch(self, wallets=(), tokens=()):
+        for items, new in ((self.wallets, wallets), (self.tokens, tokens)):
+            for item in new:
+                item = to_checksum_address(item)
+                if item not in items:
+                    items.append(item)
+
+    def checkpoint(self):
+        if self.last_block is None:
+            saved = self.state_store.get('swap_index') if self.state_store is not None else {}
+            for record in saved.get('deferred', []):
+                self.deferred[record['tx_hash']] = Fill(**record)
+            if saved.get('block') is not None:
+                self.last_block = saved['block']
+            else:
+                # A fresh ledger starts at the head unless told to backfill
+                self.last_block = self.start_block - 1 if self.start_block is not None else self.latest_block() - self.confirmations
+                logger.info(f"Swap indexer starting after block {self.last_block}")
+        return self.last_block
+
+    def latest_block(self):
+        return int(self.chain_reader.rpc_batch([('eth_blockNumber', [])])[0], 16)
+
+    def log_filters(self, start, end):
+        wallet_topics = [address_topic(w) for w in self.wallets]
+        span = {'fromBlock': hex(start), 'toBlock': hex(end)}
+        # Without watched tokens, a Transfer of any token out of a wallet in a swap counts as a sell
+        sells = ('eth_getLogs', [{**span, **({'address': self.tokens} if self.tokens else {}), 'topics': [TRANSFER_TOPIC, wallet_topics]}])
+        buys = ('eth_getLogs', [{**span, 'topics': [SWAP_TOPIC, None, wallet_topics]}])
+        return [sells, buys]
+
+    def scan(self, start, end):
+        # {tx hash: 'buy' or 'sell'} for start..end, as one batch of eth_getLogs calls
+        ranges = [(s, min(s + self.batch_blocks - 1, end)) for s in range(start, end + 1, self.batch_blocks)]
+        calls = [call for s, e in ranges for call in self.log_filters(s, e)]
+        found = {}
+        for i, logs in enumerate(self.chain_reader.rpc_batch(calls)):
+            kind = 'sell' if i % 2 == 0 else 'buy'
+            for log in logs:
+                found.setdefault(log['transactionHash'], kind)
+        return found
+
+    def fills(self, found):
+        # Receipts of every swap found plus the timestamps of their blocks, in one batch.
+        # Only transactions our wallets sent are fills: anyone can route a swap's
+        # output to a wallet, and that Swap log matches the buy filter too.
+        hashes = list(found)
+        receipts = self.chain_reader.rpc_batch([('eth_getTransactionReceipt', [h]) for h in hashes])
+        fills = [fill_from_receipt(r, found[h]) for h, r in zip(hashes, receipts) if r is not None and to_checksum_address(r['from']) in self.wallets]
+        fills = sorted((f for f in fills if f is not None), key=lambda f: f.block)
+        blocks = sorted({f.block for f in fills})
+        if blocks:
+            headers = self.chain_reader.rpc_batch([('eth_getBlockByNumber', [hex(b), False]) for b in blocks])
+            timestamps = {b: int(h['timestamp'], 16) for b, h in zip(blocks, headers)}
+            for fill in fills:
+                fill.timestamp = timestamps[fill.block]
+        return fills
+
+    def record(self, fills):
+        # Writes the fills that can be priced and defers the rest; True if the
+        # ledger or the deferred fills changed
+        recorded = self.ledger.recorded([f.tx_hash for f in fills])
+        changed = False
+        for fill in fills:
+            if fill.tx_hash in recorded:
+                changed |= self.deferred.pop(fill.tx_hash, None) is not None
+                continue
+            eth = fill.eth_amount / 10 ** 18
+            price = self.price_fn(fill.timestamp) if self.price_fn is not None else None
+            if price is None:
+                if fill.tx_hash not in self.deferred:
+                    logger.warning(f"No ETH price for {fill.kind} fill {fill.tx_hash} in block {fill.block} yet, deferring it")
+                    self.deferred[fill.tx_hash] = fill
+                    changed = True
+                continue
+            self.ledger.record(fill.kind, eth, price, timestamp=fill.timestamp, tx_hash=fill.tx_hash, gas_fee=fill.gas_fee / 10 ** 18)
+            self.deferred.pop(fill.tx_hash, None)
+            self.fills_recorded += 1
+            changed = True
+            logger.info(f"Recorded {fill.kind} fill {fill.tx_hash} in block {fill.block}: {eth} ETH for {fill.token_amount} token units, gas {fill.gas_fee / 10 ** 18} ETH")
+        self.ledger.flush()
+        return changed
+
+    def journal(self, force=False):
+        if self.state_store is None:
+            return
+        now = time.monotonic()
+        if not force and self.journaled_at is not None and now - self.journaled_at < self.checkpoint_interval:
+            return
+        self.state_store.record('swap_index', 'deferred', [vars(f) for f in self.deferred.values()])
+        self.state_store.record('swap_index', 'block', self.last_block)
+        self.journaled_at = now
+
+    def step(self):
+        # Indexes the next stretch of blocks; True while still behind the chain head
+        if not self.lock.acquire(blocking=False):
+            logger.warning("Previous swap indexer step is still running, skipping this one")
+            return False
+        try:
+            return self.advance()
+        finally:
+            self.lock.release()
+
+    def advance(self):
+        start = self.checkpoint() + 1
+        changed = self.record(list(self.deferred.values())) if self.deferred else False
+        if self.head is None or start > self.head:
+            self.head = self.latest_block() - self.confirmations
+        if start > self.head:
+            if changed:
+                self.journal(force=True)
+            return False
+        end = min(self.head, start + self.batch_blocks * self.ranges_per_request - 1)
+        try:
+            found = self.scan(start, end)
+        except ValueError as e:
+            # Nodes cap eth_getLogs by block span or result count
+            if self.batch_blocks == 1:
+                raise
+            self.batch_blocks = max(1, self.batch_blocks // 2)
+            logger.warning(f"eth_getLogs refused ({e}), retrying with {self.batch_blocks} blocks per range")
+            return True
+        if found:
+            changed |= self.record(self.fills(found))
+        self.last_block = end
+        self.blocks_indexed += end - start + 1
+        self.journal(force=changed)
+        return end < self.head
+
+    def catch_up(self):
+        # Steps until the head is reached; for scripts and tests, the bot steps through its RPC queue
+        started = time.perf_counter()
+        indexed = self.blocks_indexed
+        while self.step():
+            pass
+        elapsed = time.perf_counter() - started
+        logger.info(f"Indexed {self.blocks_indexed - indexed} blocks in {elapsed:.2f}s")
+        return self.blocks_indexed - indexed
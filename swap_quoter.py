@@ -0,0 +1,150 @@
+import logging
+import threading
+from itertools import combinations
+from eth_abi import encode, decode
+from eth_utils import to_checksum_address
+from chain_reader import GET_PAIR, TOKEN0
+
+logger = logging.getLogger()
+
+UNISWAP_V2_FACTORY_ADDRESS = '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f'  # Ethereum mainnet
+WETH_ADDRESS = '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2'  # Ethereum mainnet
+DEFAULT_HOP_TOKENS = [
+    WETH_ADDRESS,
+    '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48',  # USDC
+    '0xdAC17F958D2ee523a2206206994597C13D831ec7',  # USDT
+    '0x6B175474E89094C44Da98b954EedeAC495271d0F'  # DAI
+]
+ZERO_ADDRESS = '0x' + '00' * 20
+
+def get_amount_out(amount_in, reserve_in, reserve_out, fee=3):
+    # UniswapV2Library.getAmountOut in the same integer arithmetic; fee is in thousandths
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+    amount_in_with_fee = amount_in * (1000 - fee)
+    return amount_in_with_fee * reserve_out // (reserve_in * 1000 + amount_in_with_fee)
+
+def minimum_out(amount_out, tolerance):
+    # amountOutMin for a quoted output, e.g. tolerance=0.005 accepts 0.5% less
+    return amount_out * (10000 - round(tolerance * 10000)) // 10000
+
+class Pool:
+    # A Uniswap V2 pair and its token ordering, which getReserves() follows
+    def __init__(self, address, token0, token1):
+        self.address = address
+        self.token0 = token0
+        self.token1 = token1
+
+    def other(self, token):
+        return self.token1 if token == self.token0 else self.token0
+
+    def oriented(self, reserves, token_in):
+        reserve0, reserve1 = reserves[0], reserves[1]
+        return (reserve0, reserve1) if token_in == self.token0 else (reserve1, reserve0)
+
+class SwapQuote:
+    def __init__(self, path, pools, amount_in, amount_out, ideal_out, block):
+        self.path = path
+        self.pools = pools
+        self.amount_in = amount_in
+        self.amount_out = amount_out
+        self.ideal_out = ideal_out  # Output at the pools' mid prices, after LP fees
+        self.block = block
+
+    @property
+    def price_impact(self):
+        return 1 - self.amount_out / self.ideal_out if self.ideal_out else 1.0
+
+    def amount_out_min(self, tolerance):
+        return minimum_out(self.amount_out, tolerance)
+
+class SwapQuoter:
+    # Quotes Uniswap V2 swaps locally from cached reserves instead of a
+    # getAmountsOut eth_call per trade. Pairs between the traded tokens and a
+    # small set of hop tokens are found once through the factory, then their
+    # reserves ride along in the ChainReader snapshot that is refreshed every
+    # block. Every simple path of up to max_hops pools is priced with the
+    # constant-product formula and the best output wins.
+    def __init__(self, chain_reader, factory_address=UNISWAP_V2_FACTORY_ADDRESS, hop_tokens=DEFAULT_HOP_TOKENS, max_hops=3, fee=3):
+        self.chain_reader = chain_reader
+        self.factory_address = to_checksum_address(factory_address)
+        self.hop_tokens = [to_checksum_address(t) for t in hop_tokens]
+        self.max_hops = max_hops
+        self.fee = fee
+        self.lock = threading.Lock()
+        self.pools = {}
+        self.graph = {}
+        self.checked = set()
+
+    def add_pool(self, address, token0, token1):
+        pool = Pool(to_checksum_address(address), to_checksum_address(token0), to_checksum_address(token1))
+        self.pools[pool.address] = pool
+        self.graph.setdefault(pool.token0, []).append(pool)
+        self.graph.setdefault(pool.token1, []).append(pool)
+        self.checked.add(frozenset((pool.token0, pool.token1)))
+        self.chain_reader.watch(pairs=[pool.address])
+        return pool
+
+    def discover(self, tokens):
+        # Two Multicall round-trips for any token pairs not looked up before:
+        # factory.getPair for each, then token0() for the pairs that exist
+        tokens = {to_checksum_address(t) for t in tokens} | set(self.hop_tokens)
+        with self.lock:
+            candidates = [(a, b) for a, b in combinations(sorted(tokens), 2) if frozenset((a, b)) not in self.checked]
+            if not candidates:
+                return
+            results = self.chain_reader.call_many([(self.factory_address, GET_PAIR + encode(['address', 'address'], [a, b])) for a, b in candidates])
+            found = []
+            for (a, b), (success, raw) in zip(candidates, results):
+                self.checked.add(frozenset((a, b)))
+                pair = decode(['address'], raw)[0] if success and raw else ZERO_ADDRESS
+                if int(pair, 16):
+                    found.append((to_checksum_address(pair), a, b))
+            if not found:
+                return
+            results = self.chain_reader.call_many([(pair, TOKEN0) for pair, _, _ in found])
+            for (pair, a, b), (success, raw) in zip(found, results):
+                if not success or not raw:
+                    continue
+                token0 = to_checksum_address(decode(['address'], raw)[0])
+                self.add_pool(pair, token0, b if token0 == a else a)
+            logger.info(f"Discovered {len(found)} Uniswap pairs, {len(self.pools)} cached")
+
+    def paths(self, token_in, token_out):
+        # Depth-first search over simple paths, yielding (tokens, pools)
+        stack = [([token_in], [])]
+        while stack:
+            tokens, pools = stack.pop()
+            for pool in self.graph.get(tokens[-1], []):
+                nxt = pool.other(tokens[-1])
+                if nxt in tokens:
+                    continue
+                if nxt == token_out:
+                    yield tokens + [nxt], pools + [pool]
+                elif len(pools) + 1 < self.max_hops:
+                    stack.append((tokens + [nxt], pools + [pool]))
+
+    def quote_path(self, tokens, pools, amount_in, reserves):
+        amount, ideal = amount_in, float(amount_in)
+        for token_in, pool in zip(tokens, pools):
+            pool_reserves = reserves.get(pool.address)
+            if not pool_reserves:
+                return None, None
+            reserve_in, reserve_out = pool.oriented(pool_reserves, token_in)
+            if not reserve_in or not reserve_out:
+                return None, None
+            amount = get_amount_out(amount, reserve_in, reserve_out, self.fee)
+            ideal *= reserve_out / reserve_in * (1000 - self.fee) / 1000
+        return amount, ideal
+
+    def quote(self, token_in, token_out, amount_in):
+        # Best output for amount_in over every cached path, or None without a route
+        token_in, token_out = to_checksum_address(token_in), to_checksum_address(token_out)
+        self.discover([token_in, token_out])
+        snapshot = self.chain_reader.snapshot()
+        best = None
+        for tokens, pools in self.paths(token_in, token_out):
+            amount_out, ideal = self.quote_path(tokens, pools, amount_in, snapshot.reserves)
+            if amount_out and (best is None or amount_out > best.amount_out):
+                best = SwapQuote(tokens, pools, amount_in, amount_out, ideal, snapshot.block)
+        return best
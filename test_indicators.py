@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+from indicators import INDICATOR_COLUMNS, INDICATOR_TOLERANCE, IndicatorEngine
+
+EXACT_COLUMNS = ['rsi', 'macd']
+
+def candles(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, n))
+    return pd.DataFrame({
+        'time': 1_700_000_000 + 60 * np.arange(n),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'vwap': (high + low + close) / 3,
+        'volume': rng.uniform(1, 50, n),
+        'count': rng.integers(1, 500, n)
+    })
+
+def reference(df):
+    # What add_technical_indicators computed with ta before the engine replaced it
+    bollinger = ta.volatility.BollingerBands(df['close'])
+    return {
+        'vwap': ta.volume.volume_weighted_average_price(df['high'], df['low'], df['close'], df['volume']),
+        'rsi': ta.momentum.RSIIndicator(df['close']).rsi(),
+        'macd': ta.trend.MACD(df['close']).macd(),
+        'bollinger_hband': bollinger.bollinger_hband(),
+        'bollinger_lband': bollinger.bollinger_lband()
+    }
+
+def assert_matches_ta(out, df):
+    # out may be just the tail apply() returns; it is compared with the same bars
+    expected = reference(df)
+    for column in INDICATOR_COLUMNS:
+        actual = out[column].to_numpy()
+        wanted = expected[column].to_numpy()[len(df) - len(out):]
+        assert np.array_equal(np.isnan(actual), np.isnan(wanted)), column
+        if column in EXACT_COLUMNS:
+            np.testing.assert_array_equal(actual, wanted, err_msg=column)
+        else:
+            np.testing.assert_allclose(actual, wanted, rtol=INDICATOR_TOLERANCE, err_msg=column)
+
+@pytest.mark.parametrize('n', [1, 13, 14, 26, 40, 800])
+def test_full_apply_matches_ta(n):
+    df = candles(n)
+    out = IndicatorEngine().apply(df)
+    assert len(out) == n
+    assert_matches_ta(out, df)
+
+def test_incremental_apply_matches_ta():
+    df = candles(400)
+    engine = IndicatorEngine()
+    engine.apply(df.iloc[:300].reset_index(drop=True))
+    for n in range(301, 401):
+        frame = df.iloc[:n].reset_index(drop=True)
+        # The forming bar is revised before the next one opens
+        forming = frame.copy()
+        forming.loc[n - 1, ['high', 'close']] *= 1.001
+        assert_matches_ta(engine.apply(forming), forming)
+        tail = engine.apply(frame)
+        assert len(tail) <= 2
+        assert_matches_ta(tail, frame)
+    assert_matches_ta(engine.frame(df), df)
+
+def test_replaced_history_is_recomputed():
+    df = candles(300)
+    engine = IndicatorEngine()
+    engine.apply(df.iloc[:200].reset_index(drop=True))
+    shifted = df.iloc[50:].reset_index(drop=True)
+    assert_matches_ta(engine.apply(shifted), shifted)
+
+def test_apply_leaves_the_input_frame_alone():
+    df = candles(100)
+    kraken_vwap = df['vwap'].copy()
+    out = IndicatorEngine().frame(df)
+    pd.testing.assert_series_equal(df['vwap'], kraken_vwap)
+    assert list(df.columns) == ['time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count']
+    assert not np.allclose(out['vwap'].to_numpy()[13:], kraken_vwap.to_numpy()[13:])
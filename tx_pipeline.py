@@ -0,0 +1,252 @@
+import time
+import asyncio
+import logging
+import threading
+from metrics import registry
+
+logger = logging.getLogger()
+
+MIN_REPLACEMENT_BUMP = 1.125  # Nodes reject replacements that raise fees by less than 10%
+FEE_FIELDS = ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas')
+
+def journal_transaction(transaction):
+    # The transaction's fields as JSON, so a resumed one can still be sped up or cancelled
+    return {k: '0x' + bytes(v).hex() if isinstance(v, (bytes, bytearray)) else v for k, v in transaction.items()}
+
+def rebuild_transaction(tx):
+    # The fields to re-sign from a transaction the node returns (eth_getTransactionByHash)
+    transaction = {'from': tx['from'], 'to': tx['to'], 'value': tx['value'], 'gas': tx['gas'], 'nonce': tx['nonce'], 'data': '0x' + bytes(tx['input']).hex()}
+    if tx.get('chainId') is not None:
+        transaction['chainId'] = tx['chainId']
+    for field in FEE_FIELDS[1:] if tx.get('maxFeePerGas') is not None else FEE_FIELDS[:1]:
+        transaction[field] = tx[field]
+    return transaction
+
+class NonceManager:
+    # Hands out nonces for one account from a local counter. The node is only
+    # asked for the pending count at startup and after a send fails. With a
+    # chain reader the count comes from its batched snapshot.
+    def __init__(self, web3, address, chain_reader=None):
+        self.web3 = web3
+        self.address = address
+        self.chain_reader = chain_reader
+        self.lock = threading.Lock()
+        self.next_nonce = None
+
+    def pending_count(self):
+        if self.chain_reader is not None:
+            return self.chain_reader.nonce(self.address)
+        return self.web3.eth.get_transaction_count(self.address, 'pending')
+
+    def sync(self):
+        with self.lock:
+            self.next_nonce = self.pending_count()
+            logger.info(f"Nonce for {self.address} synced to {self.next_nonce}")
+            return self.next_nonce
+
+    def reserve(self):
+        with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = self.pending_count()
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            return nonce
+
+    def release(self, nonce):
+        # A nonce that was reserved but never broadcast can be handed out again if it
+        # is still the newest one; otherwise the gap is closed by resyncing
+        with self.lock:
+            if self.next_nonce == nonce + 1:
+                self.next_nonce = nonce
+            else:
+                self.next_nonce = None
+                if self.chain_reader is not None:
+                    self.chain_reader.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.next_nonce = None
+            if self.chain_reader is not None:
+                self.chain_reader.invalidate()
+
+class PendingTransaction:
+    def __init__(self, transaction, signed, label):
+        self.transaction = transaction
+        self.signed = signed
+        self.label = label
+        self.nonce = transaction['nonce']
+        self.hashes = []
+        self.receipt = None
+        self.sent_at = None
+        self.done = None
+        self.task = None
+
+    @property
+    def tx_hash(self):
+        return self.hashes[-1] if self.hashes else None
+
+class TransactionPipeline:
+    # Reserves a nonce, signs and broadcasts transactions on the I/O pool, then
+    # watches for receipts in background tasks, so several orders can be in
+    # flight without waiting for each other to confirm. A pending transaction can
+    # be replaced with higher fees (speed_up) or by a zero-value self-transfer (cancel).
+    # With a state store, every hash sent is journaled until its receipt arrives,
+    # so a restarted bot can resume watching it.
+    def __init__(self, web3, io_executor, nonce_manager, private_key, on_receipt=None, poll_interval=2.0, receipt_timeout=900, state_store=None):
+        self.web3 = web3
+        self.io_executor = io_executor
+        self.nonce_manager = nonce_manager
+        self.private_key = private_key
+        self.on_receipt = on_receipt
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self.state_store = state_store
+        self.pending = {}
+
+    @registry.timed('sign_transaction')
+    def sign(self, transaction):
+        return self.web3.eth.account.sign_transaction(transaction, private_key=self.private_key)
+
+    def prepare(self, transaction, label='transaction'):
+        # Runs on the I/O pool: takes the next nonce and signs, without broadcasting
+        transaction = dict(transaction, nonce=self.nonce_manager.reserve())
+        try:
+            return PendingTransaction(transaction, self.sign(transaction), label)
+        except Exception:
+            self.nonce_manager.release(transaction['nonce'])
+            raise
+
+    @registry.timed('send_raw_transaction')
+    def broadcast(self, signed):
+        try:
+            return self.web3.eth.send_raw_transaction(signed.raw_transaction)
+        except Exception:
+            # The node disagrees with our view of the account (nonce too low, a
+            # dropped transaction, ...), so the next reservation starts from its count
+            self.nonce_manager.invalidate()
+            raise
+
+    async def send(self, pending):
+        try:
+            tx_hash = await self.io_executor.run(self.broadcast, pending.signed)
+        except Exception:
+            self.nonce_manager.release(pending.nonce)
+            raise
+        pending.hashes.append(tx_hash)
+        self.journal(pending)
+        self.watch(pending)
+        logger.info(f"Sent {pending.label} with nonce {pending.nonce}: {self.web3.to_hex(tx_hash)}")
+        return pending
+
+    def watch(self, pending):
+        pending.sent_at = time.monotonic()
+        pending.done = asyncio.get_running_loop().create_future()
+        self.pending[pending.nonce] = pending
+        pending.task = asyncio.get_running_loop().create_task(self.track(pending))
+
+    def journal(self, pending, done=False):
+        if self.state_store is None:
+            return
+        key = f"{self.nonce_manager.address}:{pending.nonce}"
+        value = None if done else {'nonce': pending.nonce, 'label': pending.label, 'hashes': ['0x' + bytes(h).hex() for h in pending.hashes],
+                                   'transaction': journal_transaction(pending.transaction)}
+        try:
+            self.state_store.record('pending', key, value)
+        except Exception as e:
+            logger.error(f"Failed to journal {pending.label} with nonce {pending.nonce}: {e}")
+
+    async def resume(self, records):
+        # Reconciles transactions journaled by a previous run with the chain. Ones
+        # whose nonce is already used up but that have no receipt were replaced
+        # outside the bot and are dropped; the rest are watched as if just sent.
+        # Records journaled without the transaction's fields get them from the node.
+        address = self.nonce_manager.address
+        mined_count = await self.io_executor.run(lambda: self.web3.eth.get_transaction_count(address, 'latest'))
+        for record in sorted(records, key=lambda r: r['nonce']):
+            pending = PendingTransaction(record.get('transaction') or {'nonce': record['nonce'], 'from': address}, None, record['label'])
+            pending.hashes = [bytes.fromhex(h[2:]) for h in record['hashes']]
+            if 'to' not in pending.transaction:
+                tx = await self.io_executor.run(self.get_transaction, pending.tx_hash)
+                if tx is not None:
+                    pending.transaction = rebuild_transaction(tx)
+            if pending.nonce < mined_count:
+                receipts = [await self.io_executor.run(self.get_receipt, h) for h in pending.hashes]
+                if not any(receipts):
+                    logger.warning(f"{pending.label} with nonce {pending.nonce} was replaced outside the bot, no longer tracking it")
+                    self.journal(pending, done=True)
+                    continue
+            self.watch(pending)
+            logger.info(f"Resumed tracking {pending.label} with nonce {pending.nonce}")
+
+    async def submit(self, transaction, label='transaction'):
+        pending = await self.io_executor.run(self.prepare, transaction, label)
+        return await self.send(pending)
+
+    def get_transaction(self, tx_hash):
+        try:
+            return self.web3.eth.get_transaction(tx_hash)
+        except Exception:
+            return None
+
+    def get_receipt(self, tx_hash):
+        try:
+            return self.web3.eth.get_transaction_receipt(tx_hash)
+        except Exception:
+            return None
+
+    async def track(self, pending):
+        deadline = pending.sent_at + self.receipt_timeout
+        try:
+            while time.monotonic() < deadline:
+                # Any of the hashes sent for this nonce may be the one that gets mined
+                for tx_hash in list(reversed(pending.hashes)):
+                    receipt = await self.io_executor.run(self.get_receipt, tx_hash)
+                    if receipt is not None:
+                        pending.receipt = receipt
+                        pending.done.set_result(receipt)
+                        logger.info(f"{pending.label} {self.web3.to_hex(tx_hash)} mined in block {receipt['blockNumber']} with status {receipt['status']}")
+                        if self.on_receipt is not None:
+                            await self.on_receipt(pending, receipt)
+                        return receipt
+                await asyncio.sleep(self.poll_interval)
+            logger.warning(f"No receipt for {pending.label} with nonce {pending.nonce} after {self.receipt_timeout}s")
+            pending.done.set_exception(TimeoutError(f"{pending.label} with nonce {pending.nonce} not mined"))
+        except Exception as e:
+            logger.error(f"Failed to track {pending.label} with nonce {pending.nonce}: {e}")
+            if not pending.done.done():
+                pending.done.set_exception(e)
+        finally:
+            self.pending.pop(pending.nonce, None)
+            if pending.done.done():
+                # Not when cancelled by shutdown: the next run picks it up again
+                self.journal(pending, done=True)
+
+    def bump_fees(self, transaction, factor):
+        transaction = dict(transaction)
+        for field in FEE_FIELDS:
+            if field in transaction:
+                transaction[field] = int(transaction[field] * factor)
+        return transaction
+
+    async def replace(self, pending, transaction, label):
+        signed = await self.io_executor.run(self.sign, transaction)
+        tx_hash = await self.io_executor.run(self.broadcast, signed)
+        pending.transaction = transaction
+        pending.signed = signed
+        pending.hashes.append(tx_hash)
+        self.journal(pending)
+        logger.info(f"Replaced {pending.label} with nonce {pending.nonce} ({label}): {self.web3.to_hex(tx_hash)}")
+        return pending
+
+    async def speed_up(self, pending, factor=MIN_REPLACEMENT_BUMP):
+        if 'to' not in pending.transaction:
+            raise ValueError(f"{pending.label} with nonce {pending.nonce} cannot be replaced: its transaction fields are unknown")
+        return await self.replace(pending, self.bump_fees(pending.transaction, factor), 'speed-up')
+
+    async def cancel(self, pending, factor=MIN_REPLACEMENT_BUMP):
+        if not any(field in pending.transaction for field in FEE_FIELDS):
+            raise ValueError(f"{pending.label} with nonce {pending.nonce} cannot be replaced: its fees are unknown")
+        fees = self.bump_fees(pending.transaction, factor)
+        transaction = {k: fees[k] for k in ('nonce', 'chainId') + FEE_FIELDS if k in fees}
+        transaction.update({'from': fees['from'], 'to': fees['from'], 'value': 0, 'gas': 21000})
+        return await self.replace(pending, transaction, 'cancel')